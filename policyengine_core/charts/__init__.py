@@ -13,3 +13,4 @@ from .formatting import (
 
 from .bar import *
 from .api import *
+from .economy import get_economy_impact
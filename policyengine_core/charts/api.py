@@ -45,21 +45,24 @@ def get_api_chart_data(
 
 
 def intra_decile_chart(
-    country_id: str,
-    reform_policy_id: int,
-    region: str,
-    time_period: str,
+    country_id: str = None,
+    reform_policy_id: int = None,
+    region: str = None,
+    time_period: str = None,
     baseline_policy_id: int = None,
+    impact: dict = None,
 ) -> go.Figure:
-    impact = get_api_chart_data(
-        country_id=country_id,
-        reform_policy_id=reform_policy_id,
-        chart_key="intra_decile",
-        baseline_policy_id=baseline_policy_id,
-        region=region,
-        time_period=time_period,
-    )
-    impact = {"intra_decile": impact}
+    if impact is None:
+        impact = {
+            "intra_decile": get_api_chart_data(
+                country_id=country_id,
+                reform_policy_id=reform_policy_id,
+                chart_key="intra_decile",
+                baseline_policy_id=baseline_policy_id,
+                region=region,
+                time_period=time_period,
+            )
+        }
 
     decile_numbers = list(range(1, 11))
     outcome_labels = [
@@ -172,21 +175,24 @@ def intra_decile_chart(
 
 
 def decile_chart(
-    country_id: str,
-    reform_policy_id: int,
-    region: str,
-    time_period: str,
+    country_id: str = None,
+    reform_policy_id: int = None,
+    region: str = None,
+    time_period: str = None,
     baseline_policy_id: int = None,
+    impact: dict = None,
 ) -> go.Figure:
-    impact = get_api_chart_data(
-        country_id=country_id,
-        reform_policy_id=reform_policy_id,
-        chart_key="decile",
-        baseline_policy_id=baseline_policy_id,
-        region=region,
-        time_period=time_period,
-    )
-    impact = {"decile": impact}
+    if impact is None:
+        impact = {
+            "decile": get_api_chart_data(
+                country_id=country_id,
+                reform_policy_id=reform_policy_id,
+                chart_key="decile",
+                baseline_policy_id=baseline_policy_id,
+                region=region,
+                time_period=time_period,
+            )
+        }
 
     decile_numbers = list(range(1, 11))
     # Sort deciles by key order 1 to 10
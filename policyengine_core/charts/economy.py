@@ -0,0 +1,221 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from policyengine_core.periods import Period
+from policyengine_core.simulations.aggregates import weighted_decile_rank
+
+if TYPE_CHECKING:
+    from policyengine_core.simulations import Microsimulation
+
+INTRA_DECILE_BOUNDS = [-np.inf, -0.05, -1e-3, 1e-3, 0.05, np.inf]
+INTRA_DECILE_LABELS = [
+    "Lose more than 5%",
+    "Lose less than 5%",
+    "No change",
+    "Gain less than 5%",
+    "Gain more than 5%",
+]
+
+
+def _weighted_gini(values: np.ndarray, weights: np.ndarray) -> float:
+    order = np.argsort(values, kind="stable")
+    values, weights = values[order], weights[order]
+    cumulative_weights = np.cumsum(weights)
+    cumulative_values = np.cumsum(values * weights)
+    if cumulative_values[-1] == 0:
+        return 0.0
+    return float(
+        np.sum(
+            cumulative_values[1:] * cumulative_weights[:-1]
+            - cumulative_values[:-1] * cumulative_weights[1:]
+        )
+        / (cumulative_values[-1] * cumulative_weights[-1])
+    )
+
+
+def _top_share(values: np.ndarray, weights: np.ndarray, top: float) -> float:
+    # The share of the total held by the top ``top`` of the population.
+    order = np.argsort(values, kind="stable")[::-1]
+    values, weights = values[order], weights[order]
+    total = np.dot(values, weights)
+    if total == 0:
+        return 0.0
+    cumulative_weights = np.cumsum(weights)
+    # Entities entirely in the top, and the part of the next one that is.
+    top_weight = top * cumulative_weights[-1]
+    inside = np.minimum(
+        np.maximum(top_weight - (cumulative_weights - weights), 0), weights
+    )
+    return float(np.dot(values, inside) / total)
+
+
+def get_economy_impact(
+    baseline: "Microsimulation",
+    reformed: "Microsimulation",
+    time_period: Period,
+    income_variable: str = "household_net_income",
+    tax_variable: str = "household_tax",
+    benefit_variable: str = "household_benefits",
+    poverty_variable: str = "in_poverty",
+    decile_variable: str = None,
+    entity: str = "household",
+) -> dict:
+    """
+    Calculate the impact of a reform on the economy locally, from a baseline and a reformed microsimulation (such as a branch of the baseline), in the format the PolicyEngine API returns.
+
+    Every statistic is calculated from the entities' arrays at once, so the result can be passed straight to ``decile_chart`` and ``intra_decile_chart`` without any remote calls. Variables the country doesn't define (or set to None) leave their part of the result out.
+
+    Args:
+        baseline (Microsimulation): The baseline simulation.
+        reformed (Microsimulation): The reformed simulation, with the same population.
+        time_period (Period): The period to calculate the impact for.
+        income_variable (str, optional): The income to compare. Defaults to "household_net_income".
+        tax_variable (str, optional): Total taxes, for the budgetary impact. Defaults to "household_tax".
+        benefit_variable (str, optional): Total benefits, for the budgetary impact. Defaults to "household_benefits".
+        poverty_variable (str, optional): Whether a person is in poverty. Defaults to "in_poverty".
+        decile_variable (str, optional): The income decile (from 1 to 10) of each entity. Defaults to the deciles of baseline income, weighted by the number of people.
+        entity (str, optional): The entity to compare incomes of. Defaults to "household".
+
+    Returns:
+        dict: The impact, with "budget", "decile", "intra_decile", "inequality" and (if the country defines ``poverty_variable``) "poverty" sections.
+    """
+    variables = baseline.tax_benefit_system.variables
+
+    def get_values(simulation: "Microsimulation", variable: str):
+        return np.asarray(
+            simulation.calculate(
+                variable, time_period, map_to=entity, use_weights=False
+            ),
+            dtype=float,
+        )
+
+    weights = np.asarray(
+        baseline.get_weights(income_variable, time_period, entity),
+        dtype=float,
+    )
+    population = baseline.populations[entity]
+    if population.entity.is_person:
+        people = np.ones(population.count)
+    else:
+        people = np.bincount(
+            population.members_entity_id, minlength=population.count
+        ).astype(float)
+    people_weights = weights * people
+    baseline_income = get_values(baseline, income_variable)
+    reformed_income = get_values(reformed, income_variable)
+
+    impact = {}
+
+    budget = dict(
+        baseline_net_income=float(np.dot(baseline_income, weights)),
+        households=float(weights.sum()),
+    )
+    tax_revenue_impact = benefit_spending_impact = 0.0
+    if tax_variable in variables:
+        tax_revenue_impact = float(
+            np.dot(
+                get_values(reformed, tax_variable)
+                - get_values(baseline, tax_variable),
+                weights,
+            )
+        )
+        budget["tax_revenue_impact"] = tax_revenue_impact
+    if benefit_variable in variables:
+        benefit_spending_impact = float(
+            np.dot(
+                get_values(reformed, benefit_variable)
+                - get_values(baseline, benefit_variable),
+                weights,
+            )
+        )
+        budget["benefit_spending_impact"] = benefit_spending_impact
+    budget["budgetary_impact"] = tax_revenue_impact - benefit_spending_impact
+    impact["budget"] = budget
+
+    if decile_variable is not None:
+        deciles = get_values(baseline, decile_variable).astype(int)
+    else:
+        deciles = weighted_decile_rank(baseline_income, people_weights)
+    in_deciles = (deciles >= 1) & (deciles <= 10)
+    groups = np.where(in_deciles, deciles - 1, 10)
+
+    # Decile impacts: the change in each decile's total income, relative to
+    # its baseline income and per entity.
+    baseline_by_decile, reformed_by_decile = (
+        np.bincount(groups, income * weights, minlength=11)[:10]
+        for income in (baseline_income, reformed_income)
+    )
+    weight_by_decile = np.bincount(groups, weights, minlength=11)[:10]
+    change_by_decile = reformed_by_decile - baseline_by_decile
+    with np.errstate(invalid="ignore", divide="ignore"):
+        relative = change_by_decile / baseline_by_decile
+        average = change_by_decile / weight_by_decile
+    impact["decile"] = dict(
+        relative={str(i + 1): float(relative[i]) for i in range(10)},
+        average={str(i + 1): float(average[i]) for i in range(10)},
+    )
+
+    # Intra-decile impacts: the share of people in each decile whose income
+    # changes by each range of percentages.
+    income_change = (reformed_income - baseline_income) / np.maximum(
+        baseline_income, 1
+    )
+    outcomes = np.digitize(
+        income_change, INTRA_DECILE_BOUNDS[1:-1], right=True
+    )
+    people_by_outcome = np.bincount(
+        groups * len(INTRA_DECILE_LABELS) + outcomes,
+        people_weights,
+        minlength=11 * len(INTRA_DECILE_LABELS),
+    ).reshape(11, len(INTRA_DECILE_LABELS))[:10]
+    people_by_decile = people_by_outcome.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = np.where(
+            people_by_decile > 0, people_by_outcome / people_by_decile, 0
+        )
+    impact["intra_decile"] = dict(
+        deciles={
+            label: shares[:, i].tolist()
+            for i, label in enumerate(INTRA_DECILE_LABELS)
+        },
+        all={
+            label: float(shares[:, i].mean())
+            for i, label in enumerate(INTRA_DECILE_LABELS)
+        },
+    )
+
+    impact["inequality"] = {
+        name: dict(
+            baseline=function(baseline_income, people_weights),
+            reform=function(reformed_income, people_weights),
+        )
+        for name, function in (
+            ("gini", _weighted_gini),
+            ("top_10_pct_share", lambda x, w: _top_share(x, w, 0.1)),
+            ("top_1_pct_share", lambda x, w: _top_share(x, w, 0.01)),
+        )
+    }
+
+    if poverty_variable in variables:
+        person_weights = np.asarray(
+            baseline.get_weights(poverty_variable, time_period, "person"),
+            dtype=float,
+        )
+        poverty = {}
+        for name, simulation in (("baseline", baseline), ("reform", reformed)):
+            in_poverty = np.asarray(
+                simulation.calculate(
+                    poverty_variable,
+                    time_period,
+                    map_to="person",
+                    use_weights=False,
+                ),
+                dtype=float,
+            )
+            poverty[name] = float(
+                np.dot(in_poverty, person_weights) / person_weights.sum()
+            )
+        impact["poverty"] = dict(all=poverty)
+
+    return impact
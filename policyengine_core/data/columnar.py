@@ -0,0 +1,105 @@
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+COLUMNAR_SUFFIXES = PARQUET_SUFFIXES + ARROW_SUFFIXES
+
+
+def import_pyarrow():
+    """Import pyarrow, which columnar datasets need but which is an optional dependency.
+
+    Returns:
+        module: The pyarrow module.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Columnar (Parquet and Arrow) datasets need pyarrow. Install it with `pip install policyengine-core[arrow]`."
+        ) from e
+    return pyarrow
+
+
+def _to_numpy(column) -> np.ndarray:
+    pa = import_pyarrow()
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    if column.num_chunks == 1:
+        # A single chunk of numbers without missing values is returned as a
+        # view of the file's memory, rather than copied.
+        return column.chunk(0).to_numpy(zero_copy_only=False)
+    return column.to_numpy()
+
+
+class ColumnarTable:
+    """
+    A table of person-level columns stored in a Parquet or Arrow IPC file, each read only when it is used.
+
+    Column names follow the flat file convention: a variable name, optionally followed by "__" and a time period. Arrow IPC files are memory-mapped, and numeric columns without missing values are returned as read-only views of the mapping rather than copies. Parquet files are memory-mapped too, but each column has to be decoded when it is read.
+
+    Args:
+        file_path (Union[str, Path]): The path of the file.
+    """
+
+    def __init__(self, file_path: Union[str, Path]):
+        pa = import_pyarrow()
+        self.file_path = Path(file_path)
+        if self.file_path.suffix in PARQUET_SUFFIXES:
+            self._parquet = pa.parquet.ParquetFile(
+                str(self.file_path), memory_map=True
+            )
+            self._table = None
+            self.columns: List[str] = self._parquet.schema_arrow.names
+            self._length = self._parquet.metadata.num_rows
+        else:
+            self._parquet = None
+            self._table = pa.ipc.open_file(
+                pa.memory_map(str(self.file_path), "r")
+            ).read_all()
+            self.columns = self._table.column_names
+            self._length = self._table.num_rows
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if self._table is not None:
+            return _to_numpy(self._table.column(column))
+        return _to_numpy(self._parquet.read(columns=[column]).column(0))
+
+
+def write_columnar_file(
+    data: Union[pd.DataFrame, Dict[str, np.ndarray]],
+    file_path: Union[str, Path],
+) -> None:
+    """Write a table to a Parquet or Arrow IPC file, depending on its suffix.
+
+    Arrow IPC files are written uncompressed, in a single chunk, so that their columns can be read without copying.
+
+    Args:
+        data (Union[pd.DataFrame, Dict[str, np.ndarray]]): The table, or its columns by name.
+        file_path (Union[str, Path]): The path of the file.
+    """
+    pa = import_pyarrow()
+    file_path = Path(file_path)
+    if isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    else:
+        table = pa.table(data)
+    table = table.combine_chunks()
+    if file_path.suffix in PARQUET_SUFFIXES:
+        pa.parquet.write_table(table, str(file_path))
+    elif file_path.suffix in ARROW_SUFFIXES:
+        with pa.OSFile(str(file_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        raise ValueError(
+            f"Can't tell the columnar format of {file_path} from its suffix, which should be one of {', '.join(COLUMNAR_SUFFIXES)}."
+        )
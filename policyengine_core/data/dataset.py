@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Dict, Union, List
+from typing import TYPE_CHECKING, Dict, Union, List, Optional
 import h5py
 import numpy as np
 import pandas as pd
@@ -8,8 +8,17 @@ import requests
 import os
 import tempfile
 from policyengine_core.tools.hugging_face import *
+from policyengine_core.tools.download_cache import check_sha256, download_file
+from policyengine_core.data.columnar import (
+    COLUMNAR_SUFFIXES,
+    ColumnarTable,
+    write_columnar_file,
+)
 import sys
 
+if TYPE_CHECKING:
+    from policyengine_core.taxbenefitsystems import TaxBenefitSystem
+
 
 def atomic_write(file: Path, content: bytes) -> None:
     """
@@ -38,6 +47,51 @@ def atomic_write(file: Path, content: bytes) -> None:
             raise
 
 
+def get_array_entity(
+    tax_benefit_system: "TaxBenefitSystem", name: str
+) -> Optional[str]:
+    """Find the entity an array of a dataset belongs to, from its name.
+
+    Args:
+        tax_benefit_system (TaxBenefitSystem): The tax-benefit system the dataset is for.
+        name (str): The name of the array: a variable, an entity's IDs, or a person-level membership or role array.
+
+    Returns:
+        Optional[str]: The key of the entity, or None if the array isn't used by simulations.
+    """
+    variable = tax_benefit_system.variables.get(name)
+    if variable is not None:
+        return variable.entity.key
+    person = tax_benefit_system.person_entity.key
+    if name == "role":
+        return person
+    for group_entity in tax_benefit_system.group_entities:
+        if name == f"{group_entity.key}_id":
+            return group_entity.key
+        if name in (
+            f"{person}_{group_entity.key}_id",
+            f"{person}_{group_entity.key}_role",
+        ):
+            return person
+    return None
+
+
+def get_member_positions(
+    ids: np.ndarray, membership: np.ndarray
+) -> np.ndarray:
+    """Find the position of each person's group in the group's arrays.
+
+    Args:
+        ids (np.ndarray): The IDs of the groups.
+        membership (np.ndarray): The ID of each person's group.
+
+    Returns:
+        np.ndarray: The position of each person's group in ``ids``.
+    """
+    order = np.argsort(ids)
+    return order[np.searchsorted(ids, membership, sorter=order)]
+
+
 class Dataset:
     """The `Dataset` class is a base class for datasets used directly or indirectly for microsimulation models.
     A dataset defines a generation function to create it from other data, and this class provides common features
@@ -48,19 +102,22 @@ class Dataset:
     label: str = None
     """The label of the dataset. This is used for logging and is used as the key in the `datasets` dictionary."""
     data_format: str = None
-    """The format of the dataset. This can be either `Dataset.ARRAYS`, `Dataset.TIME_PERIOD_ARRAYS` or `Dataset.TABLES`. If `Dataset.ARRAYS`, the dataset is stored as a collection of arrays. If `Dataset.TIME_PERIOD_ARRAYS`, the dataset is stored as a collection of arrays, with one array per time period. If `Dataset.TABLES`, the dataset is stored as a collection of tables (DataFrames)."""
+    """The format of the dataset. This can be either `Dataset.ARRAYS`, `Dataset.TIME_PERIOD_ARRAYS`, `Dataset.TABLES`, `Dataset.FLAT_FILE` or `Dataset.COLUMNAR`. If `Dataset.ARRAYS`, the dataset is stored as a collection of arrays. If `Dataset.TIME_PERIOD_ARRAYS`, the dataset is stored as a collection of arrays, with one array per time period. If `Dataset.TABLES`, the dataset is stored as a collection of tables (DataFrames). If `Dataset.FLAT_FILE`, the dataset is a CSV file with one row per person and one column per variable (optionally suffixed with `__` and a time period). If `Dataset.COLUMNAR`, the dataset has the same layout as a flat file, but is stored in a Parquet or Arrow IPC file (which needs pyarrow), whose columns are read only when used."""
     file_path: Path = None
     """The path to the dataset file. This is used to load the dataset from a file."""
     time_period: str = None
     """The time period of the dataset. This is used to automatically enter the values in the correct time period if the data type is `Dataset.ARRAYS`."""
     url: str = None
     """The URL to download the dataset from. This is used to download the dataset if it does not exist."""
+    sha256: str = None
+    """The expected SHA-256 digest of the dataset file, in hexadecimal. If set, downloads are checked against it."""
 
     # Data formats
     TABLES = "tables"
     ARRAYS = "arrays"
     TIME_PERIOD_ARRAYS = "time_period_arrays"
     FLAT_FILE = "flat_file"
+    COLUMNAR = "columnar"
 
     _table_cache: Dict[str, pd.DataFrame] = None
 
@@ -87,6 +144,7 @@ class Dataset:
             Dataset.ARRAYS,
             Dataset.TIME_PERIOD_ARRAYS,
             Dataset.FLAT_FILE,
+            Dataset.COLUMNAR,
         ], f"You tried to instantiate a Dataset object, but your data_format attribute is invalid ({self.data_format})."
 
         self._table_cache = {}
@@ -99,7 +157,7 @@ class Dataset:
 
     def load(
         self, key: str = None, mode: str = "r"
-    ) -> Union[h5py.File, np.array, pd.DataFrame, pd.HDFStore]:
+    ) -> Union[h5py.File, np.array, pd.DataFrame, pd.HDFStore, ColumnarTable]:
         """Loads the dataset for a given year, returning a H5 file reader. You can then access the
         dataset like a dictionary (e.g.e Dataset.load(2022)["variable"]).
 
@@ -108,7 +166,7 @@ class Dataset:
             mode (str, optional): The mode to open the file with. Defaults to "r".
 
         Returns:
-            Union[h5py.File, np.array, pd.DataFrame, pd.HDFStore]: The dataset.
+            Union[h5py.File, np.array, pd.DataFrame, pd.HDFStore, ColumnarTable]: The dataset.
         """
         file = self.file_path
         if self.data_format in (Dataset.ARRAYS, Dataset.TIME_PERIOD_ARRAYS):
@@ -139,6 +197,12 @@ class Dataset:
                 raise ValueError(
                     "You tried to load a key from a flat file dataset, but flat file datasets do not support keys."
                 )
+        elif self.data_format == Dataset.COLUMNAR:
+            if key is None:
+                return ColumnarTable(file)
+            else:
+                # If key provided, read only that column.
+                return ColumnarTable(file)[key]
         else:
             raise ValueError(
                 f"Invalid data format {self.data_format} for dataset {self.label}."
@@ -164,6 +228,8 @@ class Dataset:
             self._table_cache = {}
         elif self.data_format == Dataset.FLAT_FILE:
             values.to_csv(file, index=False)
+        elif self.data_format == Dataset.COLUMNAR:
+            write_columnar_file(values, file)
         else:
             raise ValueError(
                 f"Invalid data format {self.data_format} for dataset {self.label}."
@@ -218,6 +284,8 @@ class Dataset:
                         )
         elif self.data_format == Dataset.FLAT_FILE:
             data.to_csv(file, index=False)
+        elif self.data_format == Dataset.COLUMNAR:
+            write_columnar_file(data, file)
 
     def load_dataset(
         self,
@@ -280,6 +348,8 @@ class Dataset:
                 return list(f.keys())
         elif self.data_format == Dataset.FLAT_FILE:
             return pd.read_csv(self.file_path, nrows=0).columns.tolist()
+        elif self.data_format == Dataset.COLUMNAR:
+            return list(ColumnarTable(self.file_path).columns)
         else:
             raise ValueError(
                 f"Invalid data format {self.data_format} for dataset {self.label}."
@@ -356,21 +426,18 @@ class Dataset:
         else:
             url = url
 
-        response = requests.get(
+        # The file is streamed to disk rather than held in memory, and an
+        # interrupted download is resumed the next time.
+        download_file(
             url,
+            self.file_path,
             headers={
                 "Accept": "application/octet-stream",
                 **auth_headers,
             },
+            sha256=self.sha256,
         )
 
-        if response.status_code != 200:
-            raise ValueError(
-                f"Invalid response code {response.status_code} for url {url}."
-            )
-
-        atomic_write(self.file_path, response.content)
-
     def upload(self, url: str = None):
         """Uploads the dataset to a URL.
 
@@ -414,6 +481,8 @@ class Dataset:
                     subkeys = list(first_value.keys())
                     if len(subkeys) > 0:
                         time_period = subkeys[0]
+        elif file_path.suffix in COLUMNAR_SUFFIXES:
+            data_format = Dataset.COLUMNAR
         else:
             data_format = Dataset.FLAT_FILE
         dataset = type(
@@ -430,6 +499,84 @@ class Dataset:
 
         return dataset
 
+    def to_columnar(
+        self,
+        file_path: str,
+        tax_benefit_system: "TaxBenefitSystem" = None,
+    ) -> "Dataset":
+        """Converts the dataset to a Parquet or Arrow IPC file (depending on the file's suffix), with one row per person.
+
+        Columns are named after variables, followed by "__" and the time period for anything other than ETERNITY. Values of group entities are repeated for each of their members.
+
+        Args:
+            file_path (str): The path of the file to write.
+            tax_benefit_system (TaxBenefitSystem, optional): The tax-benefit system the dataset is for, which tells which entity each array belongs to. Required for `Dataset.ARRAYS` and `Dataset.TIME_PERIOD_ARRAYS` datasets.
+
+        Returns:
+            Dataset: The converted dataset.
+        """
+        if self.data_format in (Dataset.FLAT_FILE, Dataset.COLUMNAR):
+            data = self.load()
+            write_columnar_file(
+                {column: np.asarray(data[column]) for column in data.columns},
+                file_path,
+            )
+            return Dataset.from_file(file_path, self.time_period)
+        if self.data_format == Dataset.TABLES:
+            raise ValueError(
+                "Datasets of tables can't be converted to a columnar file."
+            )
+        if tax_benefit_system is None:
+            raise ValueError(
+                "A tax-benefit system is needed to convert arrays to a person-level columnar file."
+            )
+
+        person = tax_benefit_system.person_entity.key
+        columns = {}
+        with self.load() as data:
+            member_positions = {}
+            for group_entity in tax_benefit_system.group_entities:
+                ids_name = f"{group_entity.key}_id"
+                membership_name = f"{person}_{group_entity.key}_id"
+                if ids_name in data and membership_name in data:
+                    member_positions[group_entity.key] = get_member_positions(
+                        self._read_first_array(data[ids_name]),
+                        self._read_first_array(data[membership_name]),
+                    )
+            for name in data:
+                entity_key = get_array_entity(tax_benefit_system, name)
+                if entity_key is None:
+                    continue
+                if isinstance(data[name], h5py.Group):
+                    arrays = {
+                        time_period: values[()]
+                        for time_period, values in data[name].items()
+                    }
+                else:
+                    arrays = {self.time_period: data[name][()]}
+                for time_period, values in arrays.items():
+                    if entity_key != person:
+                        if entity_key not in member_positions:
+                            raise ValueError(
+                                f"Can't place {name} on people, as the dataset doesn't say which {entity_key} each person belongs to."
+                            )
+                        values = values[member_positions[entity_key]]
+                    if values.dtype.kind == "S":
+                        values = values.astype(str)
+                    if time_period in (None, "ETERNITY"):
+                        column = name
+                    else:
+                        column = f"{name}__{time_period}"
+                    columns[column] = values
+        write_columnar_file(columns, file_path)
+        return Dataset.from_file(file_path, self.time_period)
+
+    @staticmethod
+    def _read_first_array(values: Union[h5py.Dataset, h5py.Group]):
+        if isinstance(values, h5py.Group):
+            values = values[list(values.keys())[0]]
+        return values[()]
+
     @staticmethod
     def from_dataframe(dataframe: pd.DataFrame, time_period: str = None):
         """Creates a dataset from a DataFrame.
@@ -497,9 +644,14 @@ class Dataset:
             file=sys.stderr,
         )
 
-        download_huggingface_dataset(
+        file_path = download_huggingface_dataset(
             repo=f"{owner_name}/{model_name}",
             repo_filename=file_name,
             version=version,
             local_dir=self.file_path.parent,
         )
+        check_sha256(
+            file_path,
+            self.sha256,
+            f"hf://{owner_name}/{model_name}/{file_name}",
+        )
@@ -19,11 +19,14 @@ class InMemoryStorage:
         self._arrays = {}
         self.is_eternal = is_eternal
 
-    def clone(self) -> "InMemoryStorage":
+    def clone(self, copy_arrays: bool = True) -> "InMemoryStorage":
         clone = InMemoryStorage(self.is_eternal)
-        clone._arrays = {
-            period: array.copy() for period, array in self._arrays.items()
-        }
+        if copy_arrays:
+            clone._arrays = {
+                period: array.copy() for period, array in self._arrays.items()
+            }
+        else:
+            clone._arrays = dict(self._arrays)
         return clone
 
     def get(self, period: Period, branch_name: str = "default") -> ArrayLike:
@@ -61,6 +64,12 @@ class InMemoryStorage:
             if not period.contains(periods.period(period_item.split(":")[1]))
         }
 
+    def take(self, indices: ArrayLike) -> None:
+        """Keep only the values at ``indices`` of every stored array."""
+        self._arrays = {
+            key: array[indices] for key, array in self._arrays.items()
+        }
+
     def get_known_periods(self) -> list:
         return list(
             map(lambda x: periods.period(x.split(":")[1]), self._arrays.keys())
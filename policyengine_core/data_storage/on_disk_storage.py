@@ -69,12 +69,15 @@ class OnDiskStorage:
             period = periods.period(periods.ETERNITY)
         period = periods.period(period)
 
-        if period is not None:
-            self._files = {
-                period_item: value
-                for period_item, value in self._files.items()
-                if not period_item == f"{branch_name}_{period}"
-            }
+        # As in memory, values for periods within ``period`` go too.
+        self._files = {
+            period_item: value
+            for period_item, value in self._files.items()
+            if not (
+                period_item.split("_")[0] == branch_name
+                and period.contains(periods.period(period_item.split("_")[1]))
+            )
+        }
 
     def get_known_periods(self) -> list:
         return list(
@@ -35,6 +35,13 @@ class EnumArray(numpy.ndarray):
 
         self.possible_values = getattr(obj, "possible_values", None)
 
+    # Pickling an ndarray subclass drops its attributes by default.
+    def __reduce__(self) -> tuple:
+        return (
+            EnumArray,
+            (self.view(numpy.ndarray), self.possible_values),
+        )
+
     def __eq__(self, other: Any) -> bool:
         # When comparing to an item of self.possible_values, use the item index
         # to speed up the comparison.
@@ -1,6 +1,6 @@
 import os
 import warnings
-from typing import TYPE_CHECKING, Any, List, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
 
 import numpy
 import psutil
@@ -29,6 +29,7 @@ class Holder:
         self._memory_storage = InMemoryStorage(
             is_eternal=(self.variable.definition_period == periods.ETERNITY)
         )
+        self._input_loaders: Dict[Period, Callable[[], ArrayLike]] = {}
 
         # By default, do not activate on-disk storage, or variable dropping
         self._disk_storage = None
@@ -47,9 +48,13 @@ class Holder:
             ):
                 self._do_not_store = True
 
-    def clone(self, population: "Population") -> "Holder":
+    def clone(
+        self, population: "Population", copy_arrays: bool = True
+    ) -> "Holder":
         """
         Copy the holder just enough to be able to run a new simulation without modifying the original simulation.
+
+        If ``copy_arrays`` is False, the clone shares the stored arrays with the original, which must then not be modified in place.
         """
         new = commons.empty_clone(self)
         new_dict = new.__dict__
@@ -63,7 +68,8 @@ class Holder:
             ):
                 new_dict[key] = value
 
-        new._memory_storage = self._memory_storage.clone()
+        new._memory_storage = self._memory_storage.clone(copy_arrays)
+        new._input_loaders = dict(self._input_loaders)
 
         new_dict["population"] = population
         new_dict["simulation"] = population.simulation
@@ -93,10 +99,25 @@ class Holder:
         If ``period`` is not ``None``, only remove all values for any period included in period (e.g. if period is "2017", values for "2017-01", "2017-07", etc. would be removed)
         """
 
+        self._load_inputs()
         self._memory_storage.delete(period, branch_name)
         if self._disk_storage:
             self._disk_storage.delete(period, branch_name)
 
+    def take(self, indices: ArrayLike) -> None:
+        """
+        Keep only the values of the entities at ``indices``, in every period and branch, after the population has been reduced to those entities.
+        """
+        self._load_inputs()
+        self._memory_storage.take(indices)
+        if self._disk_storage:
+            for (
+                branch_name,
+                period,
+            ) in self._disk_storage.get_known_branch_periods():
+                values = self._disk_storage.get(period, branch_name)
+                self._disk_storage.put(values[indices], period, branch_name)
+
     def get_array(
         self, period: Period, branch_name: str = "default"
     ) -> ArrayLike:
@@ -107,20 +128,21 @@ class Holder:
         """
         if self.variable.is_neutralized:
             return self.default_array()
+        self._load_inputs()
         value = self._memory_storage.get(period, branch_name)
+        if value is None and self._disk_storage:
+            value = self._disk_storage.get(period, branch_name)
         if value is None and period in self.get_known_periods():
             # If the value is on a different branch, use that.
             branch_periods = self.get_known_branch_periods()
             branches = [
                 branch
                 for branch, branch_period in branch_periods
-                if period == branch_period
+                if period == branch_period and branch != branch_name
             ]
-            return self.get_array(period, branches[0])
-        if value is not None:
-            return value
-        if self._disk_storage:
-            return self._disk_storage.get(period, branch_name)
+            if branches:
+                return self.get_array(period, branches[0])
+        return value
 
     def get_memory_usage(self) -> dict:
         """
@@ -143,6 +165,7 @@ class Holder:
         >>>    }
         """
 
+        self._load_inputs()
         usage = dict(
             nb_cells_by_array=self.population.count,
             dtype=self.variable.dtype,
@@ -172,6 +195,7 @@ class Holder:
         Get the list of periods the variable value is known for.
         """
 
+        self._load_inputs()
         return list(self._memory_storage.get_known_periods()) + list(
             (
                 self._disk_storage.get_known_periods()
@@ -185,6 +209,7 @@ class Holder:
         Get the list of periods the variable value is known for.
         """
 
+        self._load_inputs()
         return list(self._memory_storage.get_known_branch_periods()) + list(
             (
                 self._disk_storage.get_known_branch_periods()
@@ -193,6 +218,48 @@ class Holder:
             )
         )
 
+    def has_known_values(self) -> bool:
+        """
+        Whether any value of the variable is known, or waiting to be loaded, without loading it.
+        """
+        return bool(self._input_loaders) or len(self.get_known_periods()) > 0
+
+    def set_input_loader(
+        self, period: Period, loader: Callable[[], ArrayLike]
+    ) -> None:
+        """
+        Register a function returning the input value of the variable for ``period``, to be called the first time any value of the variable is needed.
+
+        The value returned is then set as with ``set_input``, in the branch of the holder's simulation.
+        """
+        self._input_loaders[periods.period(period)] = loader
+        self._record_input()
+
+    def _record_input(self) -> None:
+        # Simulations keep track of their input variables as they are set,
+        # rather than checking every variable's holder.
+        if self.simulation is None:
+            return
+        input_variables = getattr(self.simulation, "input_variables", None)
+        if (
+            input_variables is not None
+            and self.variable.name not in input_variables
+        ):
+            input_variables.append(self.variable.name)
+        # Values cached for the dataset no longer apply to these inputs.
+        self.simulation._inputs_differ_from_dataset = True
+
+    def _load_inputs(self) -> None:
+        if not self._input_loaders:
+            return
+        loaders = self._input_loaders
+        self._input_loaders = {}
+        for period, loader in loaders.items():
+            # The input was recorded when the loader was set.
+            self._set_input(
+                period, loader(), self.simulation.branch_name, record=False
+            )
+
     def set_input(
         self, period: Period, array: ArrayLike, branch_name: str = "default"
     ) -> None:
@@ -211,7 +278,15 @@ class Holder:
 
         If a ``set_input`` property has been set for the variable, this method may accept inputs for periods not matching the ``definition_period`` of the variable. To read more about this, check the `documentation <https://openfisca.org/doc/coding-the-legislation/35_periods.html#set-input-automatically-process-variable-inputs-defined-for-periods-not-matching-the-definition-period>`_.
         """
-
+        return self._set_input(period, array, branch_name)
+
+    def _set_input(
+        self,
+        period: Period,
+        array: ArrayLike,
+        branch_name: str = "default",
+        record: bool = True,
+    ) -> None:
         period = periods.period(period)
         if (
             period.unit == periods.ETERNITY
@@ -234,6 +309,8 @@ class Holder:
                 self.variable.name, array
             )
             return warnings.warn(warning_message, Warning)
+        if record:
+            self._record_input()
         if self.variable.value_type in (float, int) and isinstance(array, str):
             array = tools.eval_expression(array)
         if (
@@ -283,6 +360,8 @@ class Holder:
     def _set(
         self, period: Period, value: ArrayLike, branch_name: str = "default"
     ) -> None:
+        # Inputs waiting to be loaded mustn't overwrite values set since.
+        self._load_inputs()
         value = self._to_array(value)
         if self.variable.definition_period != periods.ETERNITY:
             if period is None:
@@ -158,6 +158,9 @@ def uprate_parameters(root: ParameterNode) -> ParameterNode:
                 parameter.values_list.sort(
                     key=lambda x: x.instant_str, reverse=True
                 )
+                # Values uprated with a reformed index are reformed too
+                if getattr(uprating_parameter, "modified", False):
+                    parameter.mark_as_modified()
     return root
 
 
@@ -224,6 +224,7 @@ class ParameterNode(AtInstantLike):
         }
         for child_key, child in clone.children.items():
             setattr(clone, child_key, child)
+            child.parent = clone
         clone._at_instant_cache = {}
 
         return clone
@@ -247,7 +248,7 @@ class ParameterNode(AtInstantLike):
     def clear_parent_cache(self):
         if self.parent is not None:
             self.parent.clear_parent_cache()
-            self._at_instant_cache.clear()
+        self._at_instant_cache.clear()
 
     def mark_as_modified(self):
         self.modified = True
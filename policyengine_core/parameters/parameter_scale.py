@@ -24,6 +24,12 @@ class ParameterScale(AtInstantLike):
     # 'unit' and 'reference' are only listed here for backward compatibility
     _allowed_keys = config.COMMON_KEYS.union({"brackets"})
 
+    parent: "parameters.ParameterNode" = None
+    """The node containing the scale, or None if the scale is detached."""
+
+    modified: bool = False
+    """Whether a bracket of the scale has been updated since loading."""
+
     def __init__(self, name: str, data: dict, file_path: str):
         """
         :param name: name of the scale, eg "taxes.some_scale"
@@ -53,6 +59,7 @@ class ParameterScale(AtInstantLike):
             bracket = parameters.ParameterScaleBracket(
                 name=bracket_name, data=bracket_data, file_path=file_path
             )
+            bracket.parent = self
             brackets.append(bracket)
         self.brackets: typing.List[parameters.ParameterScaleBracket] = brackets
         self.propagate_uprating()
@@ -106,10 +113,21 @@ class ParameterScale(AtInstantLike):
         clone.__dict__ = self.__dict__.copy()
 
         clone.brackets = [bracket.clone() for bracket in self.brackets]
+        for bracket in clone.brackets:
+            bracket.parent = clone
         clone.metadata = copy.deepcopy(self.metadata)
 
         return clone
 
+    def clear_parent_cache(self) -> None:
+        if self.parent is not None:
+            self.parent.clear_parent_cache()
+
+    def mark_as_modified(self) -> None:
+        self.modified = True
+        if self.parent is not None:
+            self.parent.mark_as_modified()
+
     def _get_at_instant(self, instant: Instant) -> TaxScaleLike:
         brackets = [
             bracket.get_at_instant(instant) for bracket in self.brackets
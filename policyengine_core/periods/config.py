@@ -14,6 +14,7 @@ INSTANT_PATTERN = re.compile(
 
 date_by_instant_cache: typing.Dict = {}
 str_by_instant_cache: typing.Dict = {}
+period_by_str_cache: typing.Dict = {}
 year_or_month_or_day_re = re.compile(
     r"(18|19|20)\d{2}(-(0?[1-9]|1[0-2])(-([0-2]?\d|3[0-1]))?)?$"
 )
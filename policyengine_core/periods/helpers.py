@@ -150,7 +150,11 @@ def period(value):
         raise_error(value)
 
     # try to parse as a simple period
-    period = parse_simple_period(value)
+    period = config.period_by_str_cache.get(value)
+    if period is None:
+        period = parse_simple_period(value)
+        if period is not None:
+            config.period_by_str_cache[value] = period
     if period is not None:
         return period
 
@@ -22,6 +22,9 @@ class GroupPopulation(Population):
         self._members_role: ArrayLike = None
         self._members_position: ArrayLike = None
         self._ordered_members_map = None
+        self._nth_members = {}
+        self._members_offsets: ArrayLike = None
+        self._members_order: ArrayLike = None
 
     def __call__(
         self,
@@ -38,12 +41,15 @@ class GroupPopulation(Population):
             return super().__call__(variable_name, period, options)
 
     def clone(
-        self, simulation: "Simulation", members: Population
+        self,
+        simulation: "Simulation",
+        members: Population,
+        copy_arrays: bool = True,
     ) -> "GroupPopulation":
         result = GroupPopulation(self.entity, members)
         result.simulation = simulation
         result._holders = {
-            variable: holder.clone(self)
+            variable: holder.clone(result, copy_arrays)
             for (variable, holder) in self._holders.items()
         }
         result.count = self.count
@@ -52,29 +58,74 @@ class GroupPopulation(Population):
         result._members_role = self._members_role
         result._members_position = self._members_position
         result._ordered_members_map = self._ordered_members_map
+        result._nth_members = self._nth_members
+        result._members_offsets = self._members_offsets
+        result._members_order = self._members_order
         return result
 
+    def _index_members(self) -> None:
+        # Persons sorted by entity (and in their order within each entity),
+        # with the offset of each entity's first member in that order.
+        members_entity_id = numpy.asarray(self.members_entity_id)
+        self._members_order = numpy.argsort(members_entity_id, kind="stable")
+        self._members_offsets = numpy.zeros(self.count + 1, dtype=numpy.int64)
+        numpy.cumsum(
+            numpy.bincount(members_entity_id, minlength=self.count),
+            out=self._members_offsets[1:],
+        )
+
+    @property
+    def members_order(self) -> ArrayLike:
+        """The indices of persons, sorted by entity, with members of the same entity in the order persons appear."""
+        if self._members_order is None and self.members_entity_id is not None:
+            self._index_members()
+        return self._members_order
+
+    @property
+    def members_offsets(self) -> ArrayLike:
+        """For each entity, the position in ``members_order`` of its first member, followed by the number of persons. The members of entity ``i`` are ``members_order[members_offsets[i]:members_offsets[i + 1]]``."""
+        if (
+            self._members_offsets is None
+            and self.members_entity_id is not None
+        ):
+            self._index_members()
+        return self._members_offsets
+
+    def get_members(self, index: int) -> ArrayLike:
+        """
+        Get the indices of the members of an entity, in the order persons appear.
+
+        Args:
+            index (int): The index of the entity.
+
+        Returns:
+            ArrayLike: The indices of its members.
+        """
+        offsets = self.members_offsets
+        return self.members_order[offsets[index] : offsets[index + 1]]
+
     @property
     def members_position(self) -> ArrayLike:
         if (
             self._members_position is None
             and self.members_entity_id is not None
         ):
-            # We could use self.count and self.members.count , but with the current initilization, we are not sure count will be set before members_position is called
-            nb_entities = numpy.max(self.members_entity_id) + 1
-            nb_persons = len(self.members_entity_id)
-            self._members_position = numpy.empty_like(self.members_entity_id)
-            counter_by_entity = numpy.zeros(nb_entities)
-            for k in range(nb_persons):
-                entity_index = self.members_entity_id[k]
-                self._members_position[k] = counter_by_entity[entity_index]
-                counter_by_entity[entity_index] += 1
+            # Each person's position is their rank among the members of their
+            # entity, in the order persons appear.
+            order = self.members_order
+            members_entity_id = numpy.asarray(self.members_entity_id)
+            self._members_position = numpy.empty_like(members_entity_id)
+            self._members_position[order] = (
+                numpy.arange(len(order))
+                - self.members_offsets[members_entity_id[order]]
+            )
 
         return self._members_position
 
     @members_position.setter
     def members_position(self, members_position: ArrayLike) -> None:
         self._members_position = members_position
+        self._nth_members = {}
 
     @property
     def members_entity_id(self) -> ArrayLike:
@@ -83,6 +134,9 @@ class GroupPopulation(Population):
     @members_entity_id.setter
     def members_entity_id(self, members_entity_id: ArrayLike) -> None:
         self._members_entity_id = members_entity_id
+        self._nth_members = {}
+        self._members_offsets = None
+        self._members_order = None
 
     @property
     def members_role(self) -> ArrayLike:
@@ -326,15 +380,18 @@ class GroupPopulation(Population):
         The result is a vector which dimension is the number of entities.
         """
         self.members.check_array_compatible_with_entity(array)
-        positions = self.members_position
-        nb_persons_per_entity = self.nb_persons()
-        members_map = self.ordered_members_map
+        if n not in self._nth_members:
+            # The persons whose position is n, and their entities, are the
+            # same for every array, so they're only found once.
+            nth_members = numpy.flatnonzero(self.members_position == n)
+            self._nth_members[n] = (
+                nth_members,
+                self.members_entity_id[nth_members],
+            )
+        nth_members, entities = self._nth_members[n]
         result = self.filled_array(default, dtype=array.dtype)
         # For households that have at least n persons, set the result as the value of criteria for the person for which the position is n.
-        # The map is needed b/c the order of the nth persons of each household in the persons vector is not necessarily the same than the household order.
-        result[nb_persons_per_entity > n] = array[members_map][
-            positions[members_map] == n
-        ]
+        result[entities] = array[nth_members]
 
         if isinstance(array, EnumArray):
             result = EnumArray(result, array.possible_values)
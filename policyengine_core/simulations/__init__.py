@@ -7,6 +7,18 @@ from .helpers import (
     transform_to_strict_syntax,
 )
 from .microsimulation import Microsimulation
+from .weighted_array import WeightedArray
 from .simulation import Simulation
 from .simulation_builder import SimulationBuilder
 from .individual_sim import IndividualSim
+from .reform_batch import ReformBatch
+from .aggregates import (
+    WeightedAggregate,
+    WeightedCount,
+    WeightedDecileTable,
+    WeightedHistogram,
+    WeightedMean,
+    WeightedQuantiles,
+    WeightedSum,
+)
+from .chunked_microsimulation import ChunkedMicrosimulation
@@ -0,0 +1,502 @@
+from __future__ import annotations
+
+import copy
+from typing import TYPE_CHECKING, Any, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+from policyengine_core.periods import Period
+from policyengine_core.simulations.weighted_array import QUANTILE_TOLERANCE
+
+if TYPE_CHECKING:
+    from policyengine_core.simulations.microsimulation import Microsimulation
+
+
+class WeightedAggregate:
+    """
+    A weighted statistic of a variable, accumulated over parts of a population (for example chunks of a dataset) and mergeable with the same statistic of other parts.
+
+    Args:
+        variable (str): The variable to aggregate.
+        period (Period, optional): The period to calculate the variable for. Defaults to the period of the run.
+        map_to (str, optional): The entity to map the variable to before aggregating it.
+    """
+
+    def __init__(
+        self, variable: str, period: Period = None, map_to: str = None
+    ):
+        self.variable = variable
+        self.period = period
+        self.map_to = map_to
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard everything added so far."""
+
+    def empty(self) -> "WeightedAggregate":
+        """A copy of the aggregate with nothing added to it.
+
+        Returns:
+            WeightedAggregate: The copy.
+        """
+        aggregate = copy.deepcopy(self)
+        aggregate.reset()
+        return aggregate
+
+    def add_simulation(
+        self, simulation: "Microsimulation", period: Period
+    ) -> None:
+        """Add the population of a simulation.
+
+        Args:
+            simulation (Microsimulation): The simulation.
+            period (Period): The period to calculate for.
+        """
+        values = simulation.calculate(
+            self.variable, period, map_to=self.map_to, use_weights=False
+        )
+        weights = simulation.get_weights(
+            self.variable, period, map_to=self.map_to
+        )
+        self.update(np.asarray(values), np.asarray(weights))
+
+    def update(self, values: ArrayLike, weights: ArrayLike) -> None:
+        """Add the values of part of the population.
+
+        Args:
+            values (ArrayLike): The values of the variable.
+            weights (ArrayLike): The weights of the entities.
+        """
+        raise NotImplementedError
+
+    def merge(self, other: "WeightedAggregate") -> None:
+        """Add the statistic of another part of the population.
+
+        Args:
+            other (WeightedAggregate): The same statistic of another part.
+        """
+        raise NotImplementedError
+
+    @property
+    def result(self) -> Any:
+        """The statistic of the population added so far."""
+        raise NotImplementedError
+
+
+class WeightedSum(WeightedAggregate):
+    """The weighted total of a variable."""
+
+    def reset(self) -> None:
+        self.total = 0.0
+
+    def update(self, values: ArrayLike, weights: ArrayLike) -> None:
+        self.total += float(np.dot(values, weights))
+
+    def merge(self, other: "WeightedSum") -> None:
+        self.total += other.total
+
+    @property
+    def result(self) -> float:
+        return self.total
+
+
+class WeightedMean(WeightedAggregate):
+    """The weighted mean of a variable."""
+
+    def reset(self) -> None:
+        self.total = 0.0
+        self.weight = 0.0
+
+    def update(self, values: ArrayLike, weights: ArrayLike) -> None:
+        self.total += float(np.dot(values, weights))
+        self.weight += float(np.sum(weights))
+
+    def merge(self, other: "WeightedMean") -> None:
+        self.total += other.total
+        self.weight += other.weight
+
+    @property
+    def result(self) -> float:
+        if self.weight == 0:
+            return np.nan
+        return self.total / self.weight
+
+
+class WeightedCount(WeightedAggregate):
+    """The weighted number of entities for which a variable is non-zero (or true)."""
+
+    def reset(self) -> None:
+        self.count = 0.0
+
+    def update(self, values: ArrayLike, weights: ArrayLike) -> None:
+        self.count += float(np.sum(weights, where=values != 0))
+
+    def merge(self, other: "WeightedCount") -> None:
+        self.count += other.count
+
+    @property
+    def result(self) -> float:
+        return self.count
+
+
+class WeightedHistogram(WeightedAggregate):
+    """
+    The weighted number of entities whose value of a variable falls in each of a fixed set of bins.
+
+    Args:
+        variable (str): The variable to aggregate.
+        bins (Sequence[float]): The bin edges, as for ``numpy.histogram``.
+        period (Period, optional): The period to calculate the variable for. Defaults to the period of the run.
+        map_to (str, optional): The entity to map the variable to before aggregating it.
+    """
+
+    def __init__(
+        self,
+        variable: str,
+        bins: Sequence[float],
+        period: Period = None,
+        map_to: str = None,
+    ):
+        self.bins = np.asarray(bins, dtype=float)
+        super().__init__(variable, period, map_to)
+
+    def reset(self) -> None:
+        self.counts = np.zeros(len(self.bins) - 1)
+
+    def update(self, values: ArrayLike, weights: ArrayLike) -> None:
+        self.counts += np.histogram(values, self.bins, weights=weights)[0]
+
+    def merge(self, other: "WeightedHistogram") -> None:
+        self.counts += other.counts
+
+    @property
+    def result(self) -> np.ndarray:
+        return self.counts
+
+
+def _compress(
+    keys: np.ndarray,
+    weights: np.ndarray,
+    totals: np.ndarray,
+    size: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Sorts points by key and merges neighbours into at most `size` points of
+    # roughly equal weight, each at the weighted mean of the keys it replaces.
+    order = np.argsort(keys, kind="stable")
+    keys, weights, totals = keys[order], weights[order], totals[order]
+    if len(keys) <= size:
+        return keys, weights, totals
+    cumulative = np.cumsum(weights)
+    groups = np.minimum(
+        ((cumulative - weights / 2) / cumulative[-1] * size).astype(int),
+        size - 1,
+    )
+    group_weights = np.bincount(groups, weights, minlength=size)
+    group_keys = np.bincount(groups, keys * weights, minlength=size)
+    present = group_weights > 0
+    return (
+        group_keys[present] / group_weights[present],
+        group_weights[present],
+        np.bincount(groups, totals, minlength=size)[present],
+    )
+
+
+class WeightedQuantiles(WeightedAggregate):
+    """
+    Weighted quantiles of a variable, estimated from a mergeable sketch of its distribution.
+
+    The sketch summarises the population by at most ``size`` points, each standing for a slice of roughly equal weight, so each quantile is accurate to within about ``1 / size`` of the population.
+
+    Args:
+        variable (str): The variable to aggregate.
+        quantiles (Sequence[float], optional): The quantiles to estimate, between 0 and 1. Defaults to the median.
+        size (int, optional): The maximum number of points in the sketch. Defaults to 1,000.
+        period (Period, optional): The period to calculate the variable for. Defaults to the period of the run.
+        map_to (str, optional): The entity to map the variable to before aggregating it.
+    """
+
+    def __init__(
+        self,
+        variable: str,
+        quantiles: Sequence[float] = (0.5,),
+        size: int = 1_000,
+        period: Period = None,
+        map_to: str = None,
+    ):
+        self.quantiles = np.asarray(quantiles, dtype=float)
+        self.size = size
+        super().__init__(variable, period, map_to)
+
+    def reset(self) -> None:
+        self.values = np.zeros(0)
+        self.weights = np.zeros(0)
+
+    def _add(self, values: np.ndarray, weights: np.ndarray) -> None:
+        self.values, self.weights, _ = _compress(
+            np.concatenate([self.values, values]),
+            np.concatenate([self.weights, weights]),
+            np.zeros(len(self.values) + len(values)),
+            self.size,
+        )
+
+    def update(self, values: ArrayLike, weights: ArrayLike) -> None:
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        positive = weights > 0
+        self._add(values[positive], weights[positive])
+
+    def merge(self, other: "WeightedQuantiles") -> None:
+        self._add(other.values, other.weights)
+
+    @property
+    def result(self) -> np.ndarray:
+        if len(self.values) == 0:
+            return np.full(len(self.quantiles), np.nan)
+        # Each point's weight is centred on its value.
+        cumulative = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(
+            self.quantiles * self.weights.sum(), cumulative, self.values
+        )
+
+
+class WeightedDecileTable(WeightedAggregate):
+    """
+    The weighted total and mean of a variable in each decile of the population ranked by another variable, estimated from a mergeable sketch.
+
+    The result is a table with one row per decile, giving the weight of the decile and the total and mean of the variable in it. Entities on the boundary between deciles are split between them in proportion to their weight.
+
+    Args:
+        variable (str): The variable to aggregate.
+        rank_by (str): The variable to rank entities by. It must belong to the same entity as ``variable``, after mapping.
+        size (int, optional): The maximum number of points in the sketch. Defaults to 1,000.
+        period (Period, optional): The period to calculate the variables for. Defaults to the period of the run.
+        map_to (str, optional): The entity to map both variables to before aggregating them.
+    """
+
+    def __init__(
+        self,
+        variable: str,
+        rank_by: str,
+        size: int = 1_000,
+        period: Period = None,
+        map_to: str = None,
+    ):
+        self.rank_by = rank_by
+        self.size = size
+        super().__init__(variable, period, map_to)
+
+    def reset(self) -> None:
+        self.ranks = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.totals = np.zeros(0)
+
+    def add_simulation(
+        self, simulation: "Microsimulation", period: Period
+    ) -> None:
+        values = simulation.calculate(
+            self.variable, period, map_to=self.map_to, use_weights=False
+        )
+        ranks = simulation.calculate(
+            self.rank_by, period, map_to=self.map_to, use_weights=False
+        )
+        weights = simulation.get_weights(
+            self.variable, period, map_to=self.map_to
+        )
+        self.update(np.asarray(values), np.asarray(weights), np.asarray(ranks))
+
+    def _add(
+        self, ranks: np.ndarray, weights: np.ndarray, totals: np.ndarray
+    ) -> None:
+        self.ranks, self.weights, self.totals = _compress(
+            np.concatenate([self.ranks, ranks]),
+            np.concatenate([self.weights, weights]),
+            np.concatenate([self.totals, totals]),
+            self.size,
+        )
+
+    def update(
+        self, values: ArrayLike, weights: ArrayLike, ranks: ArrayLike
+    ) -> None:
+        """Add the values of part of the population.
+
+        Args:
+            values (ArrayLike): The values of the variable.
+            weights (ArrayLike): The weights of the entities.
+            ranks (ArrayLike): The values of the variable to rank by.
+        """
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        ranks = np.asarray(ranks, dtype=float)
+        positive = weights > 0
+        self._add(
+            ranks[positive],
+            weights[positive],
+            values[positive] * weights[positive],
+        )
+
+    def merge(self, other: "WeightedDecileTable") -> None:
+        self._add(other.ranks, other.weights, other.totals)
+
+    @property
+    def result(self) -> pd.DataFrame:
+        total_weight = self.weights.sum()
+        boundaries = np.linspace(0, total_weight, 11)
+        cumulative_weights = np.concatenate([[0], np.cumsum(self.weights)])
+        cumulative_totals = np.concatenate([[0], np.cumsum(self.totals)])
+        weights = np.diff(boundaries)
+        totals = np.diff(
+            np.interp(boundaries, cumulative_weights, cumulative_totals)
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = totals / weights
+        return pd.DataFrame(
+            {"weight": weights, "total": totals, "mean": means},
+            index=pd.RangeIndex(1, 11, name="decile"),
+        )
+
+
+def weighted_decile_rank(values: ArrayLike, weights: ArrayLike) -> np.ndarray:
+    """The weighted decile (1 to 10) of each value, as ``MicroSeries.decile_rank`` calculates it: values tied with each other share a decile.
+
+    Args:
+        values (ArrayLike): The values to rank.
+        weights (ArrayLike): The weights of the values.
+
+    Returns:
+        np.ndarray: The decile of each value.
+    """
+    values = np.asarray(values)
+    weights = np.asarray(weights, dtype=float)
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    cumulative = np.cumsum(weights[order])
+    # Tied values all take the cumulative weight at the end of their run.
+    run_ends = np.searchsorted(sorted_values, sorted_values, side="right") - 1
+    ranks = np.empty(len(values))
+    ranks[order] = np.minimum(cumulative[run_ends] / cumulative[-1], 1)
+    return np.minimum(np.ceil(ranks * 10), 10).astype(int)
+
+
+def _parse_quantile(stat: str) -> float:
+    # "median" and percentiles written as "p10", "p90" and so on.
+    if stat == "median":
+        return 0.5
+    if stat.startswith("p"):
+        try:
+            percentile = float(stat[1:])
+        except ValueError:
+            percentile = None
+        if percentile is not None and 0 <= percentile <= 100:
+            return percentile / 100
+    return None
+
+
+def _grouped_quantiles(
+    values: np.ndarray,
+    weights: np.ndarray,
+    groups: np.ndarray,
+    group_count: int,
+    quantiles: Sequence[float],
+) -> np.ndarray:
+    # Weighted quantiles of each group, from one sort of all values by group
+    # and value, with the same definition as WeightedArray.quantile.
+    result = np.full((len(quantiles), group_count), np.nan)
+    included = (weights > 0) & ~np.isnan(values)
+    values, weights, groups = (
+        values[included],
+        weights[included],
+        groups[included],
+    )
+    if len(values) == 0:
+        return result
+    order = np.lexsort((values, groups))
+    values, weights, groups = values[order], weights[order], groups[order]
+    present = np.unique(groups)
+    starts = np.searchsorted(groups, present)
+    ends = np.searchsorted(groups, present, side="right")
+    # Running totals of the weight within each group, from one running total
+    # of all weights. Rounding in these is allowed for when comparing shares
+    # with the quantiles.
+    cumulative = np.cumsum(weights)
+    offsets = np.concatenate(([0], cumulative[starts[1:] - 1]))
+    within = cumulative - np.repeat(offsets, ends - starts)
+    totals = np.bincount(groups, weights, minlength=group_count)
+    shares = within / totals[groups]
+    indices = np.arange(len(values))
+    for row, quantile in enumerate(quantiles):
+        reached = np.where(
+            shares >= quantile - QUANTILE_TOLERANCE, indices, len(values)
+        )
+        positions = np.minimum(np.minimum.reduceat(reached, starts), ends - 1)
+        result[row, present] = values[positions]
+    return result
+
+
+def grouped_weighted_statistics(
+    values: ArrayLike,
+    weights: ArrayLike,
+    groups: ArrayLike,
+    group_count: int,
+    stats: Sequence[str],
+) -> np.ndarray:
+    """Weighted statistics of values in each of a number of groups, each calculated in one pass over the values.
+
+    The statistics can be "sum", "mean", "count" (the weight of non-zero values), "weight" (the weight of all values), "median" and percentiles such as "p90". Missing values are ignored.
+
+    Args:
+        values (ArrayLike): The values.
+        weights (ArrayLike): The weights of the values.
+        groups (ArrayLike): The group of each value, from 0 to ``group_count - 1``.
+        group_count (int): The number of groups.
+        stats (Sequence[str]): The statistics to calculate.
+
+    Returns:
+        np.ndarray: An array with a row for each statistic and a column for each group.
+    """
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    groups = np.asarray(groups)
+    valid = ~np.isnan(values)
+    valid_weights = weights * valid
+    filled_values = np.where(valid, values, 0)
+    result = np.empty((len(stats), group_count))
+    quantile_stats = []
+    for i, stat in enumerate(stats):
+        if stat == "sum":
+            result[i] = np.bincount(
+                groups, filled_values * weights, minlength=group_count
+            )
+        elif stat == "mean":
+            totals = np.bincount(
+                groups, filled_values * weights, minlength=group_count
+            )
+            group_weights = np.bincount(
+                groups, valid_weights, minlength=group_count
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[i] = totals / group_weights
+        elif stat == "count":
+            result[i] = np.bincount(
+                groups,
+                valid_weights * (filled_values != 0),
+                minlength=group_count,
+            )
+        elif stat == "weight":
+            result[i] = np.bincount(groups, weights, minlength=group_count)
+        elif _parse_quantile(stat) is not None:
+            quantile_stats.append(i)
+        else:
+            raise ValueError(
+                f"Unknown statistic '{stat}'. Use sum, mean, count, weight, median or a percentile such as p90."
+            )
+    if quantile_stats:
+        result[quantile_stats] = _grouped_quantiles(
+            values,
+            weights,
+            groups,
+            group_count,
+            [_parse_quantile(stats[i]) for i in quantile_stats],
+        )
+    return result
@@ -0,0 +1,433 @@
+import gc
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+import h5py
+import numpy as np
+
+from policyengine_core.data.dataset import (
+    Dataset,
+    get_array_entity,
+    get_member_positions,
+)
+from policyengine_core.enums import Enum, EnumArray
+from policyengine_core.periods import Period
+from policyengine_core.periods import period as get_period
+from policyengine_core.reforms import Reform
+from policyengine_core.simulations.aggregates import WeightedAggregate
+from policyengine_core.simulations.microsimulation import Microsimulation
+from policyengine_core.simulations.parallel import (
+    _calculate_values,
+    allocate_shared_arrays,
+    can_fork,
+    map_forked,
+)
+
+Partition = Dict[str, np.ndarray]
+
+_MAX_READ_GAP = 4_096
+"""The most values between two members of a chunk which are read over, rather than reading each side separately."""
+
+
+class _ChunkDataset(Dataset):
+    # A chunk of a dataset, held in memory. It is named after the span of
+    # the dataset it covers, so that it has its own macro cache.
+
+    def __init__(self, dataset: Dataset, name: str, data: dict):
+        self.name = name
+        self.label = dataset.label
+        self.data_format = dataset.data_format
+        self.file_path = dataset.file_path
+        self.time_period = dataset.time_period
+        self._data = data
+        super().__init__()
+
+    def load(self, key: str = None, mode: str = "r") -> dict:
+        return self._data
+
+
+class ChunkedMicrosimulation:
+    """
+    Runs a microsimulation over a dataset in chunks of households (or another group entity), so that only one chunk is held in memory at a time.
+
+    Each chunk contains whole households, and every other group entity must fall within a single household. Each chunk is run as a separate simulation, sharing one tax-benefit system, and its results are either added to weighted aggregates, written to a file or gathered into arrays for the whole dataset. Chunks can be run in parallel in worker processes.
+
+    Args:
+        simulation_class (Type[Microsimulation]): The microsimulation class of the country package.
+        dataset (Union[Type[Dataset], Dataset]): The dataset, in the ``Dataset.ARRAYS`` or ``Dataset.TIME_PERIOD_ARRAYS`` format.
+        chunk_size (int, optional): The number of households in each chunk. Defaults to 10,000.
+        reform (Reform, optional): A reform to apply to every chunk.
+        partition_entity (str, optional): The key of the group entity to partition by. Defaults to "household", or the first group entity if there is none.
+    """
+
+    def __init__(
+        self,
+        simulation_class: Type[Microsimulation],
+        dataset: Union[Type[Dataset], Dataset],
+        chunk_size: int = 10_000,
+        reform: Reform = None,
+        partition_entity: str = None,
+    ):
+        if isinstance(dataset, type):
+            dataset = dataset(require=True)
+        if dataset.data_format not in (
+            Dataset.ARRAYS,
+            Dataset.TIME_PERIOD_ARRAYS,
+        ):
+            raise ValueError(
+                f"Datasets in the {dataset.data_format} format can't be split into chunks."
+            )
+        self.simulation_class = simulation_class
+        self.dataset = dataset
+        self.chunk_size = chunk_size
+        self.reform = reform
+        self.tax_benefit_system = simulation_class.default_tax_benefit_system(
+            reform=reform
+        )
+        group_entity_keys = [
+            entity.key for entity in self.tax_benefit_system.group_entities
+        ]
+        if partition_entity is None:
+            partition_entity = (
+                "household"
+                if "household" in group_entity_keys
+                else group_entity_keys[0]
+            )
+        elif partition_entity not in group_entity_keys:
+            raise ValueError(f"{partition_entity} is not a group entity.")
+        self.partition_entity = partition_entity
+        self._partitions: List[Partition] = None
+
+    def _read_eternity_array(self, data: h5py.File, name: str) -> np.ndarray:
+        values = data[name]
+        if isinstance(values, h5py.Group):
+            values = values[list(values.keys())[0]]
+        return values[()]
+
+    def _get_array_entity(self, name: str) -> Optional[str]:
+        return get_array_entity(self.tax_benefit_system, name)
+
+    def get_partitions(self) -> List[Partition]:
+        """Split the dataset into chunks.
+
+        Returns:
+            List[Partition]: For each chunk, the positions of its members of each entity in the dataset's arrays, in increasing order.
+        """
+        if self._partitions is not None:
+            return self._partitions
+        person = self.tax_benefit_system.person_entity
+        partition_entity = self.partition_entity
+        with self.dataset.load() as data:
+
+            def get_positions(entity_key: str) -> np.ndarray:
+                # The position of each person's entity in the entity's arrays.
+                return get_member_positions(
+                    self._read_eternity_array(data, f"{entity_key}_id"),
+                    self._read_eternity_array(
+                        data, f"{person.key}_{entity_key}_id"
+                    ),
+                )
+
+            partition_count = len(
+                self._read_eternity_array(data, f"{partition_entity}_id")
+            )
+            partition_chunks = np.arange(partition_count) // self.chunk_size
+            person_chunks = partition_chunks[get_positions(partition_entity)]
+            chunks = {
+                person.key: person_chunks,
+                partition_entity: partition_chunks,
+            }
+            for group_entity in self.tax_benefit_system.group_entities:
+                if group_entity.key == partition_entity:
+                    continue
+                positions = get_positions(group_entity.key)
+                group_chunks = np.zeros(
+                    len(
+                        self._read_eternity_array(
+                            data, f"{group_entity.key}_id"
+                        )
+                    ),
+                    dtype=partition_chunks.dtype,
+                )
+                group_chunks[positions] = person_chunks
+                if (group_chunks[positions] != person_chunks).any():
+                    raise ValueError(
+                        f"Some {group_entity.plural} have members in more than one of the {self.tax_benefit_system.get_entity(partition_entity).plural} they are partitioned by."
+                    )
+                chunks[group_entity.key] = group_chunks
+
+        chunk_count = -(-partition_count // self.chunk_size)
+        self._partitions = [{} for _ in range(chunk_count)]
+        for entity_key, entity_chunks in chunks.items():
+            order = np.argsort(entity_chunks, kind="stable")
+            bounds = np.searchsorted(
+                entity_chunks[order], np.arange(chunk_count + 1)
+            )
+            for chunk, partition in enumerate(self._partitions):
+                partition[entity_key] = order[
+                    bounds[chunk] : bounds[chunk + 1]
+                ]
+        return self._partitions
+
+    def _get_chunk_data(self, data: h5py.File, partition: Partition) -> dict:
+        def get_values(name: str, values: h5py.Dataset) -> np.ndarray:
+            entity_key = self._get_array_entity(name)
+            positions = partition[entity_key]
+            if len(positions) == 0:
+                return values[:0]
+            # Members are read in runs, each spanning only small gaps, so that
+            # little more of the file than the chunk is read when members
+            # aren't stored together.
+            runs = np.split(
+                positions,
+                np.flatnonzero(np.diff(positions) > _MAX_READ_GAP + 1) + 1,
+            )
+            return np.concatenate(
+                [values[run[0] : run[-1] + 1][run - run[0]] for run in runs]
+            )
+
+        chunk_data = {}
+        for name in data:
+            if self._get_array_entity(name) is None:
+                continue
+            if isinstance(data[name], h5py.Group):
+                chunk_data[name] = {
+                    time_period: get_values(name, values)
+                    for time_period, values in data[name].items()
+                }
+            else:
+                chunk_data[name] = get_values(name, data[name])
+        return chunk_data
+
+    def get_chunk(self, partition: Partition) -> Microsimulation:
+        """Build the simulation of a chunk of the dataset.
+
+        Args:
+            partition (Partition): The chunk, as returned by ``get_partitions``.
+
+        Returns:
+            Microsimulation: The simulation.
+        """
+        with self.dataset.load() as data:
+            chunk_data = self._get_chunk_data(data, partition)
+        positions = partition[self.partition_entity]
+        start, stop = (
+            (positions[0], positions[-1] + 1) if len(positions) else (0, 0)
+        )
+        chunk_dataset = _ChunkDataset(
+            self.dataset,
+            f"{self.dataset.name}_chunk_{start}_{stop}",
+            chunk_data,
+        )
+        return self.simulation_class(
+            tax_benefit_system=self.tax_benefit_system, dataset=chunk_dataset
+        )
+
+    def simulations(self) -> Iterator[Tuple[Microsimulation, Partition]]:
+        """Build the simulation of each chunk in turn.
+
+        Yields:
+            Tuple[Microsimulation, Partition]: The simulation of a chunk, and the positions of its entities in the dataset.
+        """
+        for partition in self.get_partitions():
+            yield self.get_chunk(partition), partition
+            self._release_chunk()
+
+    def _release_chunk(self) -> None:
+        # Simulations reference themselves through their populations and
+        # holders, so a finished chunk is only freed by the cycle collector,
+        # which would otherwise let several build up.
+        self.tax_benefit_system.simulation = None
+        gc.collect()
+
+    def _map_chunks(
+        self,
+        function: Callable[[Microsimulation, Partition], object],
+        processes: int = None,
+    ) -> list:
+        # Applies a function to the simulation of each chunk, in worker
+        # processes if asked to. Workers are forked after the partitions are
+        # found, and each opens the dataset itself when building a chunk.
+        partitions = self.get_partitions()
+
+        def run_chunk(chunk: int) -> object:
+            partition = partitions[chunk]
+            try:
+                return function(self.get_chunk(partition), partition)
+            finally:
+                self._release_chunk()
+
+        chunks = range(len(partitions))
+        if processes is None or processes <= 1 or not can_fork():
+            return [run_chunk(chunk) for chunk in chunks]
+        return map_forked(run_chunk, chunks, min(processes, len(chunks)))
+
+    def _get_period(
+        self, simulation: Microsimulation, period: Period = None
+    ) -> Period:
+        if period is None:
+            period = simulation.default_calculation_period
+        return get_period(period)
+
+    def aggregate(
+        self,
+        aggregates: Sequence[WeightedAggregate],
+        period: Period = None,
+        processes: int = None,
+    ) -> Sequence[WeightedAggregate]:
+        """Add every chunk of the dataset to weighted aggregates.
+
+        Args:
+            aggregates (Sequence[WeightedAggregate]): The aggregates.
+            period (Period, optional): The period to calculate for, where the aggregate doesn't specify one. Defaults to the dataset's time period.
+            processes (int, optional): The number of worker processes to run chunks in. Each chunk's aggregates are sent back and merged. Defaults to running chunks in this process.
+
+        Returns:
+            Sequence[WeightedAggregate]: The aggregates.
+        """
+
+        def aggregate_chunk(
+            simulation: Microsimulation, partition: Partition
+        ) -> List[WeightedAggregate]:
+            chunk_aggregates = [aggregate.empty() for aggregate in aggregates]
+            for aggregate in chunk_aggregates:
+                aggregate.add_simulation(
+                    simulation,
+                    self._get_period(simulation, aggregate.period or period),
+                )
+            return chunk_aggregates
+
+        for chunk_aggregates in self._map_chunks(aggregate_chunk, processes):
+            for aggregate, chunk_aggregate in zip(
+                aggregates, chunk_aggregates
+            ):
+                aggregate.merge(chunk_aggregate)
+        return aggregates
+
+    def calculate(
+        self,
+        variables: Union[str, Sequence[str]],
+        period: Period = None,
+        processes: int = None,
+    ) -> Dict[str, np.ndarray]:
+        """Calculate variables over the whole dataset, chunk by chunk.
+
+        Results of worker processes are written to shared memory in place, rather than sent back, wherever the variable's values are numeric.
+
+        Args:
+            variables (Union[str, Sequence[str]]): The variable or variables to calculate.
+            period (Period, optional): The period to calculate for. Defaults to the dataset's time period.
+            processes (int, optional): The number of worker processes to run chunks in. Defaults to running chunks in this process.
+
+        Returns:
+            Dict[str, np.ndarray]: The values of each variable, one for each of its entity in the dataset, in the dataset's order.
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+        partitions = self.get_partitions()
+        entity_keys = {
+            variable: self.tax_benefit_system.get_variable(
+                variable, check_existence=True
+            ).entity.key
+            for variable in variables
+        }
+        layout = {
+            variable: (
+                sum(len(partition[entity_key]) for partition in partitions),
+                np.dtype(self.tax_benefit_system.get_variable(variable).dtype),
+            )
+            for variable, entity_key in entity_keys.items()
+        }
+        shared = processes is not None and processes > 1 and can_fork()
+        if shared:
+            # Python objects can't live in shared memory.
+            outputs = allocate_shared_arrays(
+                {
+                    variable: (count, dtype)
+                    for variable, (count, dtype) in layout.items()
+                    if not dtype.hasobject
+                }
+            )
+        else:
+            outputs = {}
+        for variable, (count, dtype) in layout.items():
+            if variable not in outputs:
+                outputs[variable] = np.empty(count, dtype=dtype)
+
+        def calculate_chunk(
+            simulation: Microsimulation, partition: Partition
+        ) -> Dict[str, np.ndarray]:
+            unshared = {}
+            calculation_period = self._get_period(simulation, period)
+            for variable, entity_key in entity_keys.items():
+                values = np.asarray(
+                    _calculate_values(simulation, variable, calculation_period)
+                )
+                output = outputs[variable]
+                if shared and output.dtype.hasobject:
+                    unshared[variable] = values
+                else:
+                    output[partition[entity_key]] = values
+            return unshared
+
+        for partition, unshared in zip(
+            partitions, self._map_chunks(calculate_chunk, processes)
+        ):
+            for variable, values in unshared.items():
+                outputs[variable][partition[entity_keys[variable]]] = values
+
+        for variable in variables:
+            definition = self.tax_benefit_system.get_variable(variable)
+            if definition.value_type == Enum:
+                outputs[variable] = EnumArray(
+                    outputs[variable], definition.possible_values
+                )
+        return outputs
+
+    def calculate_to_file(
+        self, variables: Sequence[str], file_path: str, period: Period = None
+    ) -> None:
+        """Calculate variables chunk by chunk, writing them to an HDF5 file as they are calculated.
+
+        Each variable is written to a dataset of the file named after it, with one value for each of its entity in the dataset, in the dataset's order. Enum values are written as their names.
+
+        Args:
+            variables (Sequence[str]): The variables to calculate.
+            file_path (str): The path of the file to write.
+            period (Period, optional): The period to calculate for. Defaults to the dataset's time period.
+        """
+        partitions = self.get_partitions()
+        with h5py.File(file_path, "w") as output:
+            for simulation, partition in self.simulations():
+                calculation_period = self._get_period(simulation, period)
+                for variable in variables:
+                    entity_key = self.tax_benefit_system.get_variable(
+                        variable, check_existence=True
+                    ).entity.key
+                    values = np.asarray(
+                        simulation.calculate(
+                            variable, calculation_period, use_weights=False
+                        )
+                    )
+                    dtype = values.dtype
+                    if dtype.kind in "OU":
+                        dtype = h5py.string_dtype()
+                        values = values.astype(str).astype(object)
+                    if variable not in output:
+                        count = sum(
+                            len(chunk[entity_key]) for chunk in partitions
+                        )
+                        output.create_dataset(
+                            variable, shape=(count,), dtype=dtype
+                        )
+                    if len(values) > 0:
+                        output[variable][partition[entity_key]] = values
@@ -11,6 +11,7 @@ from policyengine_core.entities.entity import Entity
 from policyengine_core.periods import period
 from policyengine_core.reforms import Reform, set_parameter
 from policyengine_core.simulations import SimulationBuilder, Simulation
+from policyengine_core.simulations.reform_batch import ReformBatch
 from policyengine_core.taxbenefitsystems.tax_benefit_system import (
     TaxBenefitSystem,
 )
@@ -40,6 +41,7 @@ class IndividualSim:
         self.system = tax_benefit_system or self.tax_benefit_system()
         self.sim_builder = SimulationBuilder()
         self.parametric_vary = False
+        self.parametric_batch = None
         self.entities = {var.key: var for var in self.system.entities}
         self.situation_data = {
             entity.plural: {} for entity in self.system.entities
@@ -92,6 +94,7 @@ class IndividualSim:
         )
         self.simulation.trace = True
         self.sim = self.simulation
+        self.parametric_batch = None
 
     def add_data(
         self,
@@ -239,32 +242,65 @@ class IndividualSim:
         if not hasattr(self, "simulation"):
             self.build()
 
+        period = period or self.year
         if self.parametric_vary and reform is None:
+            batch = self._get_parametric_batch()
+            # The baseline is calculated first, so that each point of the
+            # sweep only recalculates what depends on the parameter.
+            self._calculate(self.simulation, var, period)
             results = [
-                self.calc(
+                self._format_result(
+                    self._calculate(batch.get_branch(name), var, period),
                     var,
-                    period=period,
                     target=target,
                     index=index,
                     map_to=map_to,
-                    reform=reform,
                 )
-                for reform in self.parametric_reforms
+                for name in batch.reforms
             ]
             return np.array(results)
 
         if reform is not None:
             reform.apply(self)
 
-        period = period or self.year
-        entity = self.system.variables[var].entity
+        result = self._calculate(self.simulation, var, period)
+        return self._format_result(
+            result, var, target=target, index=index, map_to=map_to
+        )
+
+    def _calculate(
+        self, simulation: Simulation, var: str, period: int
+    ) -> np.array:
         try:
-            result = self.simulation.calculate(var, period)
+            return simulation.calculate(var, period)
         except:
             try:
-                result = self.sim.calculate_add(var, period)
+                return simulation.calculate_add(var, period)
             except:
-                result = self.simulation.calculate_divide(var, period)
+                return simulation.calculate_divide(var, period)
+
+    def _get_parametric_batch(self) -> ReformBatch:
+        # Each point of a parametric sweep is a branch of the simulation,
+        # sharing its inputs and the values the parameter doesn't affect.
+        if self.parametric_batch is None:
+            self.parametric_batch = ReformBatch(
+                self.simulation,
+                {
+                    f"parametric_vary_{i}": reform
+                    for i, reform in enumerate(self.parametric_reforms)
+                },
+            )
+        return self.parametric_batch
+
+    def _format_result(
+        self,
+        result: np.array,
+        var: str,
+        target: str = None,
+        index: int = None,
+        map_to: str = None,
+    ) -> np.array:
+        entity = self.system.variables[var].entity
         if (
             target is not None
             and target not in self.situation_data[entity.plural]
@@ -380,3 +416,4 @@ class IndividualSim:
                 set_parameter(parameter, value, period or "year:2022:10")
                 for value in parameter_values
             ]
+            self.parametric_batch = None
@@ -1,18 +1,29 @@
-from typing import Dict, Type
+from typing import Dict, List, Type, Union
 
 from microdf import MicroDataFrame, MicroSeries
 import numpy as np
+import pandas as pd
 from policyengine_core.data.dataset import Dataset
+from policyengine_core.enums import EnumArray
 from policyengine_core.periods import Period
 from policyengine_core.periods import period as get_period
 from policyengine_core.periods.config import MONTH, YEAR
+from policyengine_core.simulations.aggregates import (
+    grouped_weighted_statistics,
+    weighted_decile_rank,
+)
 from policyengine_core.simulations.simulation import Simulation
+from policyengine_core.simulations.weighted_array import WeightedArray
 from policyengine_core.types import ArrayLike
 
 
 class Microsimulation(Simulation):
     """A `Simulation` whose entities use weights to represent larger populations."""
 
+    def __init__(self, *args, **kwargs):
+        self._weights_cache: Dict[tuple, ArrayLike] = {}
+        super().__init__(*args, **kwargs)
+
     def get_weights(
         self, variable_name: str, period: Period, map_to: str = None
     ) -> ArrayLike:
@@ -23,22 +34,48 @@ class Microsimulation(Simulation):
         weight_variable = self.tax_benefit_system.get_variable(
             weight_variable_name
         )
-        weights = None
 
         if time_period.unit == weight_variable.definition_period:
-            weights = self.calculate(
-                weight_variable_name, time_period, use_weights=False
-            )
+            weight_period = time_period
         elif (time_period.unit == MONTH) and (
             weight_variable.definition_period == YEAR
         ):
             # Common use-case. To-do: implement others if needed.
+            weight_period = time_period.this_year
+        else:
+            return None
+
+        # Weights are looked up for every weighted result, so are kept until
+        # the array stored for them changes (for example by set_input).
+        holder = self.get_holder(weight_variable_name)
+        key = (weight_variable_name, weight_period, self.branch_name)
+        weights = self._weights_cache.get(key)
+        if (
+            weights is not None
+            and holder.get_array(weight_period, self.branch_name) is weights
+        ):
+            return weights
+        dependency_tracer = self.parameter_dependency_tracer
+        if dependency_tracer is None:
             weights = self.calculate(
-                weight_variable_name, time_period.this_year, use_weights=False
+                weight_variable_name, weight_period, use_weights=False
             )
-
+        else:
+            # Weights are attached to results rather than used to compute
+            # them, so aren't a dependency of the calculation in progress.
+            with dependency_tracer.record_separately():
+                weights = self.calculate(
+                    weight_variable_name, weight_period, use_weights=False
+                )
+        if holder.get_array(weight_period, self.branch_name) is weights:
+            self._weights_cache[key] = weights
         return weights
 
+    def clone(self, *args, **kwargs) -> "Microsimulation":
+        new = super().clone(*args, **kwargs)
+        new._weights_cache = {}
+        return new
+
     def calculate(
         self,
         variable_name: str,
@@ -55,7 +92,142 @@ class Microsimulation(Simulation):
         if not use_weights:
             return values
         weights = self.get_weights(variable_name, period, map_to)
-        return MicroSeries(np.array(values), weights=weights)
+        return MicroSeries(np.asarray(values), weights=weights)
+
+    def calculate_weighted(
+        self,
+        variable_name: str,
+        period: Period = None,
+        map_to: str = None,
+        decode_enums: bool = True,
+    ) -> WeightedArray:
+        """Calculate a variable, returning its values with their weights as numpy arrays rather than a ``MicroSeries``.
+
+        Args:
+            variable_name (str): The name of the variable to calculate.
+            period (Period, optional): The period to calculate the variable for.
+            map_to (str, optional): The entity to map the result to.
+            decode_enums (bool, optional): Whether to decode enums to strings. Defaults to True.
+
+        Returns:
+            WeightedArray: The values and their weights.
+        """
+        if period is not None and not isinstance(period, Period):
+            period = get_period(period)
+        elif period is None and self.default_calculation_period is not None:
+            period = get_period(self.default_calculation_period)
+        values = super().calculate(variable_name, period, map_to, decode_enums)
+        return WeightedArray(
+            values, self.get_weights(variable_name, period, map_to)
+        )
+
+    def aggregate(
+        self,
+        variables: Union[str, List[str]],
+        by: Union[str, List[str]] = None,
+        stats: Union[str, List[str]] = "sum",
+        period: Period = None,
+        map_to: str = None,
+        decile_by: str = None,
+    ) -> pd.DataFrame:
+        """Weighted statistics of variables, overall or broken down by the values of other variables.
+
+        Each statistic is calculated for every group at once, with ``numpy.bincount`` (or a single sort, for quantiles), rather than one group at a time.
+
+        Args:
+            variables (Union[str, List[str]]): The variable, or variables, to aggregate.
+            by (Union[str, List[str]], optional): The variable, or variables, to group by. Enums are grouped by their names.
+            stats (Union[str, List[str]], optional): The statistic, or statistics: "sum", "mean", "count" (the weight of non-zero values, such as the number of people in poverty), "weight", "median" or a percentile such as "p90". Defaults to "sum".
+            period (Period, optional): The period to calculate for.
+            map_to (str, optional): The entity to aggregate over. Defaults to the entity of the first variable.
+            decile_by (str, optional): A variable to rank entities by, grouping them (before any ``by`` groups) into its weighted deciles, numbered from 1 to 10.
+
+        Returns:
+            pd.DataFrame: A row for each group present, indexed by the values of the grouping variables, and a column for each statistic. If several variables are given, columns are indexed by variable and statistic.
+        """
+        if period is not None and not isinstance(period, Period):
+            period = get_period(period)
+        elif period is None and self.default_calculation_period is not None:
+            period = get_period(self.default_calculation_period)
+        single_variable = isinstance(variables, str)
+        variables = [variables] if single_variable else list(variables)
+        by = [by] if isinstance(by, str) else list(by or [])
+        stats = [stats] if isinstance(stats, str) else list(stats)
+        entity = (
+            map_to
+            or self.tax_benefit_system.get_variable(variables[0]).entity.key
+        )
+
+        def get_values(variable_name: str, decode_enums: bool) -> np.ndarray:
+            source_entity = self.tax_benefit_system.get_variable(
+                variable_name
+            ).entity.key
+            return np.asarray(
+                super(Microsimulation, self).calculate(
+                    variable_name,
+                    period,
+                    map_to=entity if source_entity != entity else None,
+                    decode_enums=decode_enums,
+                )
+            )
+
+        weights = np.asarray(self.get_weights(variables[0], period, entity))
+
+        group_names = []
+        group_codes = []
+        group_labels = []
+        if decile_by is not None:
+            group_names.append("decile")
+            deciles = weighted_decile_rank(
+                get_values(decile_by, False), weights
+            )
+            labels, codes = np.unique(deciles, return_inverse=True)
+            group_labels.append(labels)
+            group_codes.append(codes)
+        for variable_name in by:
+            group_names.append(variable_name)
+            labels, codes = np.unique(
+                get_values(variable_name, True), return_inverse=True
+            )
+            group_labels.append(labels)
+            group_codes.append(codes)
+
+        if group_codes:
+            # Only combinations of groups that are present get a row.
+            dimensions = [len(labels) for labels in group_labels]
+            present, groups = np.unique(
+                np.ravel_multi_index(group_codes, dimensions),
+                return_inverse=True,
+            )
+            positions = np.unravel_index(present, dimensions)
+            index = pd.MultiIndex.from_arrays(
+                [
+                    labels[position]
+                    for labels, position in zip(group_labels, positions)
+                ],
+                names=group_names,
+            )
+            if len(group_names) == 1:
+                index = index.get_level_values(0)
+        else:
+            groups = np.zeros(len(weights), dtype=int)
+            index = pd.Index(["total"])
+
+        columns = {}
+        for variable_name in variables:
+            results = grouped_weighted_statistics(
+                get_values(variable_name, False),
+                weights,
+                groups,
+                len(index),
+                stats,
+            )
+            for stat, result in zip(stats, results):
+                columns[variable_name, stat] = result
+        table = pd.DataFrame(columns, index=index)
+        if single_variable:
+            table.columns = table.columns.droplevel(0)
+        return table
 
     def calculate_add(
         self,
@@ -68,7 +240,7 @@ class Microsimulation(Simulation):
         if not use_weights:
             return values
         weights = self.get_weights(variable_name, period)
-        return MicroSeries(np.array(values), weights=weights)
+        return MicroSeries(np.asarray(values), weights=weights)
 
     def calculate_divide(
         self,
@@ -81,7 +253,7 @@ class Microsimulation(Simulation):
         if not use_weights:
             return values
         weights = self.get_weights(variable_name, period)
-        return MicroSeries(np.array(values), weights=weights)
+        return MicroSeries(np.asarray(values), weights=weights)
 
     def calculate_dataframe(
         self,
@@ -99,3 +271,30 @@ class Microsimulation(Simulation):
             return values
         weights = self.get_weights(variable_names[0], period)
         return MicroDataFrame(values, weights=weights)
+
+    def calculate_branches(
+        self,
+        branches: List[str],
+        variables: Union[str, List[str]],
+        period: Period = None,
+        processes: int = None,
+        use_weights: bool = True,
+        decode_enums: bool = True,
+    ) -> Dict[str, Dict[str, MicroSeries]]:
+        if period is not None and not isinstance(period, Period):
+            period = get_period(period)
+        elif period is None and self.default_calculation_period is not None:
+            period = get_period(self.default_calculation_period)
+        results = super().calculate_branches(
+            branches, variables, period, processes
+        )
+        for name, values_by_variable in results.items():
+            branch = self.get_branch(name)
+            for variable_name, values in values_by_variable.items():
+                if isinstance(values, EnumArray) and decode_enums:
+                    values = values.decode_to_str()
+                if use_weights:
+                    weights = branch.get_weights(variable_name, period)
+                    values = MicroSeries(values, weights=weights)
+                values_by_variable[variable_name] = values
+        return results
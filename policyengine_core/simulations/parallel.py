@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import ctypes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from policyengine_core.enums import Enum, EnumArray
+from policyengine_core.periods import Period
+
+if TYPE_CHECKING:
+    from policyengine_core.simulations.simulation import Simulation
+
+# Offsets of arrays in the shared block are rounded up to this many bytes.
+ALIGNMENT = 64
+
+# The function being run by forked worker processes, which inherit it (and
+# everything it references, such as simulations and output buffers) instead
+# of receiving it pickled.
+_forked_function: Callable = None
+
+
+class _SharedBuffer:
+    """
+    Exposes part of a shared memory block to numpy.
+
+    Arrays built on it keep it, and so the block, alive for as long as they are used, without holding a buffer export that would stop the block from being closed once they are gone.
+    """
+
+    def __init__(
+        self,
+        shared_memory: SharedMemory,
+        offset: int,
+        shape: Tuple[int],
+        dtype: np.dtype,
+    ):
+        self.shared_memory = shared_memory
+        address = ctypes.addressof(
+            ctypes.c_char.from_buffer(shared_memory.buf)
+        )
+        self.__array_interface__ = dict(
+            shape=shape,
+            typestr=dtype.str,
+            descr=dtype.descr,
+            data=(address + offset, False),
+            version=3,
+        )
+
+
+def can_fork() -> bool:
+    """Whether worker processes can be forked from this one."""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def allocate_shared_arrays(
+    layout: Dict[Hashable, Tuple[int, np.dtype]],
+) -> Dict[Hashable, np.ndarray]:
+    """Allocate one-dimensional arrays in a single shared memory block, which processes forked afterwards write to in place.
+
+    Args:
+        layout (Dict[Hashable, Tuple[int, np.dtype]]): The length and type of each array, by key. Types must not contain Python objects.
+
+    Returns:
+        Dict[Hashable, np.ndarray]: The arrays, by key.
+    """
+    offsets = {}
+    size = 0
+    for key, (count, dtype) in layout.items():
+        offsets[key] = size
+        size += -(-count * np.dtype(dtype).itemsize // ALIGNMENT) * ALIGNMENT
+    if not layout:
+        return {}
+    shared_memory = SharedMemory(create=True, size=max(size, 1))
+    # Forked workers inherit the mapping, so the name is no longer needed
+    # and nothing is left behind if a worker dies.
+    shared_memory.unlink()
+    return {
+        key: np.asarray(
+            _SharedBuffer(
+                shared_memory, offsets[key], (count,), np.dtype(dtype)
+            )
+        )
+        for key, (count, dtype) in layout.items()
+    }
+
+
+def _call_forked_function(argument: Any) -> Any:
+    return _forked_function(argument)
+
+
+def map_forked(
+    function: Callable, arguments: Sequence, processes: int
+) -> List:
+    """Call a function on each of a sequence of arguments in worker processes forked from this one.
+
+    The function isn't pickled, so it can be a closure over large objects, which workers inherit. Arguments and results are pickled.
+
+    Args:
+        function (Callable): The function.
+        arguments (Sequence): The arguments to call it on.
+        processes (int): The maximum number of worker processes.
+
+    Returns:
+        List: The results, in the order of the arguments.
+    """
+    global _forked_function
+    _forked_function = function
+    try:
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            return list(executor.map(_call_forked_function, arguments))
+    finally:
+        _forked_function = None
+
+
+def _calculate_values(
+    simulation: "Simulation", variable: str, period: Period
+) -> ArrayLike:
+    # Simulation subclasses format their results after calculating them, but
+    # only the values themselves are exchanged between processes.
+    from policyengine_core.simulations.simulation import Simulation
+
+    return Simulation.calculate(simulation, variable, period)
+
+
+class BranchCalculation:
+    """
+    Calculates the same variables in several branches of a simulation, each branch in a worker process forked from this one.
+
+    Workers inherit the simulations, and so their inputs, from this process rather than receiving a pickled copy. Results are written to a shared memory block allocated before forking, and returned as arrays viewing it rather than being pickled back.
+
+    Args:
+        branches (Dict[str, Simulation]): The simulations to calculate in, by branch name.
+        variables (List[str]): The variables to calculate.
+        period (Period): The period to calculate for.
+    """
+
+    def __init__(
+        self,
+        branches: Dict[str, "Simulation"],
+        variables: List[str],
+        period: Period,
+    ):
+        self.branches = branches
+        self.variables = variables
+        self.period = period
+        self.outputs: Dict[Tuple[str, str], np.ndarray] = {}
+
+    def _allocate_outputs(self) -> None:
+        layout = {}
+        for name, simulation in self.branches.items():
+            for variable_name in self.variables:
+                variable = simulation.tax_benefit_system.get_variable(
+                    variable_name, check_existence=True
+                )
+                dtype = np.dtype(variable.dtype)
+                if dtype.hasobject:
+                    # Python objects can't live in shared memory.
+                    continue
+                count = simulation.get_variable_population(variable_name).count
+                layout[name, variable_name] = count, dtype
+        self.outputs = allocate_shared_arrays(layout)
+
+    def calculate_branch(self, name: str) -> Dict[str, ArrayLike]:
+        """Calculate the variables in one branch, writing them to the shared outputs where possible.
+
+        Args:
+            name (str): The name of the branch.
+
+        Returns:
+            Dict[str, ArrayLike]: The values that could not be written to the shared outputs, by variable.
+        """
+        simulation = self.branches[name]
+        unshared = {}
+        for variable in self.variables:
+            values = _calculate_values(simulation, variable, self.period)
+            output = self.outputs.get((name, variable))
+            if (
+                output is not None
+                and isinstance(values, np.ndarray)
+                and values.shape == output.shape
+                and values.dtype == output.dtype
+            ):
+                output[...] = values
+            else:
+                unshared[variable] = values
+        return unshared
+
+    def calculate(
+        self, processes: int = None
+    ) -> Dict[str, Dict[str, ArrayLike]]:
+        """Calculate the variables in every branch.
+
+        Args:
+            processes (int, optional): The maximum number of worker processes. Defaults to one per branch.
+
+        Returns:
+            Dict[str, Dict[str, ArrayLike]]: The values, by variable, for each branch.
+        """
+        names = list(self.branches)
+        if processes is None:
+            processes = len(names)
+        processes = min(processes, len(names))
+        if processes <= 1 or not can_fork():
+            return {
+                name: {
+                    variable: _calculate_values(
+                        self.branches[name], variable, self.period
+                    )
+                    for variable in self.variables
+                }
+                for name in names
+            }
+
+        self._allocate_outputs()
+        unshared = dict(
+            zip(names, map_forked(self.calculate_branch, names, processes))
+        )
+
+        results = {}
+        for name in names:
+            simulation = self.branches[name]
+            results[name] = {}
+            for variable_name in self.variables:
+                if variable_name in unshared[name]:
+                    values = unshared[name][variable_name]
+                else:
+                    values = self.outputs[name, variable_name]
+                    variable = simulation.tax_benefit_system.get_variable(
+                        variable_name
+                    )
+                    if variable.value_type == Enum:
+                        values = EnumArray(values, variable.possible_values)
+                results[name][variable_name] = values
+        return results
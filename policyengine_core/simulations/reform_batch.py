@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Union
+
+from policyengine_core.periods import Period
+from policyengine_core.types import ArrayLike
+
+if TYPE_CHECKING:
+    from policyengine_core.reforms import Reform
+    from policyengine_core.simulations.simulation import Simulation
+
+BASELINE = "baseline"
+
+
+class ReformBatch:
+    """
+    Evaluates many reforms against one baseline simulation.
+
+    Each reform is applied to a branch of the baseline, which shares its inputs with it rather than copying them, and takes the values of variables the reform does not affect from the baseline rather than recalculating them. The dataset is loaded, and the baseline calculated, only once.
+
+    Args:
+        simulation (Simulation): The baseline simulation.
+        reforms (Dict[str, Union[Reform, dict, tuple]]): The reforms to evaluate, by name.
+
+    Example:
+
+    >>> batch = ReformBatch(simulation, {"low": low_rate, "high": high_rate})
+    >>> results = batch.calculate("income_tax", 2022)
+    >>> results["high"]["income_tax"] - results["baseline"]["income_tax"]
+    """
+
+    def __init__(
+        self,
+        simulation: "Simulation",
+        reforms: Dict[str, Union["Reform", dict, tuple]],
+    ):
+        for name in reforms:
+            if name == BASELINE or name == simulation.branch_name:
+                raise ValueError(
+                    f"'{name}' is reserved for the baseline and can't be used as a reform name."
+                )
+            if name in simulation.branches:
+                raise ValueError(
+                    f"The simulation already has a branch named '{name}'."
+                )
+        self.simulation = simulation
+        self.reforms = dict(reforms)
+        self.branches: Dict[str, "Simulation"] = {}
+        # Recording the baseline's parameter dependencies lets branches tell
+        # which baseline values their reform leaves unchanged.
+        simulation.infer_parameter_dependencies = True
+
+    def get_branch(self, name: str) -> "Simulation":
+        """Get the simulation evaluating a reform, creating it if needed.
+
+        Args:
+            name (str): The name of the reform, or "baseline".
+
+        Returns:
+            Simulation: The simulation.
+        """
+        if name == BASELINE:
+            return self.simulation
+        if name in self.branches:
+            return self.branches[name]
+        if name not in self.reforms:
+            raise KeyError(f"There is no reform named '{name}'.")
+        simulation = self.simulation
+        branch = simulation.get_branch(
+            name, clone_system=True, copy_arrays=False
+        )
+        # Values calculated under the baseline policy are only valid for the
+        # branch if its reform doesn't affect them, which it checks itself.
+        for population in branch.populations.values():
+            for variable, holder in population._holders.items():
+                if variable not in simulation.input_variables:
+                    holder.delete_arrays()
+        branch.apply_reform(self.reforms[name])
+        branch.baseline = simulation
+        branch.reuse_baseline_values = True
+        self.branches[name] = branch
+        return branch
+
+    def calculate_branch(
+        self, name: str, variables: List[str], period: Period = None
+    ) -> Dict[str, ArrayLike]:
+        """Calculate variables under a single reform, or the baseline.
+
+        Args:
+            name (str): The name of the reform, or "baseline".
+            variables (List[str]): The variables to calculate.
+            period (Period, optional): The period to calculate for. Defaults to the simulation's default calculation period.
+
+        Returns:
+            Dict[str, ArrayLike]: The values, by variable.
+        """
+        branch = self.get_branch(name)
+        return {
+            variable: branch.calculate(variable, period)
+            for variable in variables
+        }
+
+    def calculate(
+        self,
+        variables: Union[str, List[str]],
+        period: Period = None,
+        processes: int = None,
+    ) -> Dict[str, Dict[str, ArrayLike]]:
+        """Calculate variables under the baseline and every reform.
+
+        Args:
+            variables (Union[str, List[str]]): The variable or variables to calculate.
+            period (Period, optional): The period to calculate for. Defaults to the simulation's default calculation period.
+            processes (int, optional): The number of worker processes to evaluate reforms in, as with ``Simulation.calculate_branches``. Defaults to evaluating reforms in this process.
+
+        Returns:
+            Dict[str, Dict[str, ArrayLike]]: The values, by variable, for "baseline" and each reform.
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+        # The baseline is calculated first, so that branches (including
+        # forked ones) know which of its values they can reuse.
+        results = {
+            BASELINE: self.calculate_branch(BASELINE, variables, period)
+        }
+        names = list(self.reforms)
+        if processes is not None and processes > 1:
+            # Branches are created here, so that workers inherit them.
+            for name in names:
+                self.get_branch(name)
+            results.update(
+                self.simulation.calculate_branches(
+                    names, variables, period, processes
+                )
+            )
+        else:
+            for name in names:
+                results[name] = self.calculate_branch(name, variables, period)
+        return results
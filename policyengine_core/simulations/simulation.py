@@ -1,6 +1,17 @@
+import functools
 import tempfile
-from typing import TYPE_CHECKING, Any, Dict, List, Type, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Type,
+    Union,
+)
 
+import h5py
 import numpy as np
 import pandas as pd
 from numpy.typing import ArrayLike
@@ -8,6 +19,10 @@ import logging
 from pathlib import Path
 
 from policyengine_core import commons, periods
+from policyengine_core.data.columnar import (
+    ColumnarTable,
+    write_columnar_file,
+)
 from policyengine_core.data.dataset import Dataset
 from policyengine_core.entities.entity import Entity
 from policyengine_core.enums import Enum, EnumArray
@@ -18,8 +33,11 @@ from policyengine_core.periods.config import ETERNITY, MONTH, YEAR
 from policyengine_core.periods.helpers import period
 from policyengine_core.tracers import (
     FullTracer,
+    ParameterDependencyTracer,
     SimpleTracer,
+    TracingParameterNode,
     TracingParameterNodeAtInstant,
+    VariableDependencyTracer,
 )
 import random
 from policyengine_core.tools.hugging_face import *
@@ -27,6 +45,9 @@ from policyengine_core.tools.hugging_face import *
 import json
 
 if TYPE_CHECKING:
+    from policyengine_core.simulations.simulation_builder import (
+        SimulationBuilder,
+    )
     from policyengine_core.taxbenefitsystems import TaxBenefitSystem
 
 from policyengine_core.experimental import MemoryConfig
@@ -72,15 +93,39 @@ class Simulation:
     is_over_dataset: bool = False
     """Whether this simulation is built over a dataset."""
 
+    lazy_inputs: bool = False
+    """Whether to read each input variable from the dataset only when its values are first needed, rather than all of them when the simulation is built."""
+
     macro_cache_read: bool = False
     """Whether to read from the macro cache."""
 
     macro_cache_write: bool = False
     """Whether to write to the macro cache."""
 
+    infer_parameter_dependencies: bool = False
+    """Whether to record the parameters each calculation depends on. Dependencies are always recorded when reading from the macro cache."""
+
+    reuse_baseline_values: Optional[bool] = None
+    """Whether a reform simulation takes the values of variables which don't depend on any reformed parameter from its baseline, instead of recalculating them. Defaults to doing so for simulations built with a reform."""
+
+    _inputs_differ_from_baseline: bool = False
+
+    _inputs_differ_from_dataset: bool = False
+
+    parameter_dependency_tracer: ParameterDependencyTracer = None
+    """The record of the parameters and variables each calculation depends on, shared with branches of the simulation."""
+
     start_instant: str = None
     """The earliest data input instant of the simulation."""
 
+    variable_dependency_tracer: VariableDependencyTracer = None
+    """The variables each variable's calculations have been seen to request, recorded for derivatives."""
+
+    _traced_dependencies: set = None
+
+    situation_offsets: Dict[str, np.ndarray] = None
+    """For a simulation built from several situations, the index of the first entity of each situation (and the number of entities, at the end), by entity key."""
+
     def __init__(
         self,
         tax_benefit_system: "TaxBenefitSystem" = None,
@@ -118,6 +163,7 @@ class Simulation:
         self.tracer: SimpleTracer = (
             SimpleTracer() if not trace else FullTracer()
         )
+        self.parameter_dependency_tracer = ParameterDependencyTracer()
         self.opt_out_cache: bool = False
         # controls the spirals detection; check for performance impact if > 1
         self.max_spiral_loops: int = 10
@@ -126,6 +172,7 @@ class Simulation:
 
         self.branches: Dict[str, Simulation] = {}
         self.has_axes = False
+        self.input_variables: List[str] = []
 
         np.random.seed(0)
 
@@ -152,17 +199,7 @@ class Simulation:
         if dataset is not None:
             if isinstance(dataset, str):
                 if "hf://" in dataset:
-                    owner, repo, filename = dataset.split("/")[-3:]
-                    if "@" in filename:
-                        version = filename.split("@")[-1]
-                        filename = filename.split("@")[0]
-                    else:
-                        version = None
-                    dataset = download_huggingface_dataset(
-                        repo=f"{owner}/{repo}",
-                        repo_filename=filename,
-                        version=version,
-                    )
+                    dataset = resolve_huggingface_url(dataset)
                 datasets_by_name = {
                     dataset.name: dataset for dataset in self.datasets
                 }
@@ -191,22 +228,19 @@ class Simulation:
         self.calc = self.calculate
         self.df = self.calculate_dataframe
 
-        self.input_variables = [
-            variable.name
-            for variable in self.tax_benefit_system.variables.values()
-            if len(self.get_holder(variable.name).get_known_periods()) > 0
-        ]
-
         self.situation_input = situation
         if self.situation_input is not None:
-            original_input = json.loads(json.dumps(self.situation_input))
+            original_input = self.situation_input
             if original_input.get("axes") is not None:
-                original_input["axes"] = {}
+                original_input = dict(original_input, axes={})
             # Hash the situation input to a random number, so situations with axes behave the
             # same ways as the same situations without axes.
             hashed_input = hash(json.dumps(original_input)) % 1000000
             np.random.seed(hashed_input)
 
+        if self.reuse_baseline_values is None:
+            self.reuse_baseline_values = reform is not None
+
         if reform is not None:
             self.baseline = self.get_branch("baseline")
             self.baseline.trace = self.trace
@@ -236,10 +270,6 @@ class Simulation:
         Args:
             populations (Dict[str, Population]): A dictionary of populations, indexed by entity key.
         """
-        self.populations = populations
-        self.link_to_entities_instances()
-        self.create_shortcuts()
-
         self.populations = populations
         self.persons: Population = self.populations[
             self.tax_benefit_system.person_entity.key
@@ -247,84 +277,48 @@ class Simulation:
         self.link_to_entities_instances()
         self.create_shortcuts()
 
-    def build_from_dataset(self) -> None:
-        """Build a simulation from a dataset."""
-        self.build_from_populations(
-            self.tax_benefit_system.instantiate_entities()
-        )
-        from policyengine_core.simulations.simulation_builder import (
-            SimulationBuilder,
-        )  # Import here to avoid circular dependency
-
-        builder = SimulationBuilder()
-        builder.populations = self.populations
-
-        try:
-            data = self.dataset.load()
-        except FileNotFoundError as e:
-            raise FileNotFoundError(
-                f"The dataset file {self.dataset.name} could not be found. "
-                + "Make sure you have downloaded or built it using the `policyengine-core data` command."
-            ) from e
-
-        if self.dataset.data_format == Dataset.FLAT_FILE:
-            data_copy = {col: data[col].values for col in data.copy().columns}
-            data = {col: data[col].values for col in data.columns}
+        # Values set before the populations joined the simulation.
+        for population in populations.values():
+            for name, holder in population._holders.items():
+                if (
+                    name not in self.input_variables
+                    and holder.has_known_values()
+                ):
+                    self.input_variables.append(name)
 
+    def _build_from_arrays(
+        self, data: dict, builder: "SimulationBuilder"
+    ) -> None:
         person_entity = self.tax_benefit_system.person_entity
         entity_id_field = f"{person_entity.key}_id"
 
         def get_eternity_array(name):
-            if self.dataset.data_format == Dataset.FLAT_FILE:
-                # Look for any column with variablename__timeperiod
-                for col in data:
-                    if col.split("__")[0] == name:
-                        return data[col]
-            elif self.dataset.data_format == Dataset.TIME_PERIOD_ARRAYS:
+            if self.dataset.data_format == Dataset.TIME_PERIOD_ARRAYS:
                 return data[name][list(data[name].keys())[0]]
             return data[name]
 
-        if self.dataset.data_format != Dataset.FLAT_FILE:
-            assert (
-                entity_id_field in data
-            ), f"Missing {entity_id_field} column in the dataset. Each person entity must have an ID array defined for ETERNITY."
-        elif entity_id_field not in data:
-            data[entity_id_field] = np.arange(
-                len(get_eternity_array("person_id"))
-            )
+        assert (
+            entity_id_field in data
+        ), f"Missing {entity_id_field} column in the dataset. Each person entity must have an ID array defined for ETERNITY."
 
         entity_ids = get_eternity_array(entity_id_field)
         builder.declare_person_entity(person_entity.key, entity_ids)
 
         for group_entity in self.tax_benefit_system.group_entities:
             entity_id_field = f"{group_entity.key}_id"
-            if self.dataset.data_format != Dataset.FLAT_FILE:
-                assert (
-                    entity_id_field in data
-                ), f"Missing {entity_id_field} column in the dataset. Each group entity must have an ID array defined for ETERNITY."
-                entity_ids = get_eternity_array(entity_id_field)
-            elif entity_id_field not in data:
-                entity_id_field_values = get_eternity_array(
-                    f"person_{group_entity.key}_id"
-                )
-                if entity_id_field_values is not None:
-                    entity_ids = np.arange(
-                        len(np.unique(entity_id_field_values))
-                    )
-                else:
-                    entity_ids = np.arange(len(data[list(data.keys())[0]]))
+            assert (
+                entity_id_field in data
+            ), f"Missing {entity_id_field} column in the dataset. Each group entity must have an ID array defined for ETERNITY."
+            entity_ids = get_eternity_array(entity_id_field)
 
             builder.declare_entity(group_entity.key, entity_ids)
 
             person_membership_id_field = (
                 f"{person_entity.key}_{group_entity.key}_id"
             )
-            if self.dataset.data_format != Dataset.FLAT_FILE:
-                assert (
-                    person_membership_id_field in data
-                ), f"Missing {person_membership_id_field} column in the dataset. Each group entity must have a person membership array defined for ETERNITY."
-            elif person_membership_id_field not in data:
-                data[person_membership_id_field] = np.arange(len(data))
+            assert (
+                person_membership_id_field in data
+            ), f"Missing {person_membership_id_field} column in the dataset. Each group entity must have a person membership array defined for ETERNITY."
             person_membership_ids = get_eternity_array(
                 person_membership_id_field
             )
@@ -348,62 +342,148 @@ class Simulation:
 
         self.build_from_populations(builder.populations)
 
-        if self.dataset.data_format == Dataset.FLAT_FILE:
-            # Ensure we're back to all person-level data.
-            data = data_copy
-
-        if self.dataset.data_format != Dataset.FLAT_FILE:
-            for variable in data:
-                if variable in self.tax_benefit_system.variables:
-                    if self.dataset.data_format == Dataset.TIME_PERIOD_ARRAYS:
-                        for time_period in data[variable]:
-                            self.set_input(
-                                variable,
-                                time_period,
-                                data[variable][time_period],
-                            )
-                    else:
-                        self.set_input(
-                            variable, self.dataset.time_period, data[variable]
-                        )
-                else:
-                    # Silently skip.
-                    pass
-        else:
-            for variable in data:
-                if "__" in variable:
-                    variable_name, time_period = variable.split("__")
+        lazy = self.lazy_inputs and isinstance(data, h5py.File)
+        for variable in data:
+            if variable in self.tax_benefit_system.variables:
+                if self.dataset.data_format == Dataset.TIME_PERIOD_ARRAYS:
+                    inputs = [
+                        (time_period, data[variable][time_period])
+                        for time_period in data[variable]
+                    ]
                 else:
-                    variable_name = variable
-                    time_period = (
-                        self.dataset.time_period or self.default_input_period
-                    )
+                    inputs = [(self.dataset.time_period, data[variable])]
+                for time_period, values in inputs:
+                    if lazy:
+                        self.set_input_loader(
+                            variable,
+                            time_period,
+                            functools.partial(values.__getitem__, ()),
+                        )
+                    else:
+                        self.set_input(variable, time_period, values)
+            else:
+                # Silently skip.
+                pass
 
-                if variable_name not in self.tax_benefit_system.variables:
-                    continue
+    def _build_from_flat_file(
+        self,
+        data: Union[pd.DataFrame, ColumnarTable],
+        builder: "SimulationBuilder",
+    ) -> None:
+        # Each row is a person, and each column a variable, optionally
+        # followed by "__" and a time period. Column names are only parsed
+        # once, and columns only read when they are used (which, for
+        # columnar files, is the only time they are read from disk).
+        columns_by_variable: Dict[str, List[tuple]] = {}
+        for column in data.columns:
+            variable_name, _, time_period = column.partition("__")
+            columns_by_variable.setdefault(variable_name, []).append(
+                (column, time_period or None)
+            )
+        person_count = len(data)
 
-                variable_meta = self.tax_benefit_system.get_variable(
-                    variable_name
+        def get_eternity_array(name):
+            columns = columns_by_variable.get(name)
+            if columns is None:
+                return None
+            return np.asarray(data[columns[0][0]])
+
+        person_entity = self.tax_benefit_system.person_entity
+        entity_ids = get_eternity_array(f"{person_entity.key}_id")
+        if entity_ids is None:
+            entity_ids = np.arange(person_count)
+        builder.declare_person_entity(person_entity.key, entity_ids)
+
+        for group_entity in self.tax_benefit_system.group_entities:
+            group_ids = get_eternity_array(f"{group_entity.key}_id")
+            person_membership_ids = get_eternity_array(
+                f"{person_entity.key}_{group_entity.key}_id"
+            )
+            if person_membership_ids is None:
+                person_membership_ids = (
+                    group_ids
+                    if group_ids is not None
+                    else np.arange(person_count)
                 )
-                entity = variable_meta.entity
-                population = self.get_population(entity.plural)
+            if group_ids is not None:
+                entity_ids = np.unique(group_ids)
+            else:
+                entity_ids = np.arange(len(np.unique(person_membership_ids)))
+            builder.declare_entity(group_entity.key, entity_ids)
 
-                # All data should be person level
-                if len(data[variable]) != len(population.ids):
-                    population: GroupPopulation
-                    entity_level_data = population.value_from_first_person(
-                        data[variable]
+            person_roles = get_eternity_array(
+                f"{person_entity.key}_{group_entity.key}_role"
+            )
+            if person_roles is None:
+                person_roles = get_eternity_array("role")
+            if person_roles is None:
+                if self.default_role is None:
+                    raise ValueError(
+                        f"Missing {person_entity.key}_{group_entity.key}_role column in the dataset. Each group entity must have a person role array defined for ETERNITY."
                     )
-                else:
-                    entity_level_data = data[variable]
+                person_roles = np.full(person_count, self.default_role)
+            builder.join_with_persons(
+                self.populations[group_entity.key],
+                person_membership_ids,
+                person_roles,
+            )
+
+        self.build_from_populations(builder.populations)
 
-                self.set_input(variable_name, time_period, entity_level_data)
+        default_time_period = (
+            self.dataset.time_period or self.default_input_period
+        )
+        for variable_name, columns in columns_by_variable.items():
+            variable = self.tax_benefit_system.variables.get(variable_name)
+            if variable is None:
+                continue
+            population = self.get_variable_population(variable_name)
+            for column, time_period in columns:
+                values = np.asarray(data[column])
+                if len(values) != population.count:
+                    # All data is person level.
+                    population: GroupPopulation
+                    values = population.value_from_first_person(values)
+                elif values.dtype == variable.dtype:
+                    # Holders keep arrays of the right type as they are,
+                    # which shouldn't be views of the dataset's data.
+                    values = values.copy()
+                self.set_input(
+                    variable_name, time_period or default_time_period, values
+                )
+
+    def build_from_dataset(self) -> None:
+        """Build a simulation from a dataset."""
+        self.build_from_populations(
+            self.tax_benefit_system.instantiate_entities()
+        )
+        from policyengine_core.simulations.simulation_builder import (
+            SimulationBuilder,
+        )  # Import here to avoid circular dependency
+
+        builder = SimulationBuilder()
+        builder.populations = self.populations
+
+        try:
+            data = self.dataset.load()
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"The dataset file {self.dataset.name} could not be found. "
+                + "Make sure you have downloaded or built it using the `policyengine-core data` command."
+            ) from e
+
+        if self.dataset.data_format in (Dataset.FLAT_FILE, Dataset.COLUMNAR):
+            self._build_from_flat_file(data, builder)
+        else:
+            self._build_from_arrays(data, builder)
 
         self.default_calculation_period = (
             self.dataset.time_period or self.default_calculation_period
         )
 
         self.tax_benefit_system.data_modified = False
+        # Only inputs set from now on make the macro cache stale.
+        self._inputs_differ_from_dataset = False
 
     @property
     def trace(self) -> bool:
@@ -462,6 +542,15 @@ class Simulation:
             ArrayLike: The calculated variable.
         """
 
+        # Parameters read by the simulation itself aren't read by a formula.
+        tax_benefit_system = None
+        if self.parameter_dependency_tracer is not None:
+            tax_benefit_system = self.tax_benefit_system
+            parameter_read_hook = getattr(
+                tax_benefit_system, "_parameter_read_hook", None
+            )
+            tax_benefit_system._parameter_read_hook = None
+
         if period is not None and not isinstance(period, Period):
             period = periods.period(period)
         elif period is None and self.default_calculation_period is not None:
@@ -470,6 +559,13 @@ class Simulation:
         self.tracer.record_calculation_start(
             variable_name, period, self.branch_name
         )
+        dependency_tracer = self._get_recording_dependency_tracer()
+        if dependency_tracer is not None:
+            dependency_tracer.record_calculation_start(
+                variable_name, period, self.branch_name
+            )
+        elif self.parameter_dependency_tracer is not None:
+            self.parameter_dependency_tracer.record_untraced_calculation()
 
         np.random.seed(hash(variable_name + str(period)) % 1000000)
 
@@ -486,7 +582,13 @@ class Simulation:
             return result
         finally:
             self.tracer.record_calculation_end()
+            if dependency_tracer is not None:
+                dependency_tracer.record_calculation_end()
+                if not dependency_tracer.stack:
+                    self._save_parameter_dependencies()
             self.purge_cache_of_invalid_values()
+            if tax_benefit_system is not None:
+                tax_benefit_system._parameter_read_hook = parameter_read_hook
 
     def map_result(
         self,
@@ -606,23 +708,49 @@ class Simulation:
             variable_name, check_existence=True
         )
 
+        dependency_tracer = self._get_recording_dependency_tracer()
+
         # Check if we've neutralized via parameters.
-        try:
-            if (
-                variable.is_neutralized
-                or self.tax_benefit_system.parameters(period).gov.abolitions[
-                    variable.name
-                ]
-            ):
-                return holder.default_array()
-        except Exception as e:
-            pass
+        if (
+            period is not None
+            and variable_name
+            in self.tax_benefit_system.get_abolished_variables(period)
+        ):
+            if dependency_tracer is not None:
+                dependency_tracer.record_calculation_complete(
+                    variable_name, period
+                )
+            return holder.default_array()
+        if dependency_tracer is not None:
+            abolition = f"gov.abolitions.{variable_name}"
+            try:
+                get_parameter(self.tax_benefit_system.parameters, abolition)
+            except ValueError:
+                pass
+            else:
+                dependency_tracer.record_parameter_access(
+                    abolition, period, self.branch_name, False
+                )
 
         # First look for a value already cached
         cached_array = holder.get_array(period, self.branch_name)
         if cached_array is not None:
+            if dependency_tracer is not None and (
+                variable_name in self.input_variables
+                or (variable.is_input_variable() and variable.uprating is None)
+            ):
+                dependency_tracer.record_calculation_complete(
+                    variable_name, period
+                )
             return cached_array
 
+        baseline_array = self._get_unaffected_baseline_value(
+            variable_name, period
+        )
+        if baseline_array is not None:
+            holder.put_in_cache(baseline_array, period, self.branch_name)
+            return baseline_array
+
         smc = SimulationMacroCache(self.tax_benefit_system)
 
         # Check if cache can be used, if available, check if path exists
@@ -646,6 +774,7 @@ class Simulation:
                     value = smc.get_cache_value(cache_path)
 
                 if value is not None:
+                    holder.put_in_cache(value, period, self.branch_name)
                     return value
 
         if variable.requires_computation_after is not None:
@@ -668,20 +797,27 @@ class Simulation:
         if variable.definition_period == MONTH and period.unit == YEAR:
             if variable.quantity_type == QuantityType.STOCK:
                 contained_months = period.get_subperiods(MONTH)
-                values = self._calculate(variable_name, contained_months[-1])
+                values = self._calculate_within(
+                    variable_name, contained_months[-1]
+                )
             else:
                 values = self.calculate_add(variable_name, period)
             alternate_period_handling = True
         elif variable.definition_period == YEAR and period.unit == MONTH:
             alternate_period_handling = True
             if variable.quantity_type == QuantityType.STOCK:
-                values = self._calculate(variable_name, period.this_year)
+                values = self._calculate_within(
+                    variable_name, period.this_year
+                )
             else:
                 values = self.calculate_divide(variable_name, period)
 
         if alternate_period_handling:
-            if is_cache_available:
-                smc.set_cache_value(cache_path, values)
+            if dependency_tracer is not None:
+                dependency_tracer.record_calculation_complete(
+                    variable_name, period
+                )
+            self._set_macro_cache_value(smc, variable_name, period, values)
             return values
 
         self._check_period_consistency(period, variable)
@@ -697,6 +833,10 @@ class Simulation:
                 array = holder.default_array()
                 array = self._cast_formula_result(array, variable)
                 holder.put_in_cache(array, period, self.branch_name)
+                if dependency_tracer is not None:
+                    dependency_tracer.record_calculation_complete(
+                        variable_name, period
+                    )
                 return array
 
         array = None
@@ -729,6 +869,10 @@ class Simulation:
                         raise ValueError(
                             f"Could not find uprating parameter {variable.uprating} when trying to uprate {variable_name}."
                         )
+                    if dependency_tracer is not None:
+                        dependency_tracer.record_parameter_access(
+                            variable.uprating, period, self.branch_name, None
+                        )
                     value_in_last_period = uprating_parameter(
                         latest_known_period.start
                     )
@@ -770,6 +914,10 @@ class Simulation:
 
             array = self._cast_formula_result(array, variable)
             holder.put_in_cache(array, period, self.branch_name)
+            if dependency_tracer is not None:
+                dependency_tracer.record_calculation_complete(
+                    variable_name, period
+                )
 
         except SpiralError:
             array = holder.default_array()
@@ -787,11 +935,76 @@ class Simulation:
                 f"RecursionError while calculating {variable_name} for period {period}. The full computation stack is:\n{stack_formatted}"
             )
 
-        if is_cache_available:
-            smc.set_cache_value(cache_path, array)
+        self._set_macro_cache_value(smc, variable_name, period, array)
 
         return array
 
+    def _get_unaffected_baseline_value(
+        self, variable_name: str, period: Period
+    ) -> Optional[ArrayLike]:
+        """
+        Get the baseline value of ``variable_name`` for ``period`` if none of the parameters it depends on are reformed, or None otherwise.
+        """
+        baseline = self.baseline
+        if (
+            not self.reuse_baseline_values
+            or baseline is None
+            or period is None
+            or self._inputs_differ_from_baseline
+            or self.tax_benefit_system.data_modified
+            or baseline.tax_benefit_system is None
+            or baseline.parameter_dependency_tracer
+            is not self.parameter_dependency_tracer
+        ):
+            return None
+
+        baseline.infer_parameter_dependencies = True
+        dependencies = (
+            self.parameter_dependency_tracer.get_parameter_dependencies(
+                variable_name, period
+            )
+        )
+        if dependencies is None:
+            # Calculating the baseline first tells us what the reform could
+            # have changed; it is needed for the comparison anyway.
+            value = baseline.calculate(variable_name, period)
+            np.random.seed(hash(variable_name + str(period)) % 1000000)
+            dependencies = (
+                self.parameter_dependency_tracer.get_parameter_dependencies(
+                    variable_name, period
+                )
+            )
+            if dependencies is None:
+                return None
+        else:
+            value = None
+
+        for parameter in dependencies:
+            if self._is_parameter_modified(parameter):
+                return None
+
+        if value is None:
+            value = baseline.calculate(variable_name, period)
+            np.random.seed(hash(variable_name + str(period)) % 1000000)
+        return value
+
+    def _calculate_within(
+        self, variable_name: str, period: Period
+    ) -> ArrayLike:
+        """
+        Calculate ``variable_name`` for ``period`` as part of the calculation of the same variable for another period, without starting a new trace.
+        """
+        dependency_tracer = self._get_recording_dependency_tracer()
+        if dependency_tracer is None:
+            return self._calculate(variable_name, period)
+        dependency_tracer.record_calculation_start(
+            variable_name, period, self.branch_name
+        )
+        try:
+            return self._calculate(variable_name, period)
+        finally:
+            dependency_tracer.record_calculation_end()
+
     def purge_cache_of_invalid_values(self) -> None:
         # We wait for the end of calculate(), signalled by an empty stack, before purging the cache
         if self.tracer.stack:
@@ -910,6 +1123,7 @@ class Simulation:
         """
 
         formula = variable.get_formula(period)
+        dependency_tracer = self._get_recording_dependency_tracer()
         if formula is None:
             values = None
             if variable.adds is not None and len(variable.adds) > 0:
@@ -924,6 +1138,10 @@ class Simulation:
                             f"In the variable '{variable.name}', the 'adds' attribute is a string '{variable.adds}' that does not match any parameter."
                         )
                     adds_list = adds_parameter(period.start)
+                    if dependency_tracer is not None:
+                        dependency_tracer.record_parameter_access(
+                            variable.adds, period, self.branch_name, adds_list
+                        )
                 else:
                     adds_list = variable.adds
                 values = 0
@@ -938,6 +1156,13 @@ class Simulation:
                                 self.tax_benefit_system.parameters,
                                 added_variable,
                             )
+                            if dependency_tracer is not None:
+                                dependency_tracer.record_parameter_access(
+                                    added_variable,
+                                    period,
+                                    self.branch_name,
+                                    None,
+                                )
                             values = values + parameter(period.start)
                         except:
                             raise ValueError(
@@ -955,6 +1180,13 @@ class Simulation:
                             f"In the variable '{variable.name}', the 'subtracts' attribute is a string '{variable.subtracts}' that does not match any parameter."
                         )
                     subtracts_list = subtracts_parameter(period.start)
+                    if dependency_tracer is not None:
+                        dependency_tracer.record_parameter_access(
+                            variable.subtracts,
+                            period,
+                            self.branch_name,
+                            subtracts_list,
+                        )
                 else:
                     subtracts_list = variable.subtracts
                 if values is None:
@@ -975,6 +1207,13 @@ class Simulation:
                                 self.tax_benefit_system.parameters,
                                 subtracted_variable,
                             )
+                            if dependency_tracer is not None:
+                                dependency_tracer.record_parameter_access(
+                                    subtracted_variable,
+                                    period,
+                                    self.branch_name,
+                                    None,
+                                )
                             values = values + parameter(period.start)
                         except:
                             raise ValueError(
@@ -990,11 +1229,33 @@ class Simulation:
             self.tax_benefit_system.parameters.trace = True
             self.tax_benefit_system.parameters.tracer = self.tracer
         parameters_at = self.tax_benefit_system.parameters
+        if dependency_tracer is None:
+            if formula.__code__.co_argcount == 2:
+                return formula(population, period)
+            return formula(population, period, parameters_at)
 
         if formula.__code__.co_argcount == 2:
+            # Any parameters it reads are reached through the simulation.
+            dependency_tracer.record_untraced_calculation()
             array = formula(population, period)
         else:
-            array = formula(population, period, parameters_at)
+            # Parameters read from the tax-benefit system, rather than those
+            # passed to the formula, aren't recorded.
+            tax_benefit_system = self.tax_benefit_system
+            parameter_read_hook = tax_benefit_system._parameter_read_hook
+            tax_benefit_system._parameter_read_hook = (
+                dependency_tracer.record_untraced_calculation
+            )
+            try:
+                array = formula(
+                    population,
+                    period,
+                    TracingParameterNode(
+                        parameters_at, dependency_tracer, self.branch_name
+                    ),
+                )
+            finally:
+                tax_benefit_system._parameter_read_hook = parameter_read_hook
 
         return array
 
@@ -1178,6 +1439,9 @@ class Simulation:
         >>> simulation.get_array('age', '2018-05') is None
         True
         """
+        if variable in getattr(self, "input_variables", ()):
+            self._mark_inputs_as_differing_from_baseline()
+            self._inputs_differ_from_dataset = True
         self.get_holder(variable).delete_arrays(period)
 
     def get_known_periods(self, variable: str) -> List[Period]:
@@ -1224,10 +1488,42 @@ class Simulation:
         )
         if (variable.end is not None) and (period.start.date > variable.end):
             return
+        self._mark_inputs_as_differing_from_baseline()
         self.get_holder(variable_name).set_input(
             period, value, self.branch_name
         )
 
+    def set_input_loader(
+        self,
+        variable_name: str,
+        period: Period,
+        loader: Callable[[], ArrayLike],
+    ) -> None:
+        """Set a variable's value for a given period to be the result of ``loader``, called the first time any value of the variable is needed.
+
+        Args:
+            variable_name (str): The name of the variable.
+            period (Period): The period the value is for.
+            loader (Callable[[], ArrayLike]): A function returning the value.
+        """
+        period = periods.period(period)
+        if self.start_instant is None or self.start_instant > period.start:
+            self.start_instant = period.start
+        variable = self.tax_benefit_system.get_variable(
+            variable_name, check_existence=True
+        )
+        if (variable.end is not None) and (period.start.date > variable.end):
+            return
+        self._mark_inputs_as_differing_from_baseline()
+        self.get_holder(variable_name).set_input_loader(period, loader)
+
+    def _mark_inputs_as_differing_from_baseline(self) -> None:
+        if self.baseline is not None:
+            self._inputs_differ_from_baseline = True
+        parent = getattr(self, "parent_branch", None)
+        if parent is not None and parent.baseline is self:
+            parent._inputs_differ_from_baseline = True
+
     def get_variable_population(self, variable_name: str) -> Population:
         variable = self.tax_benefit_system.get_variable(
             variable_name, check_existence=True
@@ -1259,24 +1555,37 @@ class Simulation:
         debug: bool = False,
         trace: bool = False,
         clone_tax_benefit_system: bool = True,
+        copy_arrays: bool = True,
     ) -> "Simulation":
         """
         Copy the simulation just enough to be able to run the copy without modifying the original simulation
+
+        If ``copy_arrays`` is False, the copy shares the arrays already calculated or input with the original instead of copying them. Neither simulation should then modify those arrays in place.
         """
         new = commons.empty_clone(self)
         new_dict = new.__dict__
 
         for key, value in self.__dict__.items():
-            if key not in ("debug", "trace", "tracer", "branches"):
+            if key not in (
+                "debug",
+                "trace",
+                "tracer",
+                "branches",
+                "variable_dependency_tracer",
+                "_traced_dependencies",
+            ):
                 new_dict[key] = value
+        new.input_variables = list(self.input_variables)
 
-        new.persons = self.persons.clone(new)
+        new.persons = self.persons.clone(new, copy_arrays)
         setattr(new, new.persons.entity.key, new.persons)
         new.populations = {new.persons.entity.key: new.persons}
         new.branches = {}
 
         for entity in self.tax_benefit_system.group_entities:
-            population = self.populations[entity.key].clone(new, new.persons)
+            population = self.populations[entity.key].clone(
+                new, new.persons, copy_arrays
+            )
             new.populations[entity.key] = population
             setattr(
                 new, entity.key, population
@@ -1291,13 +1600,17 @@ class Simulation:
         return new
 
     def get_branch(
-        self, name: str = "branch", clone_system: bool = False
+        self,
+        name: str = "branch",
+        clone_system: bool = False,
+        copy_arrays: bool = True,
     ) -> "Simulation":
         """Create a clone of this simulation, whose calculations are traced in the original.
 
         Args:
             name (str, optional): Name of the branch. Defaults to "branch".
             clone_system (bool, optional): Whether to clone the tax-benefit system. Use this if you're changing policy parameters. Defaults to False.
+            copy_arrays (bool, optional): Whether to copy the arrays known to this simulation, rather than share them with the branch. Defaults to True.
 
         Returns:
             Simulation: The cloned simulation.
@@ -1306,7 +1619,9 @@ class Simulation:
             return self
         if name in self.branches:
             return self.branches[name]
-        branch = self.clone(clone_tax_benefit_system=clone_system)
+        branch = self.clone(
+            clone_tax_benefit_system=clone_system, copy_arrays=copy_arrays
+        )
         self.branches[name] = branch
         branch.branch_name = name
         branch.parent_branch = self
@@ -1315,12 +1630,75 @@ class Simulation:
             branch.tracer = self.tracer
         return branch
 
+    def calculate_branches(
+        self,
+        branches: List[str],
+        variables: Union[str, List[str]],
+        period: Period = None,
+        processes: int = None,
+    ) -> Dict[str, Dict[str, ArrayLike]]:
+        """Calculate variables in several branches of this simulation at once, each branch in its own worker process.
+
+        Workers are forked from this process, so they share its inputs without copying them, and write their results to shared memory, from which they are returned without copying. Values calculated in a worker are not kept by the branch. Where forking isn't available, the branches are calculated one after another.
+
+        Args:
+            branches (List[str]): The names of the branches, which can include this simulation's own.
+            variables (Union[str, List[str]]): The variable or variables to calculate.
+            period (Period, optional): The period to calculate for. Defaults to the default calculation period.
+            processes (int, optional): The maximum number of worker processes. Defaults to one per branch.
+
+        Returns:
+            Dict[str, Dict[str, ArrayLike]]: The values, by variable, for each branch.
+        """
+        from policyengine_core.simulations.parallel import (
+            BranchCalculation,
+        )  # Import here to avoid circular dependency
+
+        if isinstance(variables, str):
+            variables = [variables]
+        if period is not None and not isinstance(period, Period):
+            period = periods.period(period)
+        elif period is None and self.default_calculation_period is not None:
+            period = periods.period(self.default_calculation_period)
+
+        return BranchCalculation(
+            {name: self.get_branch(name) for name in branches},
+            variables,
+            period,
+        ).calculate(processes)
+
+    def calculate_situations(
+        self, variable_name: str, period: Period = None
+    ) -> List[ArrayLike]:
+        """Calculate a variable in a simulation built from several situations with ``SimulationBuilder.build_from_dicts``, split into the values of each situation.
+
+        Args:
+            variable_name (str): The name of the variable.
+            period (Period, optional): The period to calculate for. Defaults to the default calculation period.
+
+        Returns:
+            List[ArrayLike]: The values of the entities of each situation, as views of the values of the whole simulation.
+        """
+        if self.situation_offsets is None:
+            raise ValueError(
+                "The simulation wasn't built from several situations."
+            )
+        values = self.calculate(variable_name, period)
+        offsets = self.situation_offsets[
+            self.get_variable_population(variable_name).entity.key
+        ]
+        return [
+            values[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
     def derivative(
         self, variable: str, wrt: str, period: Period = None, delta: float = 1
     ) -> ArrayLike:
         """
         Compute the derivative of a variable w.r.t another variable.
 
+        Only the variables depending on ``wrt`` are recalculated, in a copy of the simulation sharing every other value with it. The variables each variable depends on are found by tracing the calculation of ``variable`` once for each period, in a copy of the simulation sharing only its inputs. Only these dependencies are reused for later derivatives, which calculate ``variable`` in this simulation. The derivative is only exact if formulas request the same variables when ``wrt`` changes.
+
         Args:
             variable (str): The variable to differentiate.
             wrt (str): The variable to differentiate with respect to.
@@ -1336,16 +1714,152 @@ class Simulation:
         elif period is None and self.default_calculation_period is not None:
             period = periods.period(self.default_calculation_period)
 
-        alt_sim = self.clone()
-        for computed_variable in alt_sim.tax_benefit_system.variables:
-            if computed_variable not in self.input_variables:
-                alt_sim.delete_arrays(computed_variable)
-        alt_sim.set_input(wrt, period, self.calculate(wrt, period) + delta)
-        original_value = self.calculate(variable, period)
+        simulation = self._get_traced_simulation(variable, period)
+        original_value = simulation.calculate(variable, period)
+        alt_sim = simulation._get_perturbed_simulation(wrt, period, delta)
         new_value = alt_sim.calculate(variable, period)
         difference = new_value - original_value
         return difference / delta
 
+    def derivatives(
+        self,
+        variable: str,
+        wrt: Union[str, List[str]],
+        period: Period = None,
+        deltas: Union[float, List[float]] = 1,
+        processes: int = None,
+    ) -> np.ndarray:
+        """
+        Compute the derivatives of a variable w.r.t several variables, each with several infinitesimals, at once.
+
+        The dependencies of ``variable`` are traced once, and the value it is compared against is calculated once. Each perturbation then only recalculates the variables depending on the perturbed one, in a copy of the simulation sharing every other value, reused for every infinitesimal of the same variable. With ``processes``, perturbations are calculated in worker processes forked from this one, which inherit the simulation and write the derivatives to shared memory.
+
+        Args:
+            variable (str): The variable to differentiate.
+            wrt (Union[str, List[str]]): The variable or variables to differentiate with respect to.
+            period (Period): The period for which to compute the derivatives.
+            deltas (Union[float, List[float]]): The infinitesimal or infinitesimals to use for each variable.
+            processes (int, optional): The maximum number of worker processes. Defaults to calculating in this process.
+
+        Returns:
+            np.ndarray: The derivatives, with one row for each variable in ``wrt`` and one column for each of ``deltas``, each holding the derivative for every entity of ``variable``.
+        """
+        from policyengine_core.simulations.parallel import (
+            _calculate_values,
+            allocate_shared_arrays,
+            can_fork,
+            map_forked,
+        )  # Import here to avoid circular dependency
+
+        if isinstance(wrt, str):
+            wrt = [wrt]
+        deltas = list(np.atleast_1d(deltas))
+        if period is not None and not isinstance(period, Period):
+            period = periods.period(period)
+        elif period is None and self.default_calculation_period is not None:
+            period = periods.period(self.default_calculation_period)
+
+        simulation = self._get_traced_simulation(variable, period)
+        original_value = np.asarray(
+            _calculate_values(simulation, variable, period), dtype=float
+        )
+        input_variables = set(simulation.input_variables)
+        dependents = {
+            name: [
+                dependent
+                for dependent in self.variable_dependency_tracer.get_dependents(
+                    [name]
+                )
+                if dependent not in input_variables
+            ]
+            for name in wrt
+        }
+        base_values = {
+            name: _calculate_values(simulation, name, period) for name in wrt
+        }
+        perturbations = [(name, delta) for name in wrt for delta in deltas]
+        perturbed_simulations = {}
+
+        def differentiate(index: int) -> np.ndarray:
+            name, delta = perturbations[index]
+            alt_sim = perturbed_simulations.get(name)
+            if alt_sim is None:
+                alt_sim = perturbed_simulations[name] = simulation.clone(
+                    clone_tax_benefit_system=False, copy_arrays=False
+                )
+            for dependent in dependents[name]:
+                alt_sim.get_holder(dependent).delete_arrays()
+            alt_sim.set_input(name, period, base_values[name] + delta)
+            new_value = _calculate_values(alt_sim, variable, period)
+            return (new_value - original_value) / delta
+
+        result_shape = (len(wrt), len(deltas), len(original_value))
+        if processes is not None:
+            processes = min(processes, len(perturbations))
+        if processes is None or processes <= 1 or not can_fork():
+            result = np.empty(result_shape)
+            for index in range(len(perturbations)):
+                result.reshape(-1, len(original_value))[index] = differentiate(
+                    index
+                )
+            return result
+
+        output = allocate_shared_arrays(
+            {"derivatives": (int(np.prod(result_shape)), np.float64)}
+        )["derivatives"].reshape(-1, len(original_value))
+
+        def write_derivative(index: int) -> None:
+            output[index] = differentiate(index)
+
+        map_forked(write_derivative, range(len(perturbations)), processes)
+        return output.reshape(result_shape)
+
+    def _get_traced_simulation(
+        self, variable: str, period: Period
+    ) -> "Simulation":
+        # Returns a simulation with the same values as this one, in which the
+        # variables ``variable`` depends on for ``period`` are known. That is
+        # the traced copy the first time, and this simulation afterwards.
+        key = (variable, str(period))
+        if self._traced_dependencies is None:
+            self._traced_dependencies = set()
+            self.variable_dependency_tracer = VariableDependencyTracer()
+        if key in self._traced_dependencies:
+            return self
+        # Values already calculated hide their dependencies, so the variable
+        # is traced in a copy holding only the inputs.
+        traced = self.clone(clone_tax_benefit_system=False, copy_arrays=False)
+        input_variables = set(self.input_variables)
+        for population in traced.populations.values():
+            for name, holder in population._holders.items():
+                if name not in input_variables:
+                    holder.delete_arrays()
+        traced.tracer = VariableDependencyTracer()
+        traced.calculate(variable, period)
+        for parent, children in traced.tracer.dependencies.items():
+            self.variable_dependency_tracer.dependencies.setdefault(
+                parent, set()
+            ).update(children)
+        self._traced_dependencies.add(key)
+        traced.tracer = SimpleTracer()
+        # The traced copy now holds every value the calculation needed.
+        traced.variable_dependency_tracer = self.variable_dependency_tracer
+        traced._traced_dependencies = self._traced_dependencies
+        return traced
+
+    def _get_perturbed_simulation(
+        self, wrt: str, period: Period, delta: float
+    ) -> "Simulation":
+        # A copy of the simulation sharing its values, except for those of
+        # the variables depending on ``wrt``, with ``delta`` added to ``wrt``.
+        alt_sim = self.clone(clone_tax_benefit_system=False, copy_arrays=False)
+        input_variables = set(self.input_variables)
+        for name in self.variable_dependency_tracer.get_dependents([wrt]):
+            if name not in input_variables:
+                alt_sim.get_holder(name).delete_arrays()
+        alt_sim.set_input(wrt, period, self.calculate(wrt, period) + delta)
+        return alt_sim
+
     def sample_person(self) -> dict:
         """
         Sample a person from the simulation. Returns a situation JSON with their inputs (including their containing entities).
@@ -1357,6 +1871,19 @@ class Simulation:
         index = np.random.randint(person_count)
         return self.extract_person(index)
 
+    def sample_people(self, n: int) -> List[dict]:
+        """
+        Sample people from the simulation, without replacement. Returns a situation JSON for each, as with ``extract_person``.
+
+        Args:
+            n (int): The number of people to sample.
+
+        Returns:
+            List[dict]: The situations.
+        """
+        indices = np.random.choice(self.persons.count, n, replace=False)
+        return self.extract_people(indices)
+
     def extract_person(
         self,
         index: int = 0,
@@ -1371,84 +1898,151 @@ class Simulation:
         Returns:
             dict: A dictionary containing the person's values.
         """
-        situation = {}
-        people_indices = []
-        people_indices_by_entity = {}
+        return self.extract_people([index], exclude_entities)[0]
 
-        for population in self.populations.values():
-            entity = population.entity
-            if (
-                not population.entity.is_person
-                and entity.key not in exclude_entities
-            ):
+    def extract_people(
+        self,
+        indices: ArrayLike,
+        exclude_entities: tuple = ("state",),
+    ) -> List[dict]:
+        """
+        Extract people from the simulation. Returns a situation JSON for each, with their inputs and those of their containing entities and the other members of those entities.
+
+        Inputs are read from holders (for the first period each is known for), and the members of each entity from its index of members, both only once for all the people.
+
+        Args:
+            indices (ArrayLike): The indices of the people to extract.
+            exclude_entities (tuple, optional): The keys of group entities to leave out. Defaults to ("state",).
+
+        Returns:
+            List[dict]: A dictionary containing each person's values.
+        """
+        # The first known value of each input variable, by entity.
+        inputs = {key: [] for key in self.populations}
+        for variable_name in self.input_variables:
+            holder = self.get_holder(variable_name)
+            known_periods = holder.get_known_periods()
+            if len(known_periods) == 0:
+                continue
+            values = holder.get_array(known_periods[0], self.branch_name)
+            if isinstance(values, EnumArray):
+                values = values.decode_to_str()
+            inputs[holder.population.entity.key].append(
+                (variable_name, str(known_periods[0]), values)
+            )
+
+        def get_value(values: ArrayLike, index: int) -> Any:
+            # Values are converted from numpy to JSON-compatible types.
+            value = values[index : index + 1].tolist()[0]
+            if isinstance(value, bytes):
+                value = value.decode()
+            return value
+
+        def get_inputs(entity_key: str, index: int) -> dict:
+            return {
+                variable_name: {period: get_value(values, index)}
+                for variable_name, period, values in inputs[entity_key]
+            }
+
+        person = self.persons.entity
+        group_populations = [
+            population
+            for population in self.populations.values()
+            if not population.entity.is_person
+            and population.entity.key not in exclude_entities
+        ]
+        situations = []
+        for index in indices:
+            situation = {}
+            members_by_entity = {}
+            for population in group_populations:
+                entity = population.entity
+                group_index = population.members_entity_id[index]
+                members_by_entity[entity.key] = population.get_members(
+                    group_index
+                )
                 situation[entity.plural] = {
                     entity.key: {
                         "members": [],
+                        **get_inputs(entity.key, group_index),
                     },
                 }
-                group_index = population.members_entity_id[index]
-                other_people_indices = [
-                    index
-                    for index in range(len(population.members_entity_id))
-                    if population.members_entity_id[index] == group_index
-                ]
-
-                people_indices.extend(other_people_indices)
-                people_indices = list(set(people_indices))
-                people_indices_by_entity[entity.key] = other_people_indices
-                for variable in self.input_variables:
-                    if (
-                        self.tax_benefit_system.get_variable(
-                            variable
-                        ).entity.key
-                        == entity.key
-                    ):
-                        known_periods = self.get_holder(
-                            variable
-                        ).get_known_periods()
-                        if len(known_periods) > 0:
-                            first_known_period = known_periods[0]
-                            value = self.calculate(
-                                variable, first_known_period
-                            )[group_index]
-                            situation[entity.plural][entity.key][variable] = {
-                                str(known_periods[0]): value
-                            }
-
-        person = self.populations["person"].entity
-        situation[person.plural] = {}
-        for person_index in people_indices:
-            person_name = f"{person.key}_{person_index + 1}"
-            for entity_key in people_indices_by_entity:
-                entity = self.populations[entity_key].entity
-                if person_index in people_indices_by_entity[entity.key]:
-                    situation[entity.plural][entity.key]["members"].append(
-                        person_name
-                    )
-            situation[person.plural][person_name] = {}
-            for variable in self.input_variables:
-                if (
-                    self.tax_benefit_system.get_variable(variable).entity.key
-                    == person.key
-                ):
-                    known_periods = self.get_holder(
-                        variable
-                    ).get_known_periods()
-                    if len(known_periods) > 0:
-                        first_known_period = known_periods[0]
-                        value = self.calculate(variable, first_known_period)[
-                            person_index
-                        ]
-                        situation[person.plural][person_name][variable] = {
-                            str(known_periods[0]): value
-                        }
-
-        return json.loads(json.dumps(situation, cls=NpEncoder))
+            situation[person.plural] = {}
+            people_indices = np.unique(
+                np.concatenate([[index], *members_by_entity.values()]).astype(
+                    int
+                )
+            )
+            for person_index in people_indices:
+                person_name = f"{person.key}_{person_index + 1}"
+                for population in group_populations:
+                    entity = population.entity
+                    if person_index in members_by_entity[entity.key]:
+                        situation[entity.plural][entity.key]["members"].append(
+                            person_name
+                        )
+                situation[person.plural][person_name] = get_inputs(
+                    person.key, person_index
+                )
+            situations.append(situation)
+        return situations
 
     def check_macro_cache(self, variable_name: str, period: str) -> bool:
         """
         Check if the variable is able to have cached value
         """
+        if not self._can_use_macro_cache():
+            return False
+
+        if self.tax_benefit_system.data_modified:
+            return False
+
+        variable = self.tax_benefit_system.get_variable(variable_name)
+
+        # Inputs come from the dataset, and only numeric values can be stored.
+        if variable.is_input_variable() or variable.value_type not in (
+            float,
+            int,
+            bool,
+        ):
+            return False
+
+        # Inferred dependencies take precedence over the declared ones, which
+        # may be out of date.
+        parameter_deps = self.get_parameter_dependencies(variable_name, period)
+        if parameter_deps is None:
+            parameter_deps = variable.exhaustive_parameter_dependencies
+
+        if parameter_deps is None:
+            return False
+
+        for parameter in parameter_deps:
+            if self._is_parameter_modified(parameter):
+                return False
+
+        return True
+
+    def get_parameter_dependencies(
+        self, variable_name: str, period: Period
+    ) -> Optional[frozenset]:
+        """Get the parameters the calculation of ``variable_name`` for ``period`` has been observed to depend on, directly or through other variables.
+
+        Args:
+            variable_name (str): The name of the variable.
+            period (Period): The period of the calculation.
+
+        Returns:
+            Optional[frozenset]: The parameter names, or None if the variable has not been fully calculated for ``period`` with unmodified parameters.
+        """
+        if self.parameter_dependency_tracer is None:
+            return None
+        if self._can_use_macro_cache():
+            self._load_parameter_dependencies()
+        return self.parameter_dependency_tracer.get_parameter_dependencies(
+            variable_name, period
+        )
+
+    def _can_use_macro_cache(self) -> bool:
         if not self.macro_cache_read:
             return False
 
@@ -1467,20 +2061,109 @@ class Simulation:
         if not self.is_over_dataset:
             return False
 
-        variable = self.tax_benefit_system.get_variable(variable_name)
-        parameter_deps = variable.exhaustive_parameter_dependencies
-
-        if parameter_deps is None:
+        # Cached values were calculated from the dataset's inputs, not
+        # inputs set since.
+        if self._inputs_differ_from_dataset:
             return False
 
-        for parameter in parameter_deps:
-            param = get_parameter(
+        return True
+
+    def _is_parameter_modified(self, parameter: str) -> bool:
+        try:
+            return get_parameter(
                 self.tax_benefit_system.parameters, parameter
-            )
-            if param.modified:
-                return False
+            ).modified
+        except ValueError:
+            # The parameter no longer exists, so it can't be assumed unchanged.
+            return True
 
-        return True
+    def _get_recording_dependency_tracer(
+        self,
+    ) -> Optional[ParameterDependencyTracer]:
+        """Get the tracer recording parameter dependencies, or None if calculations in this simulation should not be recorded."""
+        if self.parameter_dependency_tracer is None:
+            return None
+        if not (
+            self.infer_parameter_dependencies
+            or self.reuse_baseline_values
+            or self._can_use_macro_cache()
+        ):
+            return None
+        # Dependencies are only inferred for the unmodified tax-benefit system.
+        if (
+            self.tax_benefit_system.data_modified
+            or self.tax_benefit_system.parameters.modified
+        ):
+            return None
+        return self.parameter_dependency_tracer
+
+    def _load_parameter_dependencies(self) -> None:
+        tracer = self.parameter_dependency_tracer
+        if tracer.file_path is not None:
+            return
+        smc = SimulationMacroCache(self.tax_benefit_system)
+        tracer.file_path = smc.get_dependencies_path(
+            self.dataset.file_path.parent, self.dataset.name
+        )
+        dependencies = smc.get_dependencies(tracer.file_path)
+        if dependencies is not None:
+            tracer.load(dependencies)
+
+    def _save_parameter_dependencies(self) -> None:
+        tracer = self.parameter_dependency_tracer
+        if not tracer.has_changed or not self._can_use_macro_cache():
+            return
+        self._load_parameter_dependencies()
+        smc = SimulationMacroCache(self.tax_benefit_system)
+        smc.set_dependencies(tracer.file_path, tracer.to_dict())
+
+    def _set_macro_cache_value(
+        self,
+        smc: SimulationMacroCache,
+        variable_name: str,
+        period: Period,
+        value: ArrayLike,
+    ) -> None:
+        # Dependencies may only have become known by calculating the value.
+        if not self.check_macro_cache(variable_name, str(period)):
+            return
+        smc.set_cache_path(
+            self.dataset.file_path.parent,
+            self.dataset.name,
+            variable_name,
+            str(period),
+            self.branch_name,
+        )
+        smc.set_cache_value(smc.get_cache_path(), value)
+
+    def get_input_columns(self) -> Dict[str, np.ndarray]:
+        """Gets every stored value of the simulation as person-level columns, named ``{variable}__{period}``, which can be loaded back to a new Simulation to reproduce the same results.
+
+        Values are read from holders as they are, without calculating anything. Group values are repeated for each of their members, and enums are given as their names.
+
+        Returns:
+            Dict[str, np.ndarray]: The columns, by name.
+        """
+        columns = {}
+        for (
+            variable_name,
+            variable,
+        ) in self.tax_benefit_system.variables.items():
+            holder = self.get_holder(variable_name)
+            population = holder.population
+            for period in holder.get_known_periods():
+                values = holder.get_array(period, self.branch_name)
+                if values is None:
+                    continue
+                if isinstance(values, EnumArray):
+                    values = values.decode_to_str()
+                if population.entity.is_person:
+                    columns[f"{variable_name}__{period}"] = values
+                else:
+                    columns[f"{variable_name}__{period}"] = values[
+                        population.members_entity_id
+                    ]
+        return columns
 
     def to_input_dataframe(
         self,
@@ -1490,22 +2173,54 @@ class Simulation:
         Returns:
             pd.DataFrame: The DataFrame containing the input values.
         """
+        # Built in one go, rather than a column at a time.
+        return pd.DataFrame(self.get_input_columns())
 
-        df = pd.DataFrame()
+    def to_input_file(self, file_path: str) -> Dataset:
+        """Exports a Parquet or Arrow IPC file (depending on the file's suffix) which can be loaded back to a new Simulation to reproduce the same results.
 
-        for variable in self.tax_benefit_system.variables:
-            for period in self.get_holder(variable).get_known_periods():
-                values = self.calculate(variable, period, map_to="person")
-                if values is not None:
-                    df[f"{variable}__{period}"] = values
+        Args:
+            file_path (str): The path of the file to write.
 
-        return df
+        Returns:
+            Dataset: The exported dataset.
+        """
+        write_columnar_file(self.get_input_columns(), file_path)
+        time_period = (
+            self.dataset.time_period if self.dataset is not None else None
+        )
+        return Dataset.from_file(file_path, time_period)
+
+    def _take(self, indices: Dict[str, np.ndarray]) -> None:
+        # Reduces every population to the entities at the given positions,
+        # slicing stored values rather than rebuilding the simulation.
+        person_indices = indices[self.persons.entity.key]
+        for entity_key, population in self.populations.items():
+            entity_indices = indices[entity_key]
+            if not population.entity.is_person:
+                population: GroupPopulation
+                positions = np.empty(population.count, dtype=np.int32)
+                positions[entity_indices] = np.arange(len(entity_indices))
+                population.members_entity_id = positions[
+                    population.members_entity_id[person_indices]
+                ]
+                population.members_role = population.members_role[
+                    person_indices
+                ]
+                population.members_position = None
+                population._ordered_members_map = None
+            population.count = len(entity_indices)
+            population.ids = np.asarray(population.ids)[entity_indices]
+            for holder in population._holders.values():
+                holder.take(entity_indices)
 
     def subsample(
         self, n=None, frac=None, seed=None, time_period=None
     ) -> "Simulation":
         """Quantize the simulation to a smaller size by sampling households.
 
+        Every stored value, in every period and branch, is reduced to the sampled households and their members. Household weights in the sampling period are scaled up to keep their total, and calculated values are dropped so that they are recalculated with them.
+
         Args:
             n (int, optional): The number of households to sample. Defaults to 10_000.
             frac (float, optional): The fraction of households to sample. Defaults to None.
@@ -1523,67 +2238,82 @@ class Simulation:
         if time_period is None:
             time_period = self.default_calculation_period
 
-        # Convert simulation inputs to DataFrame
-        df = self.to_input_dataframe()
-
-        # Extract time period from DataFrame columns
-        df_time_period = df.columns.values[0].split("__")[1]
-        df_household_id_column = f"household_id__{df_time_period}"
-
-        # Determine the appropriate household weight column
-        if f"household_weight__{time_period}" in df.columns:
-            household_weight_column = f"household_weight__{time_period}"
-        else:
-            household_weight_column = f"household_weight__{df_time_period}"
-
-        # Group by household ID and get the first entry for each group
-        h_df = df.groupby(df_household_id_column).first()
-        h_ids = pd.Series(h_df.index)
+        households = self.populations["household"]
         if n is None and frac is None:
             raise ValueError("Either n or frac must be provided.")
         if n is None:
-            n = int(len(h_ids) * frac)
-        h_weights = pd.Series(h_df[household_weight_column].values)
+            n = int(households.count * frac)
 
-        if n > len(h_weights):
+        if n > households.count:
             # Don't need to subsample!
             return self
 
+        # Use the weights of the given period (or its year) if there are
+        # any, or else of the first period with weights.
+        weight_holder = self.get_holder("household_weight")
+        weight_periods = weight_holder.get_known_periods()
+        weight_period = periods.period(time_period)
+        if weight_period not in weight_periods:
+            if weight_period.this_year in weight_periods:
+                weight_period = weight_period.this_year
+            else:
+                weight_period = weight_periods[0]
+        weights = weight_holder.get_array(weight_period, self.branch_name)
+
         # Seed the random number generators for reproducibility
         random.seed(str(seed))
         state = random.randint(0, 2**32 - 1)
         np.random.seed(state)
 
-        # Sample household IDs based on their weights
-        chosen_household_ids = np.random.choice(
-            h_ids,
-            n,
-            p=h_weights.values / h_weights.values.sum(),
-            replace=False,
+        # Sample households based on their weights, in order of ID
+        by_id = np.argsort(households.ids, kind="stable")
+        chosen_households = np.sort(
+            np.random.choice(
+                by_id,
+                n,
+                p=weights[by_id] / weights.sum(),
+                replace=False,
+            )
         )
+        weight_scale = weights.sum() / weights[chosen_households].sum()
 
-        # Filter DataFrame to include only the chosen households
-        df = df[df[df_household_id_column].isin(chosen_household_ids)]
-
-        # Adjust household weights to maintain the total weight
-        df[household_weight_column] *= (
-            h_weights.sum()
-            / df.groupby(df_household_id_column)
-            .first()[household_weight_column]
-            .sum()
+        # Find the people and other groups in the chosen households
+        person_indices = np.flatnonzero(
+            np.isin(households.members_entity_id, chosen_households)
         )
+        indices = {self.persons.entity.key: person_indices}
+        for entity_key, population in self.populations.items():
+            if entity_key == "household":
+                indices[entity_key] = chosen_households
+            elif not population.entity.is_person:
+                indices[entity_key] = np.unique(
+                    population.members_entity_id[person_indices]
+                )
 
-        # Update the dataset and rebuild the simulation
-        self.dataset = Dataset.from_dataframe(df, self.dataset.time_period)
-        self.build_from_dataset()
-
-        # Ensure the baseline branch has the new data.
-        if "baseline" in self.branches:
-            baseline_tax_benefit_system = self.branches[
-                "baseline"
-            ].tax_benefit_system
-            self.branches["baseline"] = self.clone()
-            self.branches["tax_benefit_system"] = baseline_tax_benefit_system
+        # Branches have their own copies of the populations and their values.
+        simulations = [self] + [
+            branch for branch in self.branches.values() if branch is not self
+        ]
+        for simulation in simulations:
+            simulation._take(indices)
+            # Values cached for the full dataset no longer fit.
+            simulation._inputs_differ_from_dataset = True
+            for population in simulation.populations.values():
+                for variable, holder in population._holders.items():
+                    if variable not in simulation.input_variables:
+                        holder.delete_arrays()
+            weight_holder = simulation.get_holder("household_weight")
+            for (
+                branch_name,
+                period,
+            ) in weight_holder.get_known_branch_periods():
+                if period == weight_period:
+                    weight_holder.set_input(
+                        period,
+                        weight_holder.get_array(period, branch_name)
+                        * weight_scale,
+                        branch_name,
+                    )
         return self
 
 
@@ -1,6 +1,5 @@
-import copy
 import typing
-from typing import TYPE_CHECKING, Any, List
+from typing import TYPE_CHECKING, Any, List, Optional
 
 import dpath.util
 import numpy as np
@@ -8,6 +7,7 @@ from numpy.typing import ArrayLike
 
 from policyengine_core import periods
 from policyengine_core.entities import Entity, Role
+from policyengine_core.enums import Enum, EnumArray
 from policyengine_core.errors import (
     PeriodMismatchError,
     SituationParsingError,
@@ -65,6 +65,13 @@ class SimulationBuilder:
         )
         self.axes_roles: typing.Dict[Entity.plural, typing.List[int]] = {}
 
+        # Input values read from situations but not yet converted and
+        # written to the input buffer, by variable and period: the entity,
+        # and the index, value and JSON location of each.
+        self.pending_values: typing.Dict[
+            typing.Tuple[Variable.name, str], tuple
+        ] = {}
+
     def build_from_dict(
         self,
         tax_benefit_system: "TaxBenefitSystem",
@@ -92,13 +99,6 @@ class SimulationBuilder:
                 tax_benefit_system, input_dict, simulation
             )
 
-        simulation.input_variables = [
-            variable.name
-            for variable in simulation.tax_benefit_system.variables.values()
-            if len(simulation.get_holder(variable.name).get_known_periods())
-            > 0
-        ]
-
         return simulation
 
     def build_from_entities(
@@ -117,24 +117,56 @@ class SimulationBuilder:
             'households': {'household': {'parents': ['Javier']}}
             })
         """
-        input_dict = copy.deepcopy(input_dict)
-
         if simulation is None:
             simulation = Simulation(
                 tax_benefit_system=tax_benefit_system,
                 populations=tax_benefit_system.instantiate_entities(),
             )
 
-        # Register variables so get_variable_entity can find them
-        for variable_name, _variable in tax_benefit_system.variables.items():
-            self.register_variable(
-                variable_name,
-                simulation.get_variable_population(variable_name).entity,
-            )
-
         check_type(input_dict, dict, ["error"])
+        # Axes are removed from a copy, leaving the situation unchanged.
+        input_dict = dict(input_dict)
         axes = input_dict.pop("axes", None)
 
+        if axes:
+            # Register variables so get_variable_entity can find them
+            for variable_name in tax_benefit_system.variables:
+                self.register_variable(
+                    variable_name,
+                    simulation.get_variable_population(variable_name).entity,
+                )
+
+        self._add_entities(tax_benefit_system, input_dict)
+        persons_json = input_dict[tax_benefit_system.person_entity.plural]
+
+        if axes:
+            self.axes = axes
+            self.expand_axes()
+
+        try:
+            self.finalize_variables_init(simulation.persons)
+        except PeriodMismatchError as e:
+            self.raise_period_mismatch(
+                simulation.persons.entity, persons_json, e
+            )
+
+        for entity_class in tax_benefit_system.group_entities:
+            try:
+                population = simulation.populations[entity_class.key]
+                self.finalize_variables_init(population)
+            except PeriodMismatchError as e:
+                self.raise_period_mismatch(
+                    population.entity,
+                    input_dict.get(entity_class.plural, {}),
+                    e,
+                )
+
+        return simulation
+
+    def _add_entities(
+        self, tax_benefit_system: "TaxBenefitSystem", input_dict: dict
+    ) -> None:
+        # Adds the entities of a situation, and their input values.
         unexpected_entities = [
             entity
             for entity in input_dict
@@ -168,7 +200,7 @@ class SimulationBuilder:
             )
 
         persons_ids = self.add_person_entity(
-            simulation.persons.entity, persons_json
+            tax_benefit_system.person_entity, persons_json
         )
 
         for entity_class in tax_benefit_system.group_entities:
@@ -183,26 +215,119 @@ class SimulationBuilder:
             else:
                 self.add_default_group_entity(persons_ids, entity_class)
 
-        if axes:
-            self.axes = axes
-            self.expand_axes()
+    def build_from_dicts(
+        self,
+        tax_benefit_system: "TaxBenefitSystem",
+        situations: List[dict],
+        simulation: Simulation = None,
+    ) -> Simulation:
+        """
+        Build a single simulation from many situations, each fully specifying its entities, so that they are all calculated at once.
 
-        try:
-            self.finalize_variables_init(simulation.persons)
-        except PeriodMismatchError as e:
-            self.raise_period_mismatch(
-                simulation.persons.entity, persons_json, e
+        The entities of each situation follow those of the situations before it, with their ids prefixed by the situation's position (e.g. ``"0:Javier"``), so that ids are distinct. Variables given a value in any situation are inputs for every situation, with the variable's default value where a situation leaves them out, as for the entities of a single situation. Use :any:`Simulation.calculate_situations` to split results back per situation.
+
+        Examples:
+
+        >>> simulation = simulation_builder.build_from_dicts(
+            tax_benefit_system,
+            [
+                {'persons': {'Javier': {'salary': {'2018-11': 2000}}}},
+                {'persons': {'Alicia': {'salary': {'2018-11': 3000}}}},
+            ],
+        )
+        >>> simulation.calculate_situations('income_tax', '2018-11')
+        [array([300.], dtype=float32), array([450.], dtype=float32)]
+        """
+        builders = []
+        for index, situation in enumerate(situations):
+            builder = SimulationBuilder()
+            builder.default_period = self.default_period
+            try:
+                check_type(situation, dict, ["error"])
+                situation = builder.explicit_singular_entities(
+                    tax_benefit_system, situation
+                )
+                if "axes" in situation:
+                    raise SituationParsingError(
+                        ["axes"],
+                        "Situations with axes can't be built together with other situations.",
+                    )
+                builder._add_entities(tax_benefit_system, situation)
+            except SituationParsingError as error:
+                # Errors point to the situation they were found in.
+                error.error = {str(index): error.error}
+                error.args = (str(error.error),)
+                raise
+            builders.append(builder)
+
+        if simulation is None:
+            simulation = Simulation(
+                tax_benefit_system=tax_benefit_system,
+                populations=tax_benefit_system.instantiate_entities(),
             )
+        self.persons_plural = tax_benefit_system.person_entity.plural
 
-        for entity_class in tax_benefit_system.group_entities:
+        offsets = {}
+        for entity in tax_benefit_system.entities:
+            counts = [
+                builder.entity_counts[entity.plural] for builder in builders
+            ]
+            offsets[entity.key] = np.concatenate([[0], np.cumsum(counts)])
+            self.entity_counts[entity.plural] = int(offsets[entity.key][-1])
+            self.entity_ids[entity.plural] = [
+                f"{index}:{id}"
+                for index, builder in enumerate(builders)
+                for id in builder.entity_ids[entity.plural]
+            ]
+            if entity.is_person:
+                continue
+            self.memberships[entity.plural] = np.concatenate(
+                [
+                    np.asarray(builder.memberships[entity.plural]) + offset
+                    for builder, offset in zip(builders, offsets[entity.key])
+                ]
+            )
+            self.roles[entity.plural] = np.concatenate(
+                [
+                    np.asarray(builder.roles[entity.plural], dtype=object)
+                    for builder in builders
+                ]
+            )
+
+        input_periods = {}
+        for builder in builders:
+            for variable_name, buffer in builder.input_buffer.items():
+                input_periods.setdefault(variable_name, {}).update(
+                    dict.fromkeys(buffer)
+                )
+        for variable_name, period_strs in input_periods.items():
+            variable = tax_benefit_system.get_variable(variable_name)
+            buffer = self.input_buffer.setdefault(variable_name, {})
+            for period_str in period_strs:
+                values = []
+                for builder in builders:
+                    array = builder.input_buffer.get(variable_name, {}).get(
+                        period_str
+                    )
+                    if array is None:
+                        array = variable.default_array(
+                            builder.entity_counts[variable.entity.plural]
+                        )
+                    values.append(np.asarray(array))
+                array = np.concatenate(values)
+                if variable.value_type == Enum:
+                    array = EnumArray(array, variable.possible_values)
+                buffer[period_str] = array
+
+        for population in simulation.populations.values():
             try:
-                population = simulation.populations[entity_class.key]
                 self.finalize_variables_init(population)
             except PeriodMismatchError as e:
-                self.raise_period_mismatch(
-                    population.entity, instances_json, e
+                raise SituationParsingError(
+                    [population.entity.plural], e.message
                 )
 
+        simulation.situation_offsets = offsets
         return simulation
 
     def build_from_variables(
@@ -372,11 +497,14 @@ class SimulationBuilder:
         self.entity_ids[self.persons_plural] = entity_ids
         self.entity_counts[self.persons_plural] = len(entity_ids)
 
-        for instance_id, instance_object in instances_json.items():
+        for instance_index, (instance_id, instance_object) in enumerate(
+            instances_json.items()
+        ):
             check_type(instance_object, dict, [entity.plural, instance_id])
             self.init_variable_values(
-                entity, instance_object, str(instance_id)
+                entity, instance_object, str(instance_id), instance_index
             )
+        self.set_pending_values(entity)
 
         return self.get_ids(entity.plural)
 
@@ -411,6 +539,9 @@ class SimulationBuilder:
 
         persons_count = len(persons_ids)
         persons_to_allocate = set(persons_ids)
+        person_indices = {}
+        for person_index, person_id in enumerate(persons_ids):
+            person_indices.setdefault(person_id, person_index)
         self.memberships[entity.plural] = np.empty(
             persons_count, dtype=np.int32
         )
@@ -419,7 +550,13 @@ class SimulationBuilder:
         self.entity_ids[entity.plural] = entity_ids
         self.entity_counts[entity.plural] = len(entity_ids)
 
-        for instance_id, instance_object in instances_json.items():
+        role_by_plural = {
+            role.plural or role.key: role for role in entity.roles
+        }
+
+        for entity_index, (instance_id, instance_object) in enumerate(
+            instances_json.items()
+        ):
             check_type(instance_object, dict, [entity.plural, instance_id])
 
             variables_json = (
@@ -445,7 +582,7 @@ class SimulationBuilder:
                     self.check_persons_to_allocate(
                         persons_plural,
                         entity_plural,
-                        persons_ids,
+                        person_indices,
                         person_id,
                         instance_id,
                         role_id,
@@ -455,11 +592,6 @@ class SimulationBuilder:
 
                     persons_to_allocate.discard(person_id)
 
-            entity_index = entity_ids.index(instance_id)
-            role_by_plural = {
-                role.plural or role.key: role for role in entity.roles
-            }
-
             for role_plural, persons_with_role in roles_json.items():
                 role = role_by_plural[role_plural]
 
@@ -472,7 +604,7 @@ class SimulationBuilder:
                 for index_within_role, person_id in enumerate(
                     persons_with_role
                 ):
-                    person_index = persons_ids.index(person_id)
+                    person_index = person_indices[person_id]
                     self.memberships[entity.plural][
                         person_index
                     ] = entity_index
@@ -483,18 +615,22 @@ class SimulationBuilder:
                     )
                     self.roles[entity.plural][person_index] = person_role
 
-            self.init_variable_values(entity, variables_json, instance_id)
+            self.init_variable_values(
+                entity, variables_json, instance_id, entity_index
+            )
+        self.set_pending_values(entity)
 
         if persons_to_allocate:
-            entity_ids = entity_ids + list(persons_to_allocate)
-            for person_id in persons_to_allocate:
-                person_index = persons_ids.index(person_id)
-                self.memberships[entity.plural][person_index] = (
-                    entity_ids.index(person_id)
-                )
+            unallocated = list(persons_to_allocate)
+            for entity_index, person_id in enumerate(
+                unallocated, len(entity_ids)
+            ):
+                person_index = person_indices[person_id]
+                self.memberships[entity.plural][person_index] = entity_index
                 self.roles[entity.plural][person_index] = (
                     entity.flattened_roles[0]
                 )
+            entity_ids = entity_ids + unallocated
             # Adjust previously computed ids and counts
             self.entity_ids[entity.plural] = entity_ids
             self.entity_counts[entity.plural] = len(entity_ids)
@@ -514,6 +650,8 @@ class SimulationBuilder:
             self.default_period = periods.period(datetime.now().year)
 
     def get_input(self, variable: str, period_str: str) -> Any:
+        if self.pending_values:
+            self.set_pending_values()
         if variable not in self.input_buffer:
             self.input_buffer[variable] = {}
         return self.input_buffer[variable].get(period_str)
@@ -547,7 +685,11 @@ class SimulationBuilder:
                 ),
             )
 
-    def init_variable_values(self, entity, instance_object, instance_id):
+    def init_variable_values(
+        self, entity, instance_object, instance_id, instance_index=None
+    ):
+        if instance_index is None:
+            instance_index = self.get_ids(entity.plural).index(instance_id)
         for variable_name, variable_values in instance_object.items():
             path_in_json = [entity.plural, instance_id, variable_name]
             try:
@@ -559,8 +701,6 @@ class SimulationBuilder:
             except VariableNotFoundError as e:  # The variable doesn't exist
                 raise SituationParsingError(path_in_json, str(e), code=404)
 
-            instance_index = self.get_ids(entity.plural).index(instance_id)
-
             if not isinstance(variable_values, dict):
                 if self.default_period is None:
                     raise SituationParsingError(
@@ -571,18 +711,59 @@ class SimulationBuilder:
 
             for period_str, value in variable_values.items():
                 try:
-                    periods.period(period_str)
+                    period_value = periods.period(period_str)
                 except ValueError as e:
                     raise SituationParsingError(path_in_json, e.args[0])
-                variable = entity.get_variable(variable_name)
-                self.add_variable_value(
-                    entity,
-                    variable,
-                    instance_index,
-                    instance_id,
-                    period_str,
-                    value,
+                if value is None:
+                    continue
+                # Values are collected by variable and period, then
+                # converted together by set_pending_values.
+                column = self.pending_values.setdefault(
+                    (variable_name, str(period_value)), (entity, [], [], [])
+                )
+                column[1].append(instance_index)
+                column[2].append(value)
+                column[3].append((instance_id, period_str))
+
+    def set_pending_values(self, entity: Entity = None) -> None:
+        """
+        Convert the values collected by ``init_variable_values`` (for ``entity``, or every entity) and write them to the input buffer, one variable and period at a time.
+        """
+        for key, (column_entity, *_) in list(self.pending_values.items()):
+            if entity is not None and column_entity.key != entity.key:
+                continue
+            variable_name, period_str = key
+            _, indices, values, paths = self.pending_values.pop(key)
+            variable = column_entity.get_variable(variable_name)
+            converted = _convert_values(variable, values)
+            if converted is None:
+                # Values are converted one at a time, to report the first
+                # one that can't be.
+                converted = []
+                for value, (instance_id, raw_period) in zip(values, paths):
+                    try:
+                        converted.append(variable.check_set_value(value))
+                    except ValueError as error:
+                        raise SituationParsingError(
+                            [
+                                column_entity.plural,
+                                instance_id,
+                                variable_name,
+                                raw_period,
+                            ],
+                            *error.args,
+                        )
+            buffer = self.input_buffer.setdefault(variable_name, {})
+            array = buffer.get(period_str)
+            if array is None:
+                array = variable.default_array(
+                    self.get_count(column_entity.plural)
                 )
+            if len(indices) == 1:
+                array[indices[0]] = converted[0]
+            else:
+                array[np.array(indices)] = converted
+            buffer[period_str] = array
 
     def add_variable_value(
         self, entity, variable, instance_index, instance_id, period_str, value
@@ -635,18 +816,40 @@ class SimulationBuilder:
             sorted_periods = sorted(
                 unsorted_periods, key=periods.key_period_size
             )
+            variable = holder.variable
+            # Inputs the same in every cell of the axes are only repeated for
+            # each cell when they are first needed, as long as they can be
+            # set without conversion (which could fail).
+            deferred = (
+                all(
+                    len(buffer[str(period_value)]) < population.count
+                    and period_value.unit == variable.definition_period
+                    for period_value in sorted_periods
+                )
+                and not variable.is_neutralized
+            )
             for period_value in sorted_periods:
                 values = buffer[str(period_value)]
-                # Hack to replicate the values in the persons entity
-                # when we have an axis along a group entity but not persons
-                array = np.tile(values, population.count // len(values))
-                variable = holder.variable
                 # TODO - this duplicates the check in Simulation.set_input, but
                 # fixing that requires improving Simulation's handling of entities
-                if (variable.end is None) or (
-                    period_value.start.date <= variable.end
+                if (variable.end is not None) and (
+                    period_value.start.date > variable.end
                 ):
-                    holder.set_input(period_value, array)
+                    continue
+                if deferred:
+                    holder.set_input_loader(
+                        period_value,
+                        _get_tiler(values, population.count // len(values)),
+                    )
+                elif len(values) < population.count:
+                    # Hack to replicate the values in the persons entity
+                    # when we have an axis along a group entity but not persons
+                    holder.set_input(
+                        period_value,
+                        np.tile(values, population.count // len(values)),
+                    )
+                else:
+                    holder.set_input(period_value, values)
 
     def raise_period_mismatch(self, entity, json, e):
         # This error happens when we try to set a variable value for a period that doesn't match its definition period
@@ -715,42 +918,38 @@ class SimulationBuilder:
             cell_count *= axis_count
 
         # Scale the "prototype" situation, repeating it cell_count times
+        suffixes = [str(ix) for ix in range(cell_count)]
         for entity_name in self.entity_counts.keys():
             # Adjust counts
             self.axes_entity_counts[entity_name] = (
                 self.get_count(entity_name) * cell_count
             )
-            # Adjust ids
-            original_ids = self.get_ids(entity_name) * cell_count
-            # indices should be [0, 0, 0, 1, 1, 1, 2, 2, 2, ...] where each number is repeated axis_entity_count times
-            indices = np.repeat(
-                np.arange(0, cell_count), self.entity_counts[entity_name]
-            )
-            adjusted_ids = [
-                id + str(ix) for id, ix in zip(original_ids, indices)
+            # Adjust ids: each id is followed by the index of its cell, and
+            # all the entities of a cell come before those of the next one
+            original_ids = self.get_ids(entity_name)
+            self.axes_entity_ids[entity_name] = [
+                id + suffix for suffix in suffixes for id in original_ids
             ]
-            self.axes_entity_ids[entity_name] = adjusted_ids
-            # Adjust roles
-            original_roles = self.get_roles(entity_name)
-            adjusted_roles = np.repeat(original_roles, cell_count)
-            self.axes_roles[entity_name] = adjusted_roles
+            # Adjust roles, repeating them in the same order as the people
+            original_roles = np.empty(
+                len(self.get_roles(entity_name)), dtype=object
+            )
+            original_roles[:] = self.get_roles(entity_name)
+            self.axes_roles[entity_name] = np.tile(original_roles, cell_count)
             # Adjust memberships, for group entities only
             if entity_name != self.persons_plural:
-                original_memberships = self.get_memberships(entity_name)
-                # repeat membership, e.g. [1, 0] -> [1, 0, 1, 0, ...]
-                repeated_memberships = np.tile(
-                    original_memberships, cell_count
+                original_memberships = np.asarray(
+                    self.get_memberships(entity_name)
                 )
-                indices = (
-                    np.repeat(
-                        np.arange(0, cell_count), len(original_memberships)
-                    )
-                    * self.entity_counts[entity_name]
+                # offset each cell's memberships by the groups of the cells
+                # before it, e.g. [1, 0] -> [1, 0, 3, 2, ...]
+                offsets = (
+                    np.arange(cell_count) * self.entity_counts[entity_name]
                 )
-                adjusted_memberships = (
-                    np.array(repeated_memberships) + indices
-                ).tolist()
-                self.axes_memberships[entity_name] = adjusted_memberships
+                self.axes_memberships[entity_name] = (
+                    original_memberships[np.newaxis, :]
+                    + offsets[:, np.newaxis]
+                ).reshape(-1)
 
         # Now generate input values along the specified axes
         # TODO - factor out the common logic here
@@ -823,3 +1022,35 @@ class SimulationBuilder:
 
     def register_variable(self, variable_name, entity):
         self.variable_entities[variable_name] = entity
+
+
+def _get_tiler(
+    values: ArrayLike, count: int
+) -> typing.Callable[[], ArrayLike]:
+    # Returns a function repeating ``values`` ``count`` times.
+    return lambda: np.tile(values, count)
+
+
+def _convert_values(variable: Variable, values: list) -> Optional[ArrayLike]:
+    # Converts the values of a variable at once, as check_set_value would
+    # one at a time, or returns None if any needs converting on its own.
+    if variable.value_type in (float, int, bool):
+        if any(isinstance(value, str) for value in values):
+            return None
+        try:
+            array = np.array(values, dtype=variable.dtype)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        return array if array.ndim == 1 else None
+    if variable.value_type == Enum:
+        index_by_name = {
+            item.name: item.index for item in variable.possible_values
+        }
+        try:
+            return np.array(
+                [index_by_name[value] for value in values],
+                dtype=variable.dtype,
+            )
+        except (KeyError, TypeError):
+            return None
+    return None
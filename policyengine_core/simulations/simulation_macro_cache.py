@@ -1,5 +1,7 @@
+import json
 import shutil
 from pathlib import Path
+from typing import Optional
 import h5py
 from numpy.typing import ArrayLike
 import importlib.metadata
@@ -80,5 +82,40 @@ class SimulationMacroCache(metaclass=Singleton):
                 return None
             return f["values"][()]
 
+    def get_dependencies_path(
+        self, parent_path: [Path, str], dataset_name: str
+    ) -> Path:
+        storage_folder = Path(parent_path) / f"{dataset_name}_variable_cache"
+        return storage_folder / "parameter_dependencies.json"
+
+    def set_dependencies(self, dependencies_path: Path, dependencies: dict):
+        dependencies_path.parent.mkdir(exist_ok=True)
+        with open(dependencies_path, "w") as f:
+            json.dump(
+                {
+                    "metadata": {
+                        "core_version": self.core_version,
+                        "country_version": self.country_version,
+                    },
+                    "dependencies": dependencies,
+                },
+                f,
+            )
+
+    def get_dependencies(self, dependencies_path: Path) -> Optional[dict]:
+        if not dependencies_path.exists():
+            return None
+        with open(dependencies_path) as f:
+            data = json.load(f)
+        # Dependencies inferred under other package versions may be stale, so flush the cache
+        metadata = data.get("metadata", {})
+        if (
+            metadata.get("core_version") != self.core_version
+            or metadata.get("country_version") != self.country_version
+        ):
+            self.clear_cache(dependencies_path.parent)
+            return None
+        return data["dependencies"]
+
     def clear_cache(self, cache_folder_path: Path):
         shutil.rmtree(cache_folder_path)
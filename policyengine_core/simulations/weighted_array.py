@@ -0,0 +1,139 @@
+from typing import Any, Union
+
+import numpy as np
+import pandas as pd
+from microdf import MicroSeries
+from numpy.typing import ArrayLike
+
+QUANTILE_TOLERANCE = 1e-9
+"""How far below a quantile a cumulative share of weight can be and still reach it, so that rounding in adding up the weights doesn't move a quantile to the next value."""
+
+
+class WeightedArray:
+    """
+    The values of a variable with the weights of the entities they belong to, held as numpy arrays.
+
+    Weighted sums, means, counts and quantiles are calculated directly from the arrays, with the same results as ``MicroSeries``, without building a pandas index. Anything else is delegated to a ``MicroSeries`` of the values, built the first time it is needed.
+
+    The arrays are read-only views of the values and weights given, which may be a simulation's stored arrays, so they can't be changed in place. The ``MicroSeries`` has its own copies.
+
+    Args:
+        values (ArrayLike): The values.
+        weights (ArrayLike): The weights, one per value.
+    """
+
+    def __init__(self, values: ArrayLike, weights: ArrayLike):
+        self.values = _read_only(values)
+        self.weights = _read_only(weights)
+        if len(self.weights) != len(self.values):
+            raise ValueError(
+                f"Length of weights ({len(self.weights)}) does not match length of values ({len(self.values)})."
+            )
+        self._microseries = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        if dtype is None:
+            return self.values.copy() if copy else self.values
+        return self.values.astype(dtype)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.to_microseries(), name)
+
+    def __repr__(self) -> str:
+        return f"WeightedArray({self.values!r}, weights={self.weights!r})"
+
+    def to_microseries(self) -> MicroSeries:
+        """The values as a ``MicroSeries``.
+
+        Returns:
+            MicroSeries: The values, weighted by the weights.
+        """
+        if self._microseries is None:
+            self._microseries = MicroSeries(
+                self.values.copy(), weights=self.weights.copy()
+            )
+        return self._microseries
+
+    def _valid(self) -> np.ndarray:
+        # Whether each value is present (not NaN).
+        if self.values.dtype.kind in "fc":
+            return ~np.isnan(self.values)
+        if self.values.dtype == object:
+            return ~pd.isna(self.values)
+        return None
+
+    def sum(self) -> float:
+        """The weighted sum of the values, ignoring missing ones."""
+        valid = self._valid()
+        if valid is None:
+            return float(np.dot(self.values, self.weights))
+        return float(np.sum(self.values * self.weights, where=valid))
+
+    def weight(self) -> float:
+        """The total weight."""
+        return float(np.sum(self.weights))
+
+    def count(self) -> float:
+        """The weighted number of values, ignoring missing ones."""
+        valid = self._valid()
+        if valid is None:
+            return self.weight()
+        return float(np.sum(self.weights, where=valid))
+
+    def mean(self) -> float:
+        """The weighted mean of the values, ignoring missing ones."""
+        valid = self._valid()
+        values, weights = self.values, self.weights
+        if valid is not None:
+            if not valid.any():
+                return np.nan
+            values, weights = values[valid], weights[valid]
+        return float(np.average(values, weights=weights))
+
+    def quantile(self, q: Union[float, ArrayLike]) -> Union[float, np.ndarray]:
+        """Weighted quantiles of the values: each is the smallest value at which the cumulative share of the weight reaches the quantile, to within ``QUANTILE_TOLERANCE``. Missing values and values with no weight are ignored.
+
+        Args:
+            q (Union[float, ArrayLike]): The quantile, or quantiles, between 0 and 1.
+
+        Returns:
+            Union[float, np.ndarray]: The quantile, or an array of the quantiles.
+        """
+        quantiles = np.atleast_1d(np.asarray(q, dtype=float))
+        if np.any((quantiles < 0) | (quantiles > 1)):
+            raise ValueError("Quantiles should be between 0 and 1.")
+        included = self.weights > 0
+        valid = self._valid()
+        if valid is not None:
+            included &= valid
+        if not included.any():
+            result = np.full(len(quantiles), np.nan)
+        else:
+            values = self.values[included]
+            weights = self.weights[included]
+            order = np.argsort(values, kind="stable")
+            cumulative = np.cumsum(weights[order])
+            positions = np.searchsorted(
+                cumulative / cumulative[-1], quantiles - QUANTILE_TOLERANCE
+            )
+            result = values[order][np.minimum(positions, len(values) - 1)]
+        if np.ndim(q) == 0:
+            return result[0]
+        return result
+
+    def median(self) -> float:
+        """The weighted median of the values."""
+        return self.quantile(0.5)
+
+
+def _read_only(array: ArrayLike) -> np.ndarray:
+    # A view of the array which can't be written to, leaving the array itself
+    # writeable.
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
@@ -16,6 +16,7 @@ from typing import (
     Any,
     Callable,
     Dict,
+    FrozenSet,
     List,
     Optional,
     Sequence,
@@ -67,6 +68,7 @@ class TaxBenefitSystem:
 
     _base_tax_benefit_system: "TaxBenefitSystem" = None
     _parameters_at_instant_cache: Optional[Dict[Any, Any]] = None
+    _abolished_variables_cache: Optional[Dict[Period, tuple]] = None
     person_key_plural: str = None
     preprocess_parameters: str = None
     baseline: "TaxBenefitSystem" = (
@@ -75,6 +77,7 @@ class TaxBenefitSystem:
     cache_blacklist = None
     decomposition_file_path = None
     variable_module_metadata: dict = None
+    _parameter_read_hook: Optional[Callable[[], None]] = None
 
     # The following properties should be specified by country packages.
 
@@ -91,6 +94,20 @@ class TaxBenefitSystem:
     modelled_policies: str = None
     """A YAML filepath containing metadata describing the modelled policies."""
 
+    @property
+    def parameters(self) -> Optional[ParameterNode]:
+        """The parameter tree of the tax and benefit system."""
+        # Simulations inferring parameter dependencies are told when a
+        # formula reads the tree directly, rather than the parameters it is
+        # passed, so that they don't trust what they recorded for it.
+        if self._parameter_read_hook is not None:
+            self._parameter_read_hook()
+        return self.__dict__.get("parameters")
+
+    @parameters.setter
+    def parameters(self, parameters: Optional[ParameterNode]) -> None:
+        self.__dict__["parameters"] = parameters
+
     def __init__(self, entities: Sequence[Entity] = None, reform=None) -> None:
         if entities is None:
             entities = self.entities
@@ -101,6 +118,7 @@ class TaxBenefitSystem:
         # TODO: Currently: Don't use a weakref, because they are cleared by Paste (at least) at each call.
         self.parameters: Optional[ParameterNode] = None
         self._parameters_at_instant_cache = {}  # weakref.WeakValueDictionary()
+        self._abolished_variables_cache = {}
         self.variables: Dict[Any, Any] = {}
         # Tax benefit systems are mutable, so entities (which need to know about our variables) can't be shared among them
         if entities is None or len(entities) == 0:
@@ -234,6 +252,7 @@ class TaxBenefitSystem:
 
         """
         self.data_modified = True
+        self._abolished_variables_cache = {}
         return self.load_variable(variable, update=False)
 
     def replace_variable(self, variable: str) -> Variable:
@@ -251,6 +270,7 @@ class TaxBenefitSystem:
             del self.variables[name]
         self.load_variable(variable, update=False)
         self.data_modified = True
+        self._abolished_variables_cache = {}
 
     def update_variable(self, variable: str) -> Variable:
         """
@@ -265,6 +285,7 @@ class TaxBenefitSystem:
         :param Variable variable: Variable to add. Must be a subclass of Variable.
         """
         self.data_modified = True
+        self._abolished_variables_cache = {}
         return self.load_variable(variable, update=True)
 
     def add_variables_from_file(self, file_path: str) -> None:
@@ -510,6 +531,58 @@ class TaxBenefitSystem:
             self.get_variable(variable_name)
         )
         self.data_modified = True
+        self._abolished_variables_cache = {}
+
+    def get_abolished_variables(self, period: Period) -> FrozenSet[str]:
+        """Get the names of the variables which are neutralised, or abolished by the ``gov.abolitions`` parameters, in ``period``.
+
+        The result is cached per period, and recomputed once the abolition parameters or the variables change.
+
+        Args:
+            period (Period): The period to check.
+
+        Returns:
+            FrozenSet[str]: The names of the variables which always take their default value.
+        """
+        abolitions = None
+        if self.parameters is not None:
+            gov = self.parameters.children.get("gov")
+            if gov is not None:
+                abolitions = gov.children.get("abolitions")
+
+        cached = self._abolished_variables_cache.get(period)
+        if cached is not None:
+            node, instant, node_at_instant, abolished_variables = cached
+            # Updating a parameter clears the at-instant caches above it.
+            if node is abolitions and (
+                abolitions is None
+                or abolitions._at_instant_cache.get(instant) is node_at_instant
+            ):
+                return abolished_variables
+
+        abolished_variables = {
+            name
+            for name, variable in self.variables.items()
+            if variable.is_neutralized
+        }
+        instant = str(periods.period(period).start)
+        node_at_instant = None
+        if abolitions is not None:
+            node_at_instant = abolitions.get_at_instant(instant)
+            values = getattr(
+                node_at_instant, "parameter_node_at_instant", node_at_instant
+            )._children
+            abolished_variables.update(
+                name for name, value in values.items() if value
+            )
+        abolished_variables = frozenset(abolished_variables)
+        self._abolished_variables_cache[period] = (
+            abolitions,
+            instant,
+            node_at_instant,
+            abolished_variables,
+        )
+        return abolished_variables
 
     def annualize_variable(
         self, variable_name: str, period: typing.Optional[Period] = None
@@ -678,6 +751,7 @@ class TaxBenefitSystem:
 
         new_dict["parameters"] = self.parameters.clone()
         new_dict["_parameters_at_instant_cache"] = {}
+        new_dict["_abolished_variables_cache"] = {}
         new_dict["variables"] = {
             variable_name: variable.clone()
             for variable_name, variable in self.variables.items()
@@ -732,6 +806,7 @@ class TaxBenefitSystem:
             )
         self.parameters = reform_parameters
         self._parameters_at_instant_cache = {}
+        self._abolished_variables_cache = {}
 
     def add_modelled_policy_metadata(self):
         """
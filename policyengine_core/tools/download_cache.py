@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import requests
+
+CACHE_DIR_ENVIRONMENT_VARIABLE = "POLICYENGINE_CACHE_DIR"
+OFFLINE_ENVIRONMENT_VARIABLES = ("POLICYENGINE_OFFLINE", "HF_HUB_OFFLINE")
+CHUNK_SIZE = 1 << 16
+
+
+def get_cache_dir() -> Path:
+    """The directory downloaded files are cached in: ``$POLICYENGINE_CACHE_DIR`` if it is set, or ``~/.cache/policyengine``.
+
+    Returns:
+        Path: The directory.
+    """
+    directory = os.environ.get(CACHE_DIR_ENVIRONMENT_VARIABLE)
+    if directory is None:
+        directory = Path.home() / ".cache" / "policyengine"
+    return Path(directory)
+
+
+def is_offline() -> bool:
+    """Whether downloads are disabled, by setting ``POLICYENGINE_OFFLINE`` (or Hugging Face's ``HF_HUB_OFFLINE``) to a true value.
+
+    Returns:
+        bool: Whether files must be served from the cache.
+    """
+    return any(
+        os.environ.get(name, "").lower() in ("1", "true", "yes", "on")
+        for name in OFFLINE_ENVIRONMENT_VARIABLES
+    )
+
+
+def get_sha256(file_path: Union[str, Path]) -> str:
+    """Hash a file, reading it a chunk at a time.
+
+    Args:
+        file_path (Union[str, Path]): The file.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of its contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_sha256(file_path: Union[str, Path], sha256: str, url: str) -> None:
+    """Check a downloaded file has the digest expected, deleting it if not, so that it is downloaded again next time.
+
+    Args:
+        file_path (Union[str, Path]): The file.
+        sha256 (str): The expected hexadecimal SHA-256 digest of the file, or None not to check it.
+        url (str): The URL the file was downloaded from, for the error message.
+
+    Raises:
+        ValueError: If the file has a different digest.
+    """
+    if sha256 is None:
+        return
+    actual_sha256 = get_sha256(file_path)
+    if actual_sha256 != sha256.lower():
+        Path(file_path).unlink()
+        raise ValueError(
+            f"The file downloaded from {url} has SHA-256 {actual_sha256}, but {sha256} was expected."
+        )
+
+
+def download_file(
+    url: str,
+    file_path: Union[str, Path],
+    headers: Dict[str, str] = None,
+    sha256: str = None,
+) -> Path:
+    """Download a file, streaming it to disk a chunk at a time.
+
+    The file is written to ``{file_path}.partial`` and only renamed to ``file_path`` once it is complete (and matches ``sha256``, if given), so the target is never left partly written. If a previous download was interrupted, it is resumed with an HTTP range request, provided the server supports them and the file hasn't changed since.
+
+    Args:
+        url (str): The URL to download.
+        file_path (Union[str, Path]): The path to save the file to.
+        headers (Dict[str, str], optional): Extra request headers, such as authorisation.
+        sha256 (str, optional): The expected hexadecimal SHA-256 digest of the file.
+
+    Returns:
+        Path: The path of the downloaded file.
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = file_path.with_name(file_path.name + ".partial")
+    # Identifies the version of the file the partial download is of, so
+    # that it is only resumed if the file hasn't changed.
+    validator_path = file_path.with_name(file_path.name + ".partial.json")
+
+    request_headers = dict(headers or {})
+    offset = partial_path.stat().st_size if partial_path.exists() else 0
+    if offset > 0 and validator_path.exists():
+        validator = json.loads(validator_path.read_text()).get("validator")
+        if validator is not None:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = validator
+
+    with requests.get(url, headers=request_headers, stream=True) as response:
+        if response.status_code == 416:
+            # The partial download can't be resumed, so start again.
+            partial_path.unlink()
+            validator_path.unlink()
+            return download_file(url, file_path, headers, sha256)
+        if response.status_code == 206:
+            mode = "ab"
+        elif response.status_code == 200:
+            mode = "wb"
+        else:
+            raise ValueError(
+                f"Invalid response code {response.status_code} for url {url}."
+            )
+        validator = response.headers.get("ETag") or response.headers.get(
+            "Last-Modified"
+        )
+        validator_path.write_text(json.dumps({"validator": validator}))
+        with open(partial_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+    if sha256 is not None:
+        actual_sha256 = get_sha256(partial_path)
+        if actual_sha256 != sha256.lower():
+            partial_path.unlink()
+            validator_path.unlink()
+            raise ValueError(
+                f"The file downloaded from {url} has SHA-256 {actual_sha256}, but {sha256} was expected."
+            )
+    os.replace(partial_path, file_path)
+    validator_path.unlink()
+    return file_path
+
+
+class DownloadCache:
+    """
+    A local cache of downloaded files, keyed by URL.
+
+    Args:
+        directory (Union[str, Path], optional): The cache directory. Defaults to ``get_cache_dir()``.
+    """
+
+    def __init__(self, directory: Union[str, Path] = None):
+        if directory is None:
+            directory = get_cache_dir()
+        self.directory = Path(directory)
+
+    def get_path(self, url: str) -> Path:
+        """The path a URL is cached at, whether or not it has been downloaded.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            Path: The path.
+        """
+        url_hash = hashlib.sha256(url.encode()).hexdigest()[:16]
+        file_name = url.split("?")[0].rstrip("/").split("/")[-1] or "file"
+        return self.directory / "urls" / url_hash / file_name
+
+    def get_huggingface_path(
+        self, owner: str, repo: str, file_name: str, version: str = None
+    ) -> Path:
+        """The path a file of a Hugging Face repo is cached at, whether or not it has been downloaded.
+
+        Args:
+            owner (str): The owner of the repo.
+            repo (str): The name of the repo.
+            file_name (str): The file name.
+            version (str, optional): The revision of the repo. Defaults to its latest one.
+
+        Returns:
+            Path: The path.
+        """
+        return (
+            self.directory
+            / "huggingface"
+            / owner
+            / repo
+            / (version or "latest")
+            / file_name
+        )
+
+    def get(self, url: str, sha256: str = None) -> Optional[Path]:
+        """Get a cached file, without downloading it.
+
+        Args:
+            url (str): The URL.
+            sha256 (str, optional): The expected hexadecimal SHA-256 digest of the file. A cached file with a different digest is ignored.
+
+        Returns:
+            Optional[Path]: The path of the file, or None if it isn't cached.
+        """
+        file_path = self.get_path(url)
+        if not file_path.exists():
+            return None
+        if sha256 is not None and get_sha256(file_path) != sha256.lower():
+            return None
+        return file_path
+
+    def download(
+        self,
+        url: str,
+        headers: Dict[str, str] = None,
+        sha256: str = None,
+        offline: bool = None,
+    ) -> Path:
+        """Get a file from the cache, downloading it first if it isn't there.
+
+        Args:
+            url (str): The URL.
+            headers (Dict[str, str], optional): Extra request headers, such as authorisation.
+            sha256 (str, optional): The expected hexadecimal SHA-256 digest of the file.
+            offline (bool, optional): Whether to only use the cache. Defaults to ``is_offline()``.
+
+        Returns:
+            Path: The path of the cached file.
+        """
+        file_path = self.get(url, sha256)
+        if file_path is not None:
+            return file_path
+        if offline is None:
+            offline = is_offline()
+        if offline:
+            raise FileNotFoundError(
+                f"{url} isn't in the download cache at {self.directory}, and downloads are disabled."
+            )
+        return download_file(url, self.get_path(url), headers, sha256)
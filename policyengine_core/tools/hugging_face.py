@@ -7,6 +7,12 @@ from huggingface_hub.errors import RepositoryNotFoundError
 from getpass import getpass
 import os
 import warnings
+from policyengine_core.tools.download_cache import (
+    DownloadCache,
+    check_sha256,
+    get_sha256,
+    is_offline,
+)
 
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
@@ -60,6 +66,56 @@ def download_huggingface_dataset(
     )
 
 
+def resolve_huggingface_url(
+    url: str,
+    offline: bool = None,
+    cache: DownloadCache = None,
+    sha256: str = None,
+) -> str:
+    """
+    Get the local path of a file on the Hugging Face Hub, downloading it to the download cache if needed.
+
+    Files of a given version are served from the cache without any network call. Files without a version are re-downloaded (to pick up the latest version), unless offline, in which case the latest version downloaded is used.
+
+    Args:
+        url (str): The file's URL, in format "hf://{owner}/{repo}/{filename}", optionally followed by "@{version}".
+        offline (bool, optional): Whether to only use the cache. Defaults to ``is_offline()``.
+        cache (DownloadCache, optional): The cache. Defaults to the user's cache directory.
+        sha256 (str, optional): The expected hexadecimal SHA-256 digest of the file. A cached file with a different digest is downloaded again.
+
+    Returns:
+        str: The path of the file.
+    """
+    owner, repo, filename = url.split("/")[-3:]
+    if "@" in filename:
+        filename, version = filename.split("@")
+    else:
+        version = None
+    if cache is None:
+        cache = DownloadCache()
+    if offline is None:
+        offline = is_offline()
+    file_path = cache.get_huggingface_path(owner, repo, filename, version)
+    if (
+        file_path.exists()
+        and (version is not None or offline)
+        and (sha256 is None or get_sha256(file_path) == sha256.lower())
+    ):
+        return str(file_path)
+    if offline:
+        raise FileNotFoundError(
+            f"{url} isn't in the download cache at {cache.directory}, and downloads are disabled."
+        )
+    downloaded_path = download_huggingface_dataset(
+        repo=f"{owner}/{repo}",
+        repo_filename=filename,
+        version=version,
+        local_dir=file_path.parent,
+    )
+    check_sha256(downloaded_path, sha256, url)
+    return downloaded_path
+
+
 def get_or_prompt_hf_token() -> str:
     """
     Either get the Hugging Face token from the environment,
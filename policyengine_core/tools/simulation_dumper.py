@@ -1,44 +1,205 @@
 # -*- coding: utf-8 -*-
 
 
+import json
 import os
+import struct
+from typing import Any, Dict, Iterator, Tuple
 
 import numpy as np
 
 from policyengine_core.data_storage import OnDiskStorage
+from policyengine_core.enums import Enum, EnumArray
 from policyengine_core.periods import ETERNITY
 from policyengine_core.simulations import Simulation
 
+# A dump file starts with this, followed by the length of its index as a
+# little-endian 64-bit integer, the index as JSON, and the arrays it lists.
+MAGIC = b"PEDUMP1\n"
+# Arrays start at multiples of this many bytes from the start of the file,
+# so that memory-mapped views of them are aligned for any dtype.
+ALIGNMENT = 64
 
-def dump_simulation(simulation, directory):
-    """
-    Write simulation data to directory, so that it can be restored later.
+
+def dump_simulation(simulation: Simulation, file_path: str) -> None:
     """
-    parent_directory = os.path.abspath(os.path.join(directory, os.pardir))
-    if not os.path.isdir(parent_directory):  # To deal with reforms
-        os.mkdir(parent_directory)
-    if not os.path.isdir(directory):
-        os.mkdir(directory)
+    Write the entity structure and every known value of a simulation to a single file, so that it can be restored later.
 
-    if os.listdir(directory):
-        raise ValueError("Directory '{}' is not empty".format(directory))
+    The file holds an index of its arrays, followed by the arrays themselves, uncompressed, so that ``restore_simulation`` can memory-map them rather than read them.
 
-    entities_dump_dir = os.path.join(directory, "__entities__")
-    os.mkdir(entities_dump_dir)
+    Args:
+        simulation (Simulation): The simulation.
+        file_path (str): The path of the file to write.
+    """
+    if os.path.isdir(file_path):
+        raise ValueError(
+            "'{}' is a directory: simulations are now dumped to a single file.".format(
+                file_path
+            )
+        )
+    if os.path.exists(file_path):
+        raise ValueError("File '{}' already exists".format(file_path))
+    parent_directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(parent_directory, exist_ok=True)
 
-    for entity in simulation.populations.values():
-        # Dump entity structure
-        _dump_entity(entity, entities_dump_dir)
+    arrays = []
+    index = dict(entities={}, variables={})
+    for population in simulation.populations.values():
+        entity_index = dict(count=int(population.count), arrays={})
+        for name, array in _get_entity_arrays(population):
+            entity_index["arrays"][name] = _add_array(arrays, array)
+        index["entities"][population.entity.key] = entity_index
+
+        for variable, holder in population._holders.items():
+            values = []
+            for branch_name, period, array in _get_holder_arrays(holder):
+                values.append(
+                    dict(
+                        branch=branch_name,
+                        period=str(period),
+                        array=_add_array(arrays, array),
+                    )
+                )
+            if values:
+                index["variables"][variable] = values
+
+    header = json.dumps(index).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+    partial_path = file_path + ".partial"
+    with open(partial_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for offset, array in arrays:
+            f.seek(data_start + offset)
+            array.tofile(f)
+    os.replace(partial_path, file_path)
+
+
+def restore_simulation(
+    file_path: str, tax_benefit_system, **kwargs
+) -> Simulation:
+    """
+    Restore a simulation written by ``dump_simulation``.
 
-        # Dump variable values
-        for holder in entity._holders.values():
-            _dump_holder(holder, directory)
+    The file is memory-mapped, so the simulation can be used straight away, and each array is only read from disk when it is used. Values stored in the simulation are copy-on-write views of the file, which is left unchanged. Directories written by earlier versions of ``dump_simulation``, with one ``.npy`` file per value, can be restored too.
 
+    Args:
+        file_path (str): The path of the file.
+        tax_benefit_system (TaxBenefitSystem): The tax-benefit system the simulation was run with.
 
-def restore_simulation(directory, tax_benefit_system, **kwargs):
-    """
-    Restore simulation from directory
+    Returns:
+        Simulation: The simulation.
     """
+    if os.path.isdir(file_path):
+        return _restore_directory(file_path, tax_benefit_system)
+
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("'{}' isn't a simulation dump".format(file_path))
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        index = json.loads(f.read(header_length))
+    data_start = _align(len(MAGIC) + 8 + header_length)
+    file_size = os.path.getsize(file_path)
+    if file_size > data_start:
+        buffer = np.memmap(file_path, dtype=np.uint8, mode="c")
+    else:
+        buffer = np.zeros(0, dtype=np.uint8)
+
+    def get_array(spec: Dict[str, Any]) -> np.ndarray:
+        dtype = np.dtype(spec["dtype"])
+        start = data_start + spec["offset"]
+        size = dtype.itemsize * int(np.prod(spec["shape"]))
+        return (
+            buffer[start : start + size]
+            .view(np.ndarray)
+            .view(dtype)
+            .reshape(spec["shape"])
+        )
+
+    simulation = Simulation(
+        tax_benefit_system, tax_benefit_system.instantiate_entities()
+    )
+    for key, entity_index in index["entities"].items():
+        population = simulation.populations[key]
+        arrays = {
+            name: get_array(spec)
+            for name, spec in entity_index["arrays"].items()
+        }
+        population.count = entity_index["count"]
+        population.ids = arrays["ids"]
+        if population.entity.is_person:
+            continue
+        population.members_entity_id = arrays["members_entity_id"]
+        population.members_position = arrays["members_position"]
+        if "members_role" in arrays:
+            roles = np.empty(
+                len(population.entity.flattened_roles), dtype=object
+            )
+            roles[:] = population.entity.flattened_roles
+            population.members_role = roles[arrays["members_role"]]
+
+    for variable_name, values in index["variables"].items():
+        variable = tax_benefit_system.get_variable(
+            variable_name, check_existence=True
+        )
+        holder = simulation.get_holder(variable_name)
+        for value in values:
+            array = get_array(value["array"])
+            if variable.value_type == Enum:
+                array = EnumArray(array, variable.possible_values)
+            holder.put_in_cache(array, value["period"], value["branch"])
+
+    return simulation
+
+
+def _align(position: int) -> int:
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _add_array(arrays: list, array: np.ndarray) -> Dict[str, Any]:
+    # Records where an array will be written, after the arrays added before.
+    array = np.ascontiguousarray(np.asarray(array).view(np.ndarray))
+    if array.dtype == object:
+        # Object arrays can't be mapped into memory, so are stored as
+        # strings, and converted back when they are restored.
+        array = array.astype(str)
+    if arrays:
+        previous_offset, previous_array = arrays[-1]
+        offset = _align(previous_offset + previous_array.nbytes)
+    else:
+        offset = 0
+    arrays.append((offset, array))
+    return dict(offset=offset, dtype=array.dtype.str, shape=array.shape)
+
+
+def _get_entity_arrays(population) -> Iterator[Tuple[str, np.ndarray]]:
+    yield "ids", population.ids
+    if population.entity.is_person:
+        return
+    yield "members_entity_id", population.members_entity_id
+    yield "members_position", population.members_position
+
+    flattened_roles = population.entity.flattened_roles
+    if len(flattened_roles) > 0:
+        members_role = np.asarray(population.members_role)
+        encoded_roles = np.zeros(len(members_role), dtype=np.int16)
+        for i, role in enumerate(flattened_roles):
+            encoded_roles[members_role == role] = i
+        yield "members_role", encoded_roles
+
+
+def _get_holder_arrays(holder) -> Iterator[Tuple[str, str, np.ndarray]]:
+    for branch_name, period in holder.get_known_branch_periods():
+        value = holder._memory_storage.get(period, branch_name)
+        if value is None:
+            value = holder._disk_storage.get(period, branch_name)
+        yield branch_name, period, value
+
+
+def _restore_directory(directory, tax_benefit_system):
+    # Restores the one-file-per-array directories written by earlier
+    # versions of dump_simulation.
     simulation = Simulation(
         tax_benefit_system, tax_benefit_system.instantiate_entities()
     )
@@ -66,40 +227,6 @@ def restore_simulation(directory, tax_benefit_system, **kwargs):
     return simulation
 
 
-def _dump_holder(holder, directory):
-    disk_storage = holder.create_disk_storage(directory, preserve=True)
-    for period in holder.get_known_periods():
-        value = holder.get_array(period)
-        disk_storage.put(value, period)
-
-
-def _dump_entity(population, directory):
-    path = os.path.join(directory, population.entity.key)
-    os.mkdir(path)
-    np.save(os.path.join(path, "id.npy"), population.ids)
-
-    if population.entity.is_person:
-        return
-
-    np.save(
-        os.path.join(path, "members_position.npy"), population.members_position
-    )
-    np.save(
-        os.path.join(path, "members_entity_id.npy"),
-        population.members_entity_id,
-    )
-
-    flattened_roles = population.entity.flattened_roles
-    if len(flattened_roles) == 0:
-        encoded_roles = np.int64(0)
-    else:
-        encoded_roles = np.select(
-            [population.members_role == role for role in flattened_roles],
-            [role.key for role in flattened_roles],
-        )
-    np.save(os.path.join(path, "members_role.npy"), encoded_roles)
-
-
 def _restore_entity(population, directory):
     path = os.path.join(directory, population.entity.key)
 
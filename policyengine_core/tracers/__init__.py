@@ -6,3 +6,6 @@ from .variable_graph import VariableGraph
 from .simple_tracer import SimpleTracer
 from .trace_node import TraceNode
 from .tracing_parameter_node_at_instant import TracingParameterNodeAtInstant
+from .parameter_dependency_tracer import ParameterDependencyTracer
+from .variable_dependency_tracer import VariableDependencyTracer
+from .tracing_parameter_node import TracingParameterNode
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import typing
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+if typing.TYPE_CHECKING:
+    from policyengine_core.periods import Period
+
+    Node = Tuple[str, str]
+
+
+class ParameterDependencyTracer:
+    """
+    Records, for every variable and period calculated, the parameters its formula reads and the variables it requests.
+
+    The recorded graph gives the transitive parameter dependencies of a calculation without them having to be declared on the variable. A node is only trusted once its calculation has been seen from start to finish; any node reached through an incomplete one has unknown dependencies.
+    """
+
+    def __init__(self) -> None:
+        self._stack: List[Node] = []
+        self.parameters: Dict[Node, Set[str]] = {}
+        """The parameters read directly by each calculation."""
+
+        self.variables: Dict[Node, Set[Node]] = {}
+        """The variables requested directly by each calculation."""
+
+        self.complete: Set[Node] = set()
+        """The calculations whose direct dependencies are fully known."""
+
+        self.has_changed: bool = False
+        """Whether dependencies have been inferred since the last call to ``to_dict``."""
+
+        self.file_path: Optional[str] = None
+        """The file the dependencies are persisted to, if any."""
+
+        self._untraced: Set[Node] = set()
+
+        self._closures: Dict[Node, Optional[frozenset]] = {}
+
+    @property
+    def stack(self) -> List[Node]:
+        return self._stack
+
+    def record_calculation_start(
+        self, variable: str, period: Period, branch_name: str = "default"
+    ) -> None:
+        node = (variable, str(period))
+        if self._stack:
+            parent = self._stack[-1]
+            children = self.variables.setdefault(parent, set())
+            if node not in children:
+                children.add(node)
+                self._closures.clear()
+        self._stack.append(node)
+
+    def record_parameter_access(
+        self, parameter: str, period, branch_name: str, value
+    ) -> None:
+        if not self._stack:
+            return
+        node = self._stack[-1]
+        parameters = self.parameters.setdefault(node, set())
+        if parameter not in parameters:
+            parameters.add(parameter)
+            self._closures.clear()
+
+    def record_untraced_calculation(self) -> None:
+        """Note that the calculation on top of the stack requested a value whose dependencies could not be recorded."""
+        if self._stack:
+            self._untraced.add(self._stack[-1])
+
+    def record_calculation_complete(
+        self, variable: str, period: Period
+    ) -> None:
+        """Mark the calculation of ``variable`` for ``period`` as having all of its direct dependencies recorded, if it is the one on top of the stack."""
+        node = (variable, str(period))
+        if not self._stack or self._stack[-1] != node:
+            return
+        if node not in self.complete and node not in self._untraced:
+            self.complete.add(node)
+            self.has_changed = True
+            self._closures.clear()
+
+    def record_calculation_end(self) -> None:
+        self._untraced.discard(self._stack.pop())
+
+    @contextmanager
+    def record_separately(self) -> Iterator[None]:
+        """Record the calculations made inside the block as top-level ones, rather than as dependencies of the calculation in progress."""
+        stack = self._stack
+        self._stack = []
+        try:
+            yield
+        finally:
+            self._stack = stack
+
+    def get_parameter_dependencies(
+        self, variable: str, period: Period
+    ) -> Optional[frozenset]:
+        """Get the names of the parameters the calculation of ``variable`` for ``period`` depends on, directly or through other variables.
+
+        Args:
+            variable (str): The name of the variable.
+            period (Period): The period of the calculation.
+
+        Returns:
+            Optional[frozenset]: The parameter names, or None if the dependencies are not fully known.
+        """
+        closure, _ = self._get_closure((variable, str(period)), set())
+        return closure
+
+    def _get_closure(
+        self, node: Node, visiting: set
+    ) -> Tuple[Optional[frozenset], set]:
+        if node in self._closures:
+            return self._closures[node], set()
+        if node not in self.complete:
+            return None, set()
+        if node in visiting:
+            # Spirals reach back to a calculation still being resolved, whose
+            # parameters are collected further up the traversal.
+            return frozenset(), {node}
+        visiting.add(node)
+        closure = set(self.parameters.get(node, ()))
+        back_references = set()
+        for child in self.variables.get(node, ()):
+            child_closure, child_back_references = self._get_closure(
+                child, visiting
+            )
+            if child_closure is None:
+                closure = None
+                break
+            closure.update(child_closure)
+            back_references.update(child_back_references)
+        visiting.discard(node)
+        back_references.discard(node)
+        if closure is not None:
+            closure = frozenset(closure)
+        if closure is None or not back_references:
+            # A closure reaching back to a calculation further up is partial.
+            self._closures[node] = closure
+        return closure, back_references
+
+    def to_dict(self) -> dict:
+        """Serialise the complete calculations to a JSON-compatible dictionary."""
+        dependencies = {}
+        for variable, period in self.complete:
+            node = (variable, period)
+            dependencies.setdefault(variable, {})[period] = {
+                "parameters": sorted(self.parameters.get(node, ())),
+                "variables": sorted(
+                    list(child) for child in self.variables.get(node, ())
+                ),
+            }
+        self.has_changed = False
+        return dependencies
+
+    def load(self, dependencies: dict) -> None:
+        """Add calculations serialised with ``to_dict``.
+
+        Args:
+            dependencies (dict): The serialised dependencies.
+        """
+        for variable, periods in dependencies.items():
+            for period, node_dependencies in periods.items():
+                node = (variable, period)
+                self.parameters.setdefault(node, set()).update(
+                    node_dependencies["parameters"]
+                )
+                self.variables.setdefault(node, set()).update(
+                    tuple(child) for child in node_dependencies["variables"]
+                )
+                self.complete.add(node)
+        self._closures.clear()
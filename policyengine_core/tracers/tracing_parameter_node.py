@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import typing
+from typing import Any, Sequence, Union
+
+from policyengine_core import parameters
+from policyengine_core.taxscales import TaxScaleLike
+
+from .. import tracers
+
+if typing.TYPE_CHECKING:
+    from policyengine_core.parameters import ParameterNode
+    from policyengine_core.periods import Instant
+
+
+class _TracerGroup:
+    def __init__(self, tracers: Sequence) -> None:
+        self.tracers = tracers
+
+    def record_parameter_access(
+        self, parameter: str, period, branch_name: str, value
+    ) -> None:
+        for tracer in self.tracers:
+            tracer.record_parameter_access(
+                parameter, period, branch_name, value
+            )
+
+
+class _ScaleTracingParameterNodeAtInstant(
+    tracers.TracingParameterNodeAtInstant
+):
+    def get_traced_child(self, child, key):
+        traced_child = super().get_traced_child(child, key)
+        if isinstance(traced_child, tracers.TracingParameterNodeAtInstant):
+            return _ScaleTracingParameterNodeAtInstant(
+                traced_child.parameter_node_at_instant,
+                self.tracer,
+                self.branch_name,
+            )
+        if isinstance(child, TaxScaleLike) and isinstance(key, str):
+            self.tracer.record_parameter_access(
+                ".".join([self.parameter_node_at_instant._name, key]),
+                self.parameter_node_at_instant._instant_str,
+                self.branch_name,
+                child,
+            )
+        return traced_child
+
+
+class TracingParameterNode:
+    """
+    Wraps the root of a parameter tree so that every parameter a formula reads from it, tax scales included, is reported to ``tracer``.
+
+    Parameters reached by attribute access (``parameters.gov.some_parameter``) are reported when they are accessed, whatever instant they are later evaluated at.
+    """
+
+    def __init__(
+        self,
+        parameter_node: ParameterNode,
+        tracer: Any,
+        branch_name: str,
+    ) -> None:
+        self.parameter_node = parameter_node
+        self.tracer = tracer
+        self.branch_name = branch_name
+
+    def __call__(
+        self, instant: Instant
+    ) -> tracers.TracingParameterNodeAtInstant:
+        return self.get_at_instant(instant)
+
+    def get_at_instant(
+        self, instant: Instant
+    ) -> tracers.TracingParameterNodeAtInstant:
+        node_at_instant = self.parameter_node.get_at_instant(instant)
+        tracer = self.tracer
+        if isinstance(node_at_instant, tracers.TracingParameterNodeAtInstant):
+            # Keep reporting to the simulation tracer when tracing is on.
+            tracer = _TracerGroup([tracer, node_at_instant.tracer])
+            node_at_instant = node_at_instant.parameter_node_at_instant
+        return _ScaleTracingParameterNodeAtInstant(
+            node_at_instant, tracer, self.branch_name
+        )
+
+    def __getattr__(self, key: str) -> Union[TracingParameterNode, Any]:
+        child = getattr(self.parameter_node, key)
+        if isinstance(child, parameters.ParameterNode):
+            return TracingParameterNode(child, self.tracer, self.branch_name)
+        if isinstance(
+            child, (parameters.Parameter, parameters.ParameterScale)
+        ):
+            self.tracer.record_parameter_access(
+                child.name, None, self.branch_name, None
+            )
+        return child
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Set
+
+from .simple_tracer import SimpleTracer
+
+
+class VariableDependencyTracer(SimpleTracer):
+    """
+    A tracer recording, for every variable calculated, the variables its calculations request, in any period.
+
+    The recorded graph tells which variables can change when another one does, so that only those need recalculating.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.dependencies: Dict[str, Set[str]] = {}
+        """The variables requested directly by the calculations of each variable."""
+
+    def record_calculation_start(
+        self, variable: str, period: str, branch_name: str = "default"
+    ) -> None:
+        if self.stack:
+            parent = self.stack[-1]["name"]
+            if parent != variable:
+                self.dependencies.setdefault(parent, set()).add(variable)
+        super().record_calculation_start(variable, period, branch_name)
+
+    def get_dependents(self, variables: Iterable[str]) -> Set[str]:
+        """Get the variables depending on any of ``variables``, directly or through other variables.
+
+        Args:
+            variables (Iterable[str]): The names of the variables.
+
+        Returns:
+            Set[str]: The names of the variables depending on them, not including them unless they depend on each other.
+        """
+        dependents: Dict[str, Set[str]] = {}
+        for parent, children in self.dependencies.items():
+            for child in children:
+                dependents.setdefault(child, set()).add(parent)
+        result = set()
+        to_visit = list(variables)
+        while to_visit:
+            for parent in dependents.get(to_visit.pop(), ()):
+                if parent not in result:
+                    result.add(parent)
+                    to_visit.append(parent)
+        return result
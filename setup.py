@@ -47,6 +47,10 @@ dev_requirements = [
     "types-urllib3==1.26.25.4",
 ]
 
+arrow_requirements = [
+    "pyarrow>=14,<20",
+]
+
 setup(
     name="policyengine-core",
     version="3.16.1",
@@ -77,6 +81,7 @@ setup(
     python_requires=">=3.10",
     extras_require={
         "dev": dev_requirements,
+        "arrow": arrow_requirements,
     },
     include_package_data=True,  # Will read MANIFEST.in
     install_requires=general_requirements,
@@ -43,3 +43,59 @@ def test_atomic_write():
             # But if I open it again it has the new content
             with open(file.name, "r") as file_updated:
                 assert file_updated.readline() == "NOPE\n"
+
+
+def test_columnar_dataset(tmp_path):
+    import numpy as np
+    import pytest
+
+    pytest.importorskip("pyarrow")
+    from policyengine_core.country_template import (
+        CountryTaxBenefitSystem,
+        Microsimulation,
+    )
+    from policyengine_core.country_template.data.datasets.country_template_dataset import (
+        CountryTemplateDataset,
+    )
+    from policyengine_core.data.dataset import Dataset
+
+    expected = Microsimulation()
+    for suffix in (".parquet", ".arrow"):
+        dataset = CountryTemplateDataset().to_columnar(
+            tmp_path / f"country_template{suffix}", CountryTaxBenefitSystem()
+        )
+        assert dataset.data_format == Dataset.COLUMNAR
+        assert "salary__2022-01" in dataset.variables
+
+        simulation = Microsimulation(dataset=dataset)
+        for variable in ("salary", "rent", "income_tax", "housing_tax"):
+            assert np.allclose(
+                simulation.calculate(variable, "2022-01", use_weights=False),
+                expected.calculate(variable, "2022-01", use_weights=False),
+            )
+
+
+def test_columnar_arrow_columns_are_not_copied(tmp_path):
+    import numpy as np
+    import pandas as pd
+    import pytest
+
+    pytest.importorskip("pyarrow")
+    from policyengine_core.data.columnar import (
+        ColumnarTable,
+        write_columnar_file,
+    )
+
+    file_path = tmp_path / "table.arrow"
+    write_columnar_file(
+        pd.DataFrame({"salary__2022": [1.0, 2.0], "role": ["a", "b"]}),
+        file_path,
+    )
+
+    table = ColumnarTable(file_path)
+    salary = table["salary__2022"]
+    assert len(table) == 2
+    assert table.columns == ["salary__2022", "role"]
+    assert np.allclose(salary, [1, 2])
+    assert not salary.flags.writeable
+    assert table["role"].tolist() == ["a", "b"]
@@ -68,3 +68,31 @@ def test_deep_edit(tax_benefit_system):
     clone_scale.brackets[0].rate.values_list[0].value = 10
 
     assert scale.brackets[0].rate.values_list[0].value == original_scale_value
+
+
+def test_clone_tracks_its_own_modifications(tax_benefit_system):
+    parameters = tax_benefit_system.parameters
+    clone = parameters.clone()
+
+    assert clone.taxes.parent is clone
+    clone.taxes.income_tax_rate.update(period="2017", value=0.5)
+
+    assert clone.modified
+    assert clone.taxes.modified
+    assert not parameters.modified
+    assert not parameters.taxes.income_tax_rate.modified
+
+
+def test_scale_bracket_update_marks_scale_as_modified(tax_benefit_system):
+    clone = tax_benefit_system.parameters.clone()
+    scale = clone.taxes.social_security_contribution
+    assert scale("2017-01-01").rates[0] == 0.02
+
+    scale.brackets[0].rate.update(period="2017", value=0.5)
+
+    assert scale.modified
+    assert clone.modified
+    assert scale("2017-01-01").rates[0] == 0.5
+    assert (
+        clone("2017-01-01").taxes.social_security_contribution.rates[0] == 0.5
+    )
@@ -40,6 +40,30 @@ def test_parameter_uprating():
     assert interpolated.to_be_uprated("2018-01-01") == 2 * 3
 
 
+def test_parameter_uprated_with_modified_uprater_is_modified():
+    from policyengine_core.parameters import ParameterNode, uprate_parameters
+
+    root = ParameterNode(
+        data={
+            "to_be_uprated": {
+                "values": {"2015-01-01": 1},
+                "metadata": {"uprating": "uprater"},
+            },
+            "not_uprated": {"values": {"2015-01-01": 1}},
+            "uprater": {
+                "values": {"2015-01-01": 1, "2017-01-01": 2},
+            },
+        }
+    )
+    root.uprater.update(period="year:2017:10", value=3)
+
+    uprated = uprate_parameters(root)
+
+    assert uprated.to_be_uprated("2017-01-01") == 3
+    assert uprated.to_be_uprated.modified
+    assert not uprated.not_uprated.modified
+
+
 def test_parameter_uprating_with_rounding():
     from policyengine_core.parameters import ParameterNode
 
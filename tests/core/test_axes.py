@@ -346,3 +346,48 @@ def test_simulation_with_axes(tax_benefit_system):
     assert simulation.get_array("rent", "2018-11") == pytest.approx(
         [0, 0, 3000, 0]
     )
+
+
+def test_simulation_with_axes_repeats_roles_and_inputs(tax_benefit_system):
+    input_yaml = """
+        persons:
+          Alicia: {salary: {2018-11: 1000}}
+          Javier: {salary: {2018-11: 2000}}
+          Tom: {}
+        households:
+          housea:
+            parents: [Alicia, Javier]
+            children: [Tom]
+        axes:
+            -
+                - count: 3
+                  name: rent
+                  min: 0
+                  max: 3000
+                  period: 2018-11
+    """
+    data = test_runner.yaml.safe_load(input_yaml)
+    simulation = SimulationBuilder().build_from_dict(tax_benefit_system, data)
+    assert [role.key for role in simulation.household.members_role] == [
+        "first_parent",
+        "second_parent",
+        "child",
+    ] * 3
+    assert simulation.household.members_entity_id.tolist() == [
+        0,
+        0,
+        0,
+        1,
+        1,
+        1,
+        2,
+        2,
+        2,
+    ]
+    holder = simulation.person.get_holder("salary")
+    # Inputs the same in every cell are only repeated when first needed.
+    assert holder._input_loaders
+    assert "salary" in simulation.input_variables
+    assert simulation.get_array("salary", "2018-11") == pytest.approx(
+        [1000, 2000, 0] * 3
+    )
@@ -0,0 +1,234 @@
+import h5py
+import numpy as np
+import pytest
+
+from policyengine_core.country_template import Microsimulation
+from policyengine_core.country_template.data.datasets.country_template_dataset import (
+    CountryTemplateDataset,
+)
+from policyengine_core.simulations import (
+    ChunkedMicrosimulation,
+    WeightedCount,
+    WeightedDecileTable,
+    WeightedHistogram,
+    WeightedMean,
+    WeightedQuantiles,
+    WeightedSum,
+)
+
+
+@pytest.fixture
+def chunked_simulation():
+    return ChunkedMicrosimulation(
+        Microsimulation, CountryTemplateDataset, chunk_size=1
+    )
+
+
+def test_partitions_keep_households_whole(chunked_simulation):
+    partitions = chunked_simulation.get_partitions()
+
+    assert len(partitions) == 2
+    assert partitions[0]["person"].tolist() == [0, 1]
+    assert partitions[0]["household"].tolist() == [0]
+    assert partitions[1]["person"].tolist() == [2]
+    assert partitions[1]["household"].tolist() == [1]
+
+
+def test_aggregate(chunked_simulation):
+    simulation = Microsimulation()
+    income_tax = simulation.calculate("income_tax", "2022-01")
+    salary = simulation.calculate("salary", "2022-01")
+
+    total, recipients, histogram = chunked_simulation.aggregate(
+        [
+            WeightedSum("income_tax"),
+            WeightedCount("income_tax"),
+            WeightedHistogram("salary", [0, 150, 1000]),
+        ],
+        "2022-01",
+    )
+
+    assert total.result == pytest.approx(income_tax.sum(), rel=1e-6)
+    assert recipients.result == pytest.approx((income_tax > 0).sum())
+    assert histogram.result.tolist() == [
+        (salary < 150).sum(),
+        (salary >= 150).sum(),
+    ]
+
+
+def test_calculate_to_file(chunked_simulation, tmp_path):
+    simulation = Microsimulation()
+    file_path = tmp_path / "output.h5"
+
+    chunked_simulation.calculate_to_file(
+        ["income_tax", "housing_occupancy_status"], file_path, "2022-01"
+    )
+
+    with h5py.File(file_path, "r") as output:
+        assert np.allclose(
+            output["income_tax"][()],
+            simulation.calculate("income_tax", "2022-01", use_weights=False),
+        )
+        assert output["housing_occupancy_status"].asstr()[()].tolist() == (
+            simulation.calculate(
+                "housing_occupancy_status", "2022-01", use_weights=False
+            ).tolist()
+        )
+
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_calculate(chunked_simulation, processes):
+    simulation = Microsimulation()
+
+    results = chunked_simulation.calculate(
+        ["income_tax", "housing_occupancy_status"], "2022-01", processes
+    )
+
+    assert np.allclose(
+        results["income_tax"],
+        simulation.calculate("income_tax", "2022-01", use_weights=False),
+    )
+    assert results["housing_occupancy_status"].decode_to_str().tolist() == (
+        simulation.calculate(
+            "housing_occupancy_status", "2022-01", use_weights=False
+        ).tolist()
+    )
+
+
+def test_aggregate_in_processes(chunked_simulation):
+    simulation = Microsimulation()
+    income_tax = simulation.calculate("income_tax", "2022-01")
+
+    total, mean = chunked_simulation.aggregate(
+        [WeightedSum("income_tax"), WeightedMean("income_tax")],
+        "2022-01",
+        processes=2,
+    )
+
+    assert total.result == pytest.approx(income_tax.sum(), rel=1e-6)
+    assert mean.result == pytest.approx(income_tax.mean(), rel=1e-6)
+
+
+def test_chunks_have_their_own_macro_cache(tmp_path):
+    class TemporaryDataset(CountryTemplateDataset):
+        file_path = tmp_path / "country_template_dataset.h5"
+
+    class CachedMicrosimulation(Microsimulation):
+        default_dataset = TemporaryDataset
+        macro_cache_read = True
+
+    income_tax = CachedMicrosimulation().calculate(
+        "income_tax", "2022-01", use_weights=False
+    )
+    chunked_simulation = ChunkedMicrosimulation(
+        CachedMicrosimulation, TemporaryDataset, chunk_size=1
+    )
+    names = [
+        simulation.dataset.name
+        for simulation, _ in chunked_simulation.simulations()
+    ]
+    assert len(set(names)) == len(names)
+    assert "country_template_dataset" not in names
+
+    # Running twice reads each chunk's values back from its own cache.
+    for _ in range(2):
+        assert np.allclose(
+            chunked_simulation.calculate("income_tax", "2022-01")[
+                "income_tax"
+            ],
+            income_tax,
+        )
+
+
+def test_chunks_of_households_with_scattered_members(tmp_path, monkeypatch):
+    from policyengine_core.periods import ETERNITY, period
+    from policyengine_core.simulations import chunked_microsimulation
+
+    class ScatteredDataset(CountryTemplateDataset):
+        name = "scattered_dataset"
+        file_path = tmp_path / "scattered_dataset.h5"
+
+        def generate(self) -> None:
+            # Members of each household are spread through the file.
+            household_count = 10
+            person_household_id = np.tile(np.arange(household_count), 3)
+            roles = ["parent"] * household_count + ["child"] * (
+                2 * household_count
+            )
+            self.save_dataset(
+                {
+                    "person_id": {
+                        ETERNITY: np.arange(len(person_household_id))
+                    },
+                    "household_id": {ETERNITY: np.arange(household_count)},
+                    "person_household_id": {ETERNITY: person_household_id},
+                    "person_household_role": {ETERNITY: roles},
+                    "salary": {
+                        period("2022-01"): np.arange(
+                            len(person_household_id), dtype=float
+                        )
+                        * 100
+                    },
+                    "household_weight": {
+                        period("2022"): np.ones(household_count)
+                    },
+                }
+            )
+
+    class ScatteredMicrosimulation(Microsimulation):
+        default_dataset = ScatteredDataset
+
+    simulation = ScatteredMicrosimulation()
+    income_tax = simulation.calculate(
+        "income_tax", "2022-01", use_weights=False
+    )
+    # Read each contiguous run of members separately, as well as in one span.
+    for max_read_gap in (0, chunked_microsimulation._MAX_READ_GAP):
+        monkeypatch.setattr(
+            chunked_microsimulation, "_MAX_READ_GAP", max_read_gap
+        )
+        chunked_simulation = ChunkedMicrosimulation(
+            ScatteredMicrosimulation, ScatteredDataset, chunk_size=3
+        )
+        assert chunked_simulation.get_partitions()[0]["person"].tolist() == [
+            0,
+            1,
+            2,
+            10,
+            11,
+            12,
+            20,
+            21,
+            22,
+        ]
+        assert np.allclose(
+            chunked_simulation.calculate("income_tax", "2022-01")[
+                "income_tax"
+            ],
+            income_tax,
+        )
+
+
+def test_weighted_quantiles_merge():
+    values = np.arange(1_000, dtype=float)
+    weights = np.ones(1_000)
+    merged = WeightedQuantiles("salary", [0.1, 0.5, 0.9], size=100)
+    for part in np.array_split(np.random.permutation(1_000), 10):
+        chunk = merged.empty()
+        chunk.update(values[part], weights[part])
+        merged.merge(chunk)
+
+    assert len(merged.values) <= 100
+    assert np.allclose(merged.result, [100, 500, 900], atol=10)
+
+
+def test_weighted_decile_table():
+    ranks = np.arange(100, dtype=float)
+    values = np.repeat(np.arange(10, dtype=float), 10)
+    table = WeightedDecileTable("income_tax", "salary")
+    for part in np.array_split(np.arange(100), 4):
+        table.update(values[part], np.ones(len(part)), ranks[part])
+
+    result = table.result
+    assert result.weight.tolist() == [10] * 10
+    assert np.allclose(result["mean"], np.arange(10))
@@ -1,6 +1,6 @@
-import shutil
-import tempfile
+import os
 
+import pytest
 from numpy import testing
 
 from policyengine_core.country_template import situation_examples
@@ -8,16 +8,19 @@ from policyengine_core.simulations import SimulationBuilder
 from policyengine_core.tools import simulation_dumper
 
 
-def test_dump(tax_benefit_system):
-    directory = tempfile.mkdtemp(prefix="openfisca_")
+def test_dump(tax_benefit_system, tmp_path):
+    file_path = str(tmp_path / "simulation.dump")
     simulation = SimulationBuilder().build_from_entities(
         tax_benefit_system, situation_examples.couple
     )
     calculated_value = simulation.calculate("disposable_income", "2018-01")
-    simulation_dumper.dump_simulation(simulation, directory)
+    simulation_dumper.dump_simulation(simulation, file_path)
+
+    # Everything is written to a single file.
+    assert os.listdir(tmp_path) == ["simulation.dump"]
 
     simulation_2 = simulation_dumper.restore_simulation(
-        directory, tax_benefit_system
+        file_path, tax_benefit_system
     )
 
     # Check entities structure have been restored
@@ -52,5 +55,25 @@ def test_dump(tax_benefit_system):
     cached_value = disposable_income_holder.get_array("2018-01")
     assert cached_value is not None
     testing.assert_array_equal(cached_value, calculated_value)
+    # Values are views of the memory-mapped file rather than copies, and can
+    # be modified without changing it.
+    assert not cached_value.flags.owndata
+    cached_value[0] += 1
+    simulation_3 = simulation_dumper.restore_simulation(
+        file_path, tax_benefit_system
+    )
+    testing.assert_array_equal(
+        simulation_3.person.get_holder("disposable_income").get_array(
+            "2018-01"
+        ),
+        calculated_value,
+    )
+
+    # Restored simulations go on calculating.
+    testing.assert_array_equal(
+        simulation_2.calculate("income_tax", "2018-01"),
+        simulation.calculate("income_tax", "2018-01"),
+    )
 
-    shutil.rmtree(directory)
+    with pytest.raises(ValueError):
+        simulation_dumper.dump_simulation(simulation, file_path)
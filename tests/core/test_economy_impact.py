@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from microdf import MicroSeries
+
+from policyengine_core.charts import (
+    decile_chart,
+    get_economy_impact,
+    intra_decile_chart,
+)
+from policyengine_core.country_template import Microsimulation
+from policyengine_core.data import Dataset
+from policyengine_core.reforms import Reform
+
+
+def make_simulations():
+    size = 200
+    random = np.random.default_rng(0)
+    dataframe = pd.DataFrame(
+        {
+            "person_id": np.arange(size),
+            "household_id": np.arange(size) // 2,
+            "person_household_id": np.arange(size) // 2,
+            "salary__2022-01": random.integers(0, 10_000, size).astype(float),
+            "household_weight": np.repeat(
+                random.integers(1, 10, size // 2), 2
+            ).astype(float),
+        }
+    )
+    dataset = Dataset.from_dataframe(dataframe, "2022")
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.2}},
+        country_id="us",
+    )
+    return (
+        Microsimulation(dataset=dataset),
+        Microsimulation(dataset=dataset, reform=reform),
+    )
+
+
+def test_economy_impact():
+    baseline, reformed = make_simulations()
+    impact = get_economy_impact(
+        baseline,
+        reformed,
+        "2022-01",
+        income_variable="disposable_income",
+        tax_variable="total_taxes",
+        benefit_variable="total_benefits",
+    )
+
+    income = baseline.calculate(
+        "disposable_income", "2022-01", map_to="household"
+    )
+    reformed_income = reformed.calculate(
+        "disposable_income", "2022-01", map_to="household"
+    )
+    taxes = baseline.calculate("total_taxes", "2022-01")
+    reformed_taxes = reformed.calculate("total_taxes", "2022-01")
+    assert impact["budget"]["tax_revenue_impact"] == pytest.approx(
+        reformed_taxes.sum() - taxes.sum()
+    )
+    assert impact["budget"]["budgetary_impact"] == pytest.approx(
+        impact["budget"]["tax_revenue_impact"]
+        - impact["budget"]["benefit_spending_impact"]
+    )
+
+    # Deciles are ranked by income, weighted by the number of people.
+    people = baseline.household.nb_persons()
+    deciles = MicroSeries(
+        np.asarray(income), weights=income.weights * people
+    ).decile_rank()
+    for decile in range(1, 11):
+        in_decile = np.asarray(deciles == decile)
+        change = reformed_income[in_decile].sum() - income[in_decile].sum()
+        assert impact["decile"]["relative"][str(decile)] == pytest.approx(
+            change / income[in_decile].sum()
+        )
+    # A higher tax rate makes nobody better off.
+    intra_decile = impact["intra_decile"]
+    assert intra_decile["all"]["Gain more than 5%"] == 0
+    assert sum(intra_decile["all"].values()) == pytest.approx(1)
+    for shares in zip(*intra_decile["deciles"].values()):
+        assert sum(shares) == pytest.approx(1)
+
+    assert impact["inequality"]["gini"]["baseline"] == pytest.approx(
+        MicroSeries(np.asarray(income), weights=income.weights * people).gini()
+    )
+    assert "poverty" not in impact
+
+    # The local impact is drawn without calling the API.
+    decile_chart(impact=impact)
+    intra_decile_chart(impact=impact)
@@ -99,6 +99,9 @@ def test_entity_structure_with_constructor(tax_benefit_system):
         == [FIRST_PARENT, SECOND_PARENT, FIRST_PARENT, CHILD, CHILD]
     ).all()
     tools.assert_near(household.members_position, [0, 1, 0, 2, 3])
+    tools.assert_near(household.members_offsets, [0, 4, 5])
+    tools.assert_near(household.get_members(0), [0, 1, 3, 4])
+    tools.assert_near(household.get_members(1), [2])
 
 
 def test_entity_variables_with_constructor(tax_benefit_system):
@@ -222,3 +222,39 @@ def test_set_input_float_to_int(single):
     simulation.person.get_holder("age").set_input(period, age)
     result = simulation.calculate("age", period)
     assert result == numpy.asarray([50])
+
+
+def test_set_input_loader(single):
+    simulation = single
+    holder = simulation.person.get_holder("salary")
+    calls = []
+
+    def load_salary():
+        calls.append(period)
+        return numpy.asarray([3000])
+
+    simulation.set_input_loader("salary", "2017", load_salary)
+    assert holder.has_known_values()
+    assert calls == []
+
+    # Inputs are divided between months when they are loaded.
+    tools.assert_near(simulation.calculate("salary", period), [250])
+    assert calls == [period]
+    assert len(holder.get_known_periods()) == 12
+
+
+def test_lazy_inputs():
+    from policyengine_core.country_template import Microsimulation
+
+    class LazyMicrosimulation(Microsimulation):
+        lazy_inputs = True
+
+    simulation = LazyMicrosimulation()
+    assert "salary" in simulation.input_variables
+    assert simulation.person.get_holder("salary")._input_loaders
+
+    tools.assert_near(
+        simulation.calculate("salary", "2022-01", use_weights=False),
+        Microsimulation().calculate("salary", "2022-01", use_weights=False),
+    )
+    assert not simulation.person.get_holder("salary")._input_loaders
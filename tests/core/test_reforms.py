@@ -325,3 +325,211 @@ def test_formulas_removal(tax_benefit_system):
     baseline_variable = tax_benefit_system.get_variable("basic_income")
     assert len(reform_variable.formulas) == 0
     assert len(baseline_variable.formulas) > 0
+
+
+def test_abolition_parameters(make_simulation, tax_benefit_system):
+    system = tax_benefit_system.clone()
+    system.parameters.add_child("gov", ParameterNode("gov", data={}))
+    system.add_abolition_parameters()
+
+    period = periods.period("2017-01")
+    assert "basic_income" not in system.get_abolished_variables(period)
+
+    system.parameters.gov.abolitions.basic_income.update(
+        period="year:2017:1", value=True
+    )
+    assert "basic_income" in system.get_abolished_variables(period)
+    assert "basic_income" not in system.get_abolished_variables(
+        periods.period("2016-01")
+    )
+
+    simulation = make_simulation(system, {}, period)
+    assert_near(simulation.calculate("basic_income", period), 0)
+    assert simulation.calculate("basic_income", "2016-01") > 0
+
+
+def test_neutralized_variables_are_abolished(tax_benefit_system):
+    reform = WithBasicIncomeNeutralized(tax_benefit_system)
+    period = periods.period("2017-01")
+
+    assert "basic_income" in reform.get_abolished_variables(period)
+    assert "basic_income" not in tax_benefit_system.get_abolished_variables(
+        period
+    )
+
+
+def test_reform_reuses_unaffected_baseline_values():
+    from policyengine_core.country_template import Simulation
+
+    class DeltaSimulation(Simulation):
+        reuse_baseline_values = True
+
+    situation = {
+        "persons": {"person": {"salary": {"2022-01": 1000}}},
+        "households": {"household": {"parents": ["person"]}},
+    }
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.3}},
+        country_id="us",
+    )
+    simulation = DeltaSimulation(situation=situation, reform=reform)
+
+    assert_near(simulation.calculate("income_tax", "2022-01"), 300)
+    assert_near(simulation.baseline.calculate("income_tax", "2022-01"), 150)
+
+    basic_income = simulation.calculate("basic_income", "2022-01")
+    assert basic_income is simulation.baseline.get_holder(
+        "basic_income"
+    ).get_array("2022-01", "baseline")
+
+    # Inputs changed after branching can't be served from the baseline.
+    simulation.set_input("salary", "2022-02", [2000])
+    assert_near(simulation.calculate("income_tax", "2022-02"), 600)
+    social_security_contribution = simulation.calculate(
+        "social_security_contribution", "2022-02"
+    )
+    assert social_security_contribution is not (
+        simulation.baseline.get_holder(
+            "social_security_contribution"
+        ).get_array("2022-02", "baseline")
+    )
+
+
+def test_reformed_simulation_reuses_unaffected_baseline_values():
+    from policyengine_core.country_template import Simulation
+
+    situation = {
+        "persons": {"person": {"salary": {"2022-01": 1000}}},
+        "households": {"household": {"parents": ["person"]}},
+    }
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.3}},
+        country_id="us",
+    )
+    simulation = Simulation(situation=situation, reform=reform)
+
+    assert simulation.reuse_baseline_values
+    assert not Simulation(situation=situation).reuse_baseline_values
+    assert_near(simulation.calculate("income_tax", "2022-01"), 300)
+    social_security_contribution = simulation.calculate(
+        "social_security_contribution", "2022-01"
+    )
+    assert social_security_contribution is (
+        simulation.baseline.get_holder(
+            "social_security_contribution"
+        ).get_array("2022-01", "baseline")
+    )
+
+    class RecalculatingSimulation(Simulation):
+        reuse_baseline_values = False
+
+    simulation = RecalculatingSimulation(situation=situation, reform=reform)
+    simulation.calculate("social_security_contribution", "2022-01")
+    assert (
+        simulation.baseline.get_holder(
+            "social_security_contribution"
+        ).get_array("2022-01", "baseline")
+        is None
+    )
+
+
+def test_reform_recalculates_formulas_reading_parameters_directly():
+    from policyengine_core.country_template import (
+        CountryTaxBenefitSystem,
+        Simulation,
+    )
+
+    class taxed_salary(Variable):
+        value_type = float
+        entity = Person
+        label = "Taxed salary"
+        definition_period = MONTH
+
+        def formula(person, period):
+            parameters = person.simulation.tax_benefit_system.parameters
+            rate = parameters(period).taxes.income_tax_rate
+            return person("salary", period) * rate
+
+    class SystemWithTaxedSalary(CountryTaxBenefitSystem):
+        def add_variables_from_directory(self, directory):
+            super().add_variables_from_directory(directory)
+            if directory == self.variables_dir:
+                self.add_variable(taxed_salary)
+
+    class DeltaSimulation(Simulation):
+        default_tax_benefit_system = SystemWithTaxedSalary
+        default_tax_benefit_system_instance = SystemWithTaxedSalary()
+
+    situation = {
+        "persons": {"person": {"salary": {"2022-01": 1000}}},
+        "households": {"household": {"parents": ["person"]}},
+    }
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.3}},
+        country_id="us",
+    )
+    simulation = DeltaSimulation(situation=situation, reform=reform)
+
+    assert_near(simulation.calculate("taxed_salary", "2022-01"), 300)
+    assert_near(simulation.baseline.calculate("taxed_salary", "2022-01"), 150)
+
+
+def make_reform_batch():
+    from policyengine_core.country_template import Simulation
+    from policyengine_core.simulations import ReformBatch
+
+    situation = {
+        "persons": {
+            "alice": {"salary": {"2022-01": 1000}},
+            "bob": {"salary": {"2022-01": 3000}},
+        },
+        "households": {"household": {"parents": ["alice", "bob"]}},
+    }
+    reforms = {
+        f"rate_{rate}": Reform.from_dict(
+            {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": rate}},
+            country_id="us",
+        )
+        for rate in (0.1, 0.3)
+    }
+    return ReformBatch(Simulation(situation=situation), reforms)
+
+
+def test_reform_batch():
+    batch = make_reform_batch()
+    results = batch.calculate(["income_tax", "basic_income"], "2022-01")
+
+    assert list(results) == ["baseline", "rate_0.1", "rate_0.3"]
+    assert_near(results["baseline"]["income_tax"], [150, 450], 0.01)
+    assert_near(results["rate_0.1"]["income_tax"], [100, 300], 0.01)
+    assert_near(results["rate_0.3"]["income_tax"], [300, 900], 0.01)
+
+    # Inputs and unaffected values are shared with the baseline.
+    assert results["rate_0.3"]["basic_income"] is (
+        results["baseline"]["basic_income"]
+    )
+    assert batch.get_branch("rate_0.1").calculate(
+        "salary", "2022-01"
+    ) is batch.simulation.calculate("salary", "2022-01")
+
+    # Branches only have holders for the variables used.
+    branch = batch.get_branch("rate_0.1")
+    assert set(branch.person._holders) == set(batch.simulation.person._holders)
+    assert "disposable_income" not in branch.person._holders
+
+
+def test_reform_batch_in_processes():
+    batch = make_reform_batch()
+    results = batch.calculate("income_tax", "2022-01", processes=2)
+
+    assert_near(results["baseline"]["income_tax"], [150, 450], 0.01)
+    assert_near(results["rate_0.1"]["income_tax"], [100, 300], 0.01)
+    assert_near(results["rate_0.3"]["income_tax"], [300, 900], 0.01)
+
+
+def test_reform_batch_reserves_baseline_name():
+    from policyengine_core.simulations import ReformBatch
+
+    simulation = make_reform_batch().simulation
+    with pytest.raises(ValueError):
+        ReformBatch(simulation, {"baseline": ()})
@@ -682,3 +682,86 @@ def test_inconsistent_input(tax_benefit_system):
             tax_benefit_system, test_runner.yaml.safe_load(input_yaml)
         )
     assert "its length is 3 while there are 2" in error.value.args[0]
+
+
+def test_build_from_dicts(tax_benefit_system):
+    situations = [
+        situation_examples.couple,
+        {"persons": {"Alicia": {"salary": {"2017-01": 3000}}}},
+        situation_examples.single,
+    ]
+
+    simulation = SimulationBuilder().build_from_dicts(
+        tax_benefit_system, situations
+    )
+
+    assert simulation.persons.count == 4
+    assert simulation.household.count == 3
+    assert simulation.persons.ids[2] == "1:Alicia"
+    assert simulation.household.members_entity_id.tolist() == [0, 0, 1, 2]
+    for situation, values in zip(
+        situations, simulation.calculate_situations("income_tax", "2017-01")
+    ):
+        separate = SimulationBuilder().build_from_dict(
+            tax_benefit_system, situation
+        )
+        assert values.tolist() == pytest.approx(
+            separate.calculate("income_tax", "2017-01").tolist()
+        )
+    assert [
+        len(values)
+        for values in simulation.calculate_situations("rent", "2017-01")
+    ] == [1, 1, 1]
+
+
+def test_build_from_dicts_errors(tax_benefit_system):
+    with pytest.raises(SituationParsingError) as error:
+        SimulationBuilder().build_from_dicts(
+            tax_benefit_system,
+            [situation_examples.single, {"persons": {"Alicia": {"ubi": 1}}}],
+        )
+    assert "ubi" in error.value.error["1"]["persons"]["Alicia"]
+
+
+def test_input_values_converted_by_column(tax_benefit_system):
+    situation = {
+        "persons": {
+            "Alicia": {"salary": {"2017-01": 3000}},
+            "Javier": {"salary": {"2017-01": "2000 + 500"}},
+            "Tom": {"salary": {"2017-01": None}},
+        },
+        "households": {
+            "a": {
+                "parents": ["Alicia"],
+                "housing_occupancy_status": {"2017-01": "owner"},
+            },
+            "b": {
+                "parents": ["Javier", "Tom"],
+                "housing_occupancy_status": {"2017-01": "free_lodger"},
+            },
+        },
+    }
+
+    simulation = SimulationBuilder().build_from_dict(
+        tax_benefit_system, situation
+    )
+
+    assert simulation.calculate("salary", "2017-01").tolist() == [
+        3000,
+        2500,
+        0,
+    ]
+    assert simulation.calculate(
+        "housing_occupancy_status", "2017-01"
+    ).decode_to_str().tolist() == ["owner", "free_lodger"]
+
+    situation["households"]["b"]["housing_occupancy_status"] = {
+        "2017-01": "castle"
+    }
+    with pytest.raises(SituationParsingError) as error:
+        SimulationBuilder().build_from_dict(tax_benefit_system, situation)
+    assert "castle" in (
+        error.value.error["households"]["b"]["housing_occupancy_status"][
+            "2017-01"
+        ]
+    )
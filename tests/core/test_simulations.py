@@ -100,3 +100,635 @@ def test_macro_cache(tax_benefit_system):
     )
     cache.clear_cache(cache.cache_folder_path)
     assert not cache.cache_folder_path.exists()
+
+
+def make_cached_microsimulation_class(tmp_path):
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.country_template.data.datasets import (
+        CountryTemplateDataset,
+    )
+
+    class TemporaryDataset(CountryTemplateDataset):
+        file_path = tmp_path / "country_template_dataset.h5"
+
+    class CachedMicrosimulation(Microsimulation):
+        default_dataset = TemporaryDataset
+        macro_cache_read = True
+
+    return CachedMicrosimulation
+
+
+def test_macro_cache_infers_parameter_dependencies(tmp_path):
+    CachedMicrosimulation = make_cached_microsimulation_class(tmp_path)
+    simulation = CachedMicrosimulation()
+
+    assert simulation.get_parameter_dependencies("income_tax", "2022") is None
+    simulation.calculate("income_tax", 2022)
+
+    assert simulation.get_parameter_dependencies("income_tax", "2022") == {
+        "taxes.income_tax_rate"
+    }
+    assert simulation.check_macro_cache("income_tax", "2022")
+    cache_folder = tmp_path / "country_template_dataset_variable_cache"
+    assert (cache_folder / "income_tax_2022_default.h5").exists()
+    assert (cache_folder / "parameter_dependencies.json").exists()
+
+    # A new simulation picks up the persisted dependencies.
+    simulation = CachedMicrosimulation()
+    assert simulation.get_parameter_dependencies("income_tax", "2022") == {
+        "taxes.income_tax_rate"
+    }
+
+
+def test_macro_cache_is_not_used_for_reformed_dependencies(tmp_path):
+    from policyengine_core.reforms import Reform
+
+    CachedMicrosimulation = make_cached_microsimulation_class(tmp_path)
+    baseline = CachedMicrosimulation()
+    baseline_income_tax = np.array(baseline.calculate("income_tax", 2022))
+    baseline.calculate("basic_income", 2022)
+
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.3}},
+        country_id="us",
+    )
+    reformed = CachedMicrosimulation(reform=reform)
+
+    assert not reformed.check_macro_cache("income_tax", "2022")
+    assert reformed.check_macro_cache("basic_income", "2022")
+    assert np.allclose(
+        np.array(reformed.calculate("income_tax", 2022)),
+        baseline_income_tax * 2,
+    )
+
+
+def test_macro_cache_is_not_used_after_inputs_change(tmp_path):
+    CachedMicrosimulation = make_cached_microsimulation_class(tmp_path)
+    simulation = CachedMicrosimulation()
+    income_tax = np.array(simulation.calculate("income_tax", "2022-01"))
+    salary = np.array(simulation.calculate("salary", "2022-01"))
+    assert simulation.check_macro_cache("income_tax", "2022-01")
+
+    simulation = CachedMicrosimulation()
+    simulation.set_input("salary", "2022-01", salary * 10)
+    assert not simulation.check_macro_cache("income_tax", "2022-01")
+    assert np.allclose(
+        np.array(simulation.calculate("income_tax", "2022-01")),
+        income_tax * 10,
+    )
+
+
+def test_macro_cache_is_not_used_for_parameters_read_outside_formula_arguments(
+    tmp_path,
+):
+    from policyengine_core.country_template import CountryTaxBenefitSystem
+    from policyengine_core.country_template.entities import Person
+    from policyengine_core.periods import MONTH
+    from policyengine_core.reforms import Reform
+    from policyengine_core.variables import Variable
+
+    class taxed_salary(Variable):
+        value_type = float
+        entity = Person
+        definition_period = MONTH
+        label = "Taxed salary"
+
+        def formula(person, period):
+            parameters = person.simulation.tax_benefit_system.parameters
+            rate = parameters(period).taxes.income_tax_rate
+            return person("salary", period) * rate
+
+    class untaxed_salary(Variable):
+        value_type = float
+        entity = Person
+        definition_period = MONTH
+        label = "Untaxed salary"
+
+        def formula(person, period, parameters):
+            tax_benefit_system = person.simulation.tax_benefit_system
+            rate = tax_benefit_system.parameters(period).taxes.income_tax_rate
+            return person("salary", period) * (1 - rate)
+
+    class SystemWithSalaryTaxes(CountryTaxBenefitSystem):
+        def add_variables_from_directory(self, directory):
+            super().add_variables_from_directory(directory)
+            if directory == self.variables_dir:
+                self.add_variable(taxed_salary)
+                self.add_variable(untaxed_salary)
+
+    class SystemMicrosimulation(make_cached_microsimulation_class(tmp_path)):
+        default_tax_benefit_system = SystemWithSalaryTaxes
+        default_tax_benefit_system_instance = SystemWithSalaryTaxes()
+
+    baseline = SystemMicrosimulation()
+    salary = np.array(baseline.calculate("salary", "2022-01"))
+    baseline.calculate("taxed_salary", "2022-01")
+    baseline.calculate("untaxed_salary", "2022-01")
+
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.3}},
+        country_id="us",
+    )
+    reformed = SystemMicrosimulation(reform=reform)
+
+    for variable in ("taxed_salary", "untaxed_salary"):
+        assert reformed.get_parameter_dependencies(variable, "2022-01") is None
+        assert not reformed.check_macro_cache(variable, "2022-01")
+    assert np.allclose(
+        np.array(reformed.calculate("taxed_salary", "2022-01")), salary * 0.3
+    )
+    assert np.allclose(
+        np.array(reformed.calculate("untaxed_salary", "2022-01")),
+        salary * 0.7,
+    )
+
+
+def test_calculate_branches():
+    from policyengine_core.country_template import Simulation
+    from policyengine_core.enums import EnumArray
+    from policyengine_core.reforms import Reform
+
+    situation = {
+        "persons": {
+            "alice": {"salary": {"2022-01": 1000}},
+            "bob": {"salary": {"2022-01": 3000}},
+        },
+        "households": {"household": {"parents": ["alice", "bob"]}},
+    }
+    reform = Reform.from_dict(
+        {"taxes.income_tax_rate": {"2022-01-01.2100-01-01": 0.3}},
+        country_id="us",
+    )
+    variables = ["income_tax", "housing_occupancy_status"]
+
+    parallel = Simulation(
+        situation=situation, reform=reform
+    ).calculate_branches(["default", "baseline"], variables, "2022-01")
+    sequential = Simulation(
+        situation=situation, reform=reform
+    ).calculate_branches(
+        ["default", "baseline"], variables, "2022-01", processes=1
+    )
+
+    for branch in ("default", "baseline"):
+        assert np.allclose(
+            parallel[branch]["income_tax"], sequential[branch]["income_tax"]
+        )
+        housing_occupancy_status = parallel[branch]["housing_occupancy_status"]
+        assert isinstance(housing_occupancy_status, EnumArray)
+        assert (
+            housing_occupancy_status.decode_to_str()
+            == sequential[branch]["housing_occupancy_status"].decode_to_str()
+        ).all()
+    assert np.allclose(parallel["default"]["income_tax"], [300, 900])
+    assert np.allclose(parallel["baseline"]["income_tax"], [150, 450])
+
+
+def test_build_from_flat_file():
+    import pandas as pd
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    dataframe = pd.DataFrame(
+        {
+            "person_id": [0, 1, 2],
+            "household_id": [0, 0, 1],
+            "person_household_id": [0, 0, 1],
+            "person_household_role": ["parent", "child", "parent"],
+            "salary__2022-01": [100.0, 200.0, 300.0],
+            "rent__2022-01": [50.0, 50.0, 70.0],
+            "household_weight": [1.0, 1.0, 2.0],
+            "unknown_variable__2022": [1, 2, 3],
+        }
+    )
+    simulation = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022")
+    )
+
+    assert simulation.household.count == 2
+    assert (simulation.household.members_entity_id == [0, 0, 1]).all()
+    assert np.allclose(
+        simulation.calculate("salary", "2022-01", use_weights=False),
+        [100, 200, 300],
+    )
+    assert np.allclose(
+        simulation.calculate("rent", "2022-01", use_weights=False), [50, 70]
+    )
+    assert np.allclose(
+        simulation.calculate("household_weight", 2022, use_weights=False),
+        [1, 2],
+    )
+
+    # Inputs don't share memory with the dataset.
+    dataframe["salary__2022-01"] = 0
+    assert np.allclose(
+        simulation.calculate("salary", "2022-01", use_weights=False),
+        [100, 200, 300],
+    )
+
+
+def test_to_input_dataframe():
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    simulation = Microsimulation()
+    simulation.calculate("housing_occupancy_status", "2022-01")
+    dataframe = simulation.to_input_dataframe()
+
+    # Only stored values are exported, so nothing is calculated.
+    assert "income_tax__2022-01" not in dataframe.columns
+    assert len(dataframe) == simulation.persons.count
+    assert dataframe["household_weight__2022"].tolist() == list(
+        simulation.calculate("household_weight", 2022, map_to="person")
+    )
+    assert dataframe["housing_occupancy_status__2022-01"].tolist() == [
+        "tenant"
+    ] * len(dataframe)
+
+    exported = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022")
+    )
+    assert np.allclose(
+        exported.calculate("income_tax", "2022-01"),
+        simulation.calculate("income_tax", "2022-01"),
+    )
+
+
+def test_subsample():
+    import pandas as pd
+    import pytest
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    household_ids = np.repeat(np.arange(10), 2)
+    dataframe = pd.DataFrame(
+        {
+            "person_id": np.arange(20),
+            "household_id": household_ids,
+            "person_household_id": household_ids,
+            "person_household_role": ["parent", "child"] * 10,
+            "salary__2022-01": np.arange(20) * 100.0,
+            "household_weight__2022": household_ids + 1.0,
+        }
+    )
+    simulation = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022"),
+        reform={"taxes.income_tax_rate": {"2022": 0.5}},
+    )
+    simulation.calculate("income_tax", "2022-01")
+
+    simulation.subsample(4, seed=0, time_period="2022")
+
+    household_ids = simulation.household.ids
+    assert len(household_ids) == 4
+    for branch in (simulation, simulation.baseline):
+        assert branch.persons.count == 8
+        assert (
+            branch.household.members_entity_id == np.repeat(range(4), 2)
+        ).all()
+        assert np.allclose(
+            branch.calculate("salary", "2022-01", use_weights=False),
+            dataframe["salary__2022-01"][
+                dataframe.household_id.isin(household_ids)
+            ],
+        )
+        # Weights keep their total.
+        assert branch.calculate(
+            "household_weight", 2022, use_weights=False
+        ).sum() == pytest.approx(55)
+    # Values calculated before subsampling are recalculated.
+    assert np.allclose(
+        simulation.calculate("income_tax", "2022-01", use_weights=False),
+        simulation.calculate("salary", "2022-01", use_weights=False) * 0.5,
+    )
+
+
+def test_subsample_with_macro_cache(tmp_path):
+    CachedMicrosimulation = make_cached_microsimulation_class(tmp_path)
+    simulation = CachedMicrosimulation()
+    income_tax = simulation.calculate(
+        "income_tax", "2022-01", use_weights=False
+    )
+    salary = simulation.calculate("salary", "2022-01", use_weights=False)
+
+    simulation = CachedMicrosimulation()
+    simulation.subsample(1, seed=0, time_period="2022")
+    assert not simulation.check_macro_cache("income_tax", "2022-01")
+    kept = np.isin(salary, simulation.calculate("salary", "2022-01"))
+    assert np.allclose(
+        simulation.calculate("income_tax", "2022-01", use_weights=False),
+        np.array(income_tax)[kept],
+    )
+
+
+def test_extract_people():
+    from policyengine_core.country_template import Simulation
+    from policyengine_core.country_template.situation_examples import couple
+
+    simulation = Simulation(situation=couple)
+
+    first, second = simulation.extract_people([0, 1])
+
+    assert first == second == simulation.extract_person(1)
+    assert first["households"]["household"]["members"] == [
+        "person_1",
+        "person_2",
+    ]
+    assert first["persons"]["person_1"]["salary"] == {"2017-01": 4000.0}
+    assert first["persons"]["person_2"]["salary"] == {"2017-01": 2500.0}
+
+
+def test_calculate_weighted():
+    import pandas as pd
+    import pytest
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    dataframe = pd.DataFrame(
+        {
+            "person_id": [0, 1, 2, 3],
+            "household_id": [0, 0, 1, 2],
+            "person_household_id": [0, 0, 1, 2],
+            "salary__2022-01": [100.0, 200.0, 300.0, np.nan],
+            "household_weight": [1.0, 1.0, 2.0, 0.0],
+        }
+    )
+    simulation = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022")
+    )
+
+    weighted = simulation.calculate_weighted("salary", "2022-01")
+    series = simulation.calculate("salary", "2022-01")
+    assert weighted.sum() == pytest.approx(series.sum())
+    assert weighted.mean() == pytest.approx(series.mean())
+    assert weighted.count() == pytest.approx(series.count())
+    assert weighted.median() == series.median()
+    assert np.allclose(
+        weighted.quantile([0.1, 0.5, 0.9]),
+        series.quantile([0.1, 0.5, 0.9]),
+    )
+    # Anything else is delegated to a MicroSeries.
+    assert weighted.max() == series.max() == 300
+
+    # Results can't be changed in place, which would change stored values.
+    with pytest.raises(ValueError):
+        weighted.values[0] = 0
+    with pytest.raises(ValueError):
+        weighted.weights[0] = 0
+    weighted.to_microseries().iloc[0] = 0
+    assert simulation.calculate("salary", "2022-01", use_weights=False)[
+        0
+    ] == pytest.approx(100)
+
+    # Weights are cached until they are changed.
+    assert simulation.get_weights(
+        "salary", "2022-01"
+    ) is simulation.get_weights("salary", "2022-01")
+    simulation.set_input("household_weight", 2022, [2.0, 2.0, 2.0])
+    assert simulation.calculate_weighted("rent", "2022-01").weight() == 6
+
+
+def test_aggregate():
+    import pandas as pd
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    dataframe = pd.DataFrame(
+        {
+            "person_id": [0, 1, 2, 3, 4],
+            "household_id": [0, 0, 1, 2, 3],
+            "person_household_id": [0, 0, 1, 2, 3],
+            "salary__2022-01": [100.0, 0.0, 300.0, 400.0, 500.0],
+            "housing_occupancy_status__2022-01": [
+                "tenant",
+                "tenant",
+                "owner",
+                "tenant",
+                "owner",
+            ],
+            "household_weight": [1.0, 1.0, 2.0, 3.0, 4.0],
+        }
+    )
+    simulation = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022")
+    )
+
+    table = simulation.aggregate(
+        "salary",
+        by="housing_occupancy_status",
+        stats=["sum", "mean", "count", "weight", "median"],
+        period="2022-01",
+    )
+    salary = simulation.calculate("salary", "2022-01")
+    status = simulation.calculate(
+        "housing_occupancy_status", "2022-01", map_to="person"
+    )
+    for name in ("owner", "tenant"):
+        group = salary[np.asarray(status) == name]
+        assert table.loc[name, "sum"] == group.sum()
+        assert table.loc[name, "mean"] == group.mean()
+        assert table.loc[name, "median"] == group.median()
+        assert table.loc[name, "weight"] == group.weights.sum()
+    assert table.loc["tenant", "count"] == 4
+
+    # Several variables, over households, by decile.
+    table = simulation.aggregate(
+        ["salary", "household_weight"],
+        stats="sum",
+        period="2022-01",
+        map_to="household",
+        decile_by="salary",
+    )
+    deciles = simulation.calculate(
+        "salary", "2022-01", map_to="household"
+    ).decile_rank()
+    assert list(table.index) == sorted(set(deciles))
+    assert table["salary", "sum"].sum() == salary.sum()
+
+
+def test_grouped_quantiles_match_weighted_array():
+    from policyengine_core.simulations.aggregates import (
+        grouped_weighted_statistics,
+    )
+    from policyengine_core.simulations.weighted_array import WeightedArray
+
+    generator = np.random.default_rng(0)
+    group_count = 2_000
+    groups = generator.integers(0, group_count, 10_000)
+    values = generator.integers(0, 5, len(groups)).astype(float)
+    # Weights which often put a value exactly at a quantile of its group.
+    weights = generator.choice([0.1, 0.2, 0.3, 0.7], len(groups))
+
+    result = grouped_weighted_statistics(
+        values, weights, groups, group_count, ["p10", "median", "p90"]
+    )
+    for group in range(group_count):
+        in_group = groups == group
+        assert np.array_equal(
+            result[:, group],
+            WeightedArray(values[in_group], weights[in_group]).quantile(
+                [0.1, 0.5, 0.9]
+            ),
+            equal_nan=True,
+        )
+
+
+def test_derivative_recalculates_only_dependents():
+    import pandas as pd
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    dataframe = pd.DataFrame(
+        {
+            "person_id": [0, 1, 2],
+            "household_id": [0, 0, 1],
+            "person_household_id": [0, 0, 1],
+            "salary__2022-01": [1_000.0, 10_000.0, 0.0],
+            "age__2022-01": [40, 30, 70],
+        }
+    )
+    simulation = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022")
+    )
+    basic_income = simulation.calculate(
+        "basic_income", "2022-01", use_weights=False
+    )
+
+    derivative = simulation.derivative(
+        "disposable_income", "salary", "2022-01", delta=100
+    )
+
+    income_tax_rate = simulation.tax_benefit_system.parameters(
+        "2022-01"
+    ).taxes.income_tax_rate
+    contribution = simulation.derivative(
+        "social_security_contribution", "salary", "2022-01", delta=100
+    )
+    assert np.allclose(derivative, 1 - income_tax_rate - contribution)
+    dependents = simulation.variable_dependency_tracer.get_dependents(
+        ["salary"]
+    )
+    assert {
+        "income_tax",
+        "social_security_contribution",
+        "disposable_income",
+    } <= dependents
+    assert "basic_income" not in dependents
+    # The original simulation is left unchanged.
+    assert (
+        simulation.calculate("basic_income", "2022-01", use_weights=False)
+        is basic_income
+    )
+    assert np.allclose(
+        simulation.calculate("salary", "2022-01"), [1_000, 10_000, 0]
+    )
+
+
+def test_derivatives():
+    import pandas as pd
+    from policyengine_core.country_template import Microsimulation
+    from policyengine_core.data import Dataset
+
+    dataframe = pd.DataFrame(
+        {
+            "person_id": [0, 1, 2],
+            "household_id": [0, 0, 1],
+            "person_household_id": [0, 0, 1],
+            "salary__2022-01": [1_000.0, 10_000.0, 0.0],
+            "age__2022-01": [40, 30, 70],
+        }
+    )
+    simulation = Microsimulation(
+        dataset=Dataset.from_dataframe(dataframe, "2022")
+    )
+    wrt = ["salary", "basic_income"]
+    deltas = [1, 100, 10_000]
+
+    derivatives = simulation.derivatives(
+        "disposable_income", wrt, "2022-01", deltas
+    )
+
+    assert derivatives.shape == (2, 3, 3)
+    for i, name in enumerate(wrt):
+        for j, delta in enumerate(deltas):
+            assert np.allclose(
+                derivatives[i, j],
+                simulation.derivative(
+                    "disposable_income", name, "2022-01", delta
+                ),
+            )
+    assert np.allclose(derivatives[1], 1)
+    assert np.allclose(
+        simulation.derivatives(
+            "disposable_income", wrt, "2022-01", deltas, processes=2
+        ),
+        derivatives,
+    )
+
+
+def test_individual_sim_parametric_vary():
+    from policyengine_core.country_template import CountryTaxBenefitSystem
+    from policyengine_core.reforms import set_parameter
+    from policyengine_core.simulations import IndividualSim, Simulation
+
+    class CountryIndividualSim(IndividualSim):
+        tax_benefit_system = CountryTaxBenefitSystem
+        required_entities = ["household"]
+        default_roles = dict(household="parent")
+
+    sim = CountryIndividualSim(year=2022)
+    sim.add_person(name="person_1", salary=3_000, age=30)
+    sim.add_person(name="person_2", salary=1_000, age=30)
+    sim.vary(
+        parameter="taxes.income_tax_rate",
+        min=0,
+        max=0.5,
+        step=0.25,
+        period="year:2022:1",
+    )
+
+    results = sim.calc("disposable_income", "2022-01")
+
+    assert results.shape == (3, 2)
+    for rate, result in zip([0, 0.25, 0.5], results):
+        simulation = Simulation(
+            tax_benefit_system=CountryTaxBenefitSystem(),
+            situation=sim.situation_data,
+            reform=set_parameter("taxes.income_tax_rate", rate, "year:2022:1"),
+        )
+        assert np.allclose(
+            result, simulation.calculate("disposable_income", "2022-01")
+        )
+    assert np.allclose(
+        sim.calc("income_tax", "2022-01", target="person_1"), [0, 750, 1_500]
+    )
+    # Each point is a branch of the same simulation, sharing its inputs.
+    branch = sim.parametric_batch.get_branch("parametric_vary_1")
+    assert branch.get_holder("salary").get_array(
+        "2022-01"
+    ) is sim.simulation.get_holder("salary").get_array("2022-01")
+
+
+def test_input_variables_recorded_as_set():
+    from policyengine_core.country_template import CountryTaxBenefitSystem
+    from policyengine_core.simulations import Simulation
+
+    situation = {
+        "persons": {"a": {"salary": {"2022-01": 3_000}}},
+        "households": {"h": {"parents": ["a"], "rent": {"2022-01": 700}}},
+    }
+    simulation = Simulation(
+        tax_benefit_system=CountryTaxBenefitSystem(), situation=situation
+    )
+    assert sorted(simulation.input_variables) == ["rent", "salary"]
+    # Only the variables in the situation have holders.
+    assert sorted(
+        name
+        for population in simulation.populations.values()
+        for name in population._holders
+    ) == ["rent", "salary"]
+
+    clone = simulation.clone()
+    clone.set_input("age", "2022-01", [40])
+    assert "age" in clone.input_variables
+    assert "age" not in simulation.input_variables
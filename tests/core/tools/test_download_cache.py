@@ -0,0 +1,168 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from policyengine_core.tools.download_cache import DownloadCache, download_file
+from policyengine_core.tools.hugging_face import resolve_huggingface_url
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    # Set by tests: the number of bytes after which to drop the connection
+    # on the next full response.
+    interrupt_after = None
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(dict(self.headers))
+        start = 0
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header is not None and self.headers.get("If-Range") == '"v1"':
+            start = int(range_header[len("bytes=") : -1])
+            status = 206
+        body = CONTENT[start:]
+        self.send_response(status)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header(
+                "Content-Range",
+                f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}",
+            )
+        self.end_headers()
+        if status == 200 and type(self).interrupt_after is not None:
+            body = body[: type(self).interrupt_after]
+            type(self).interrupt_after = None
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    RangeRequestHandler.interrupt_after = None
+    RangeRequestHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_file_resumes_interrupted_downloads(server, tmp_path):
+    url = f"{server}/dataset.h5"
+    file_path = tmp_path / "dataset.h5"
+    RangeRequestHandler.interrupt_after = 100_000
+
+    with pytest.raises(requests.exceptions.RequestException):
+        download_file(url, file_path)
+    assert not file_path.exists()
+
+    download_file(url, file_path, sha256=hashlib.sha256(CONTENT).hexdigest())
+
+    assert file_path.read_bytes() == CONTENT
+    # Only the part of the file received before the interruption is fetched
+    # again.
+    resumed_from = int(RangeRequestHandler.requests[-1]["Range"][6:-1])
+    assert 0 < resumed_from <= 100_000
+    assert list(tmp_path.iterdir()) == [file_path]
+
+
+def test_download_file_checks_sha256(server, tmp_path):
+    file_path = tmp_path / "dataset.h5"
+
+    with pytest.raises(ValueError):
+        download_file(f"{server}/dataset.h5", file_path, sha256="0" * 64)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_cache(server, tmp_path):
+    cache = DownloadCache(tmp_path)
+    url = f"{server}/dataset.h5"
+
+    file_path = cache.download(url)
+    assert cache.download(url) == file_path
+    assert cache.download(url, offline=True) == file_path
+    assert len(RangeRequestHandler.requests) == 1
+    assert file_path.read_bytes() == CONTENT
+
+    with pytest.raises(FileNotFoundError):
+        cache.download(f"{server}/other.h5", offline=True)
+
+
+def test_resolve_huggingface_url_from_cache(tmp_path):
+    cache = DownloadCache(tmp_path)
+    file_path = cache.get_huggingface_path("owner", "repo", "data.h5", "1.0")
+    file_path.parent.mkdir(parents=True)
+    file_path.write_bytes(b"data")
+
+    with patch(
+        "policyengine_core.tools.hugging_face.download_huggingface_dataset"
+    ) as mock_download:
+        assert resolve_huggingface_url(
+            "hf://owner/repo/data.h5@1.0", cache=cache
+        ) == str(file_path)
+        with pytest.raises(FileNotFoundError):
+            resolve_huggingface_url(
+                "hf://owner/repo/data.h5", offline=True, cache=cache
+            )
+        mock_download.assert_not_called()
+
+
+def test_huggingface_downloads_check_sha256(tmp_path):
+    from policyengine_core.data import Dataset
+
+    cache = DownloadCache(tmp_path)
+    file_path = cache.get_huggingface_path("owner", "repo", "data.h5", "1.0")
+    file_path.parent.mkdir(parents=True)
+
+    def download(repo, repo_filename, version, local_dir):
+        path = local_dir / repo_filename
+        path.write_bytes(CONTENT)
+        return str(path)
+
+    with patch(
+        "policyengine_core.tools.hugging_face.download_huggingface_dataset",
+        side_effect=download,
+    ):
+        # A cached file with the wrong digest is downloaded again.
+        file_path.write_bytes(b"stale")
+        assert resolve_huggingface_url(
+            "hf://owner/repo/data.h5@1.0",
+            cache=cache,
+            sha256=hashlib.sha256(CONTENT).hexdigest(),
+        ) == str(file_path)
+        assert file_path.read_bytes() == CONTENT
+
+        with pytest.raises(ValueError):
+            resolve_huggingface_url(
+                "hf://owner/repo/data.h5@1.0", cache=cache, sha256="0" * 64
+            )
+        assert not file_path.exists()
+
+        class HuggingFaceDataset(Dataset):
+            name = "huggingface_dataset"
+            label = "Hugging Face dataset"
+            data_format = Dataset.ARRAYS
+            file_path = tmp_path / "datasets" / "data.h5"
+            url = "hf://owner/repo/data.h5"
+            sha256 = "0" * 64
+
+        with patch(
+            "policyengine_core.data.dataset.download_huggingface_dataset",
+            side_effect=download,
+        ), pytest.raises(ValueError):
+            HuggingFaceDataset().download()
+        assert not HuggingFaceDataset.file_path.exists()
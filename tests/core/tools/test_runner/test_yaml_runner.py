@@ -46,6 +46,9 @@ class TaxBenefitSystem:
     def get_variable(self, variable_name, check_existence=True):
         return self.variables.get(variable_name)
 
+    def get_abolished_variables(self, period):
+        return frozenset()
+
     def clone(self):
         return TaxBenefitSystem()
 